@@ -123,5 +123,12 @@ config_entries = [
         cli_action='store_const',
         cli_const=True,
         help='Enables tracebacks to be printed when a test raises TestFailure.',
+    ),
+    ConfigEntryMeta(
+        acts_config_key=Config.key_test_class_index_path.value,
+        env_var_name='ACTS_TEST_CLASS_INDEX_PATH',
+        type=str,
+        help='The path of the file caching the test classes found in test '
+             'scripts. An empty path disables the cache.',
     )
 ]
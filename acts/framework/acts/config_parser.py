@@ -29,6 +29,7 @@ _ENV_ACTS_LOGPATH = 'ACTS_LOGPATH'
 _ENV_TEST_FAILURE_TRACEBACKS = 'ACTS_TEST_FAILURE_TRACEBACKS'
 # An environment variable defining the test search paths for ACTS.
 _ENV_ACTS_TESTPATHS = 'ACTS_TESTPATHS'
+_ENV_TEST_CLASS_INDEX_PATH = 'ACTS_TEST_CLASS_INDEX_PATH'
 _PATH_SEPARATOR = ':'
 
 
@@ -276,6 +277,10 @@ def load_test_config_file(test_config_path,
             and _ENV_TEST_FAILURE_TRACEBACKS in os.environ):
         configs[keys.Config.key_test_failure_tracebacks.value] = os.environ[
             _ENV_TEST_FAILURE_TRACEBACKS]
+    if (keys.Config.key_test_class_index_path.value not in configs
+            and _ENV_TEST_CLASS_INDEX_PATH in os.environ):
+        configs[keys.Config.key_test_class_index_path.value] = os.environ[
+            _ENV_TEST_CLASS_INDEX_PATH]
 
     # Add the global paths to the global config.
     k_log_path = keys.Config.key_log_path.value
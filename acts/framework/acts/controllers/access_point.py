@@ -162,22 +162,23 @@ class AccessPoint(object):
         # interfaces need to be brought down as part of the AP initialization
         # process, otherwise test would fail.
         try:
-            self.ssh.run('stop wpasupplicant')
-            self.ssh.run('stop hostapd')
+            self.ssh.run_batch(['stop wpasupplicant', 'stop hostapd'])
         except job.Error:
             self.log.debug('No hostapd running')
         # Bring down all wireless interfaces
+        commands = []
         for iface in self.wlan:
             WLAN_DOWN = 'ifconfig {} down'.format(iface)
-            self.ssh.run(WLAN_DOWN)
+            commands.append(WLAN_DOWN)
         # Bring down all bridge interfaces
         bridge_interfaces = self.interfaces.get_bridge_interface()
         if bridge_interfaces:
             for iface in bridge_interfaces:
                 BRIDGE_DOWN = 'ifconfig {} down'.format(iface)
                 BRIDGE_DEL = 'brctl delbr {}'.format(iface)
-                self.ssh.run(BRIDGE_DOWN)
-                self.ssh.run(BRIDGE_DEL)
+                commands.append(BRIDGE_DOWN)
+                commands.append(BRIDGE_DEL)
+        self.ssh.run_batch(commands)
 
     def start_ap(self, hostapd_config, additional_parameters=None):
         """Starts as an ap using a set of configurations.
@@ -297,10 +298,11 @@ class AccessPoint(object):
         # the WAN and LAN/WLAN ports.  This means anyone connecting to the
         # WLAN/LAN ports will be able to access the internet if the WAN port
         # is connected to the internet.
-        self.ssh.run('iptables -t nat -F')
-        self.ssh.run(
-            'iptables -t nat -A POSTROUTING -o %s -j MASQUERADE' % self.wan)
-        self.ssh.run('echo 1 > /proc/sys/net/ipv4/ip_forward')
+        self.ssh.run_batch([
+            'iptables -t nat -F',
+            'iptables -t nat -A POSTROUTING -o %s -j MASQUERADE' % self.wan,
+            'echo 1 > /proc/sys/net/ipv4/ip_forward'
+        ])
 
         return interface
 
@@ -414,8 +416,8 @@ class AccessPoint(object):
         """
         self.scapy_install_path = self.ssh.run('mktemp -d').stdout.rstrip()
         self.log.info("Scapy install path: %s" % self.scapy_install_path)
-        self.ssh.send_file(scapy_path, self.scapy_install_path)
-        self.ssh.send_file(send_ra_path, self.scapy_install_path)
+        self.ssh.send_files([scapy_path, send_ra_path],
+                            self.scapy_install_path)
 
         scapy = os.path.join(self.scapy_install_path, scapy_path.split('/')[-1])
 
@@ -19,8 +19,12 @@ from builtins import str
 import logging
 import re
 import shellescape
+import shlex
+import socket
 
 from acts import error
+from acts.controllers.adb_lib import host_protocol
+from acts.controllers.adb_lib import shell_session
 from acts.libs.proc import job
 
 DEFAULT_ADB_TIMEOUT = 60
@@ -35,6 +39,15 @@ CANNOT_BIND_LISTENER_REGEX = re.compile('^error: cannot bind listener:')
 ADB_VERSION_REGEX = re.compile('Android Debug Bridge version 1.0.(\d+)')
 ROOT_USER_ID = '0'
 SHELL_USER_ID = '2000'
+# Matches one "[name]: [value]" entry of `getprop` output. Values may span
+# multiple lines.
+GETPROP_ENTRY_REGEX = re.compile(r'^\[([^\]\n]+)\]: \[(.*?)\]$',
+                                 re.MULTILINE | re.DOTALL)
+# adb commands after which previously read properties may be stale.
+PROP_CACHE_INVALIDATING_CMDS = frozenset([
+    'root', 'unroot', 'reboot', 'reboot-bootloader', 'sideload', 'remount',
+    'disable-verity', 'enable-verity'
+])
 
 
 def parsing_parcel_output(output):
@@ -51,6 +64,19 @@ def parsing_parcel_output(output):
     return re.sub(r'[.\s]', '', output)
 
 
+def parse_getprop_output(output):
+    """Parses the output of `adb shell getprop` with no arguments.
+
+    Args:
+        output: The output of getprop, with one "[name]: [value]" entry per
+            property.
+
+    Returns:
+        A dict mapping property names to their values.
+    """
+    return dict(GETPROP_ENTRY_REGEX.findall(output))
+
+
 class AdbError(error.ActsError):
     """Raised when there is an error in adb operations."""
 
@@ -74,7 +100,17 @@ class AdbProxy(object):
     >> adb = AdbProxy(<serial>)
     >> adb.start_server()
     >> adb.devices() # will return the console output of "adb devices".
+
+    Shell commands can optionally be sent over a single long-lived `adb shell`
+    process instead of spawning a new adb process per command. See
+    enable_persistent_shell(). Alternatively, shell, pull and port forwarding
+    commands can talk to the adb server directly. See enable_host_protocol().
     """
+    # Defined at the class level so __getattr__ is never called for them.
+    _shell_session = None
+    _host_client = None
+    _prop_cache = None
+    _adb_args = None
 
     def __init__(self, serial="", ssh_connection=None):
         """Construct an instance of AdbProxy.
@@ -88,8 +124,10 @@ class AdbProxy(object):
         self._server_local_port = None
         adb_path = job.run("which adb").stdout
         adb_cmd = [adb_path]
+        adb_args = [adb_path]
         if serial:
             adb_cmd.append("-s %s" % serial)
+            adb_args += ['-s', str(serial)]
         if ssh_connection is not None:
             # Kill all existing adb processes on the remote host (if any)
             # Note that if there are none, then pkill exits with non-zero status
@@ -107,7 +145,11 @@ class AdbProxy(object):
 
         if self._server_local_port:
             adb_cmd.append("-P %d" % local_port)
+            adb_args += ['-P', str(local_port)]
         self.adb_str = " ".join(adb_cmd)
+        if adb_path:
+            # Used to run adb commands without a shell.
+            self._adb_args = adb_args
         self._ssh_connection = ssh_connection
 
     def get_user_id(self):
@@ -151,13 +193,16 @@ class AdbProxy(object):
         self.wait_for_device()
         return self.get_user_id() == user_id
 
-    def _exec_cmd(self, cmd, ignore_status=False, timeout=DEFAULT_ADB_TIMEOUT):
+    def _exec_cmd(self, cmd, ignore_status=False, timeout=DEFAULT_ADB_TIMEOUT,
+                  args=None):
         """Executes adb commands in a new shell.
 
         This is specific to executing adb commands.
 
         Args:
             cmd: A string that is the adb command to execute.
+            args: If not None, the list of arguments to run cmd with, without
+                a shell.
 
         Returns:
             The stdout of the adb command.
@@ -165,7 +210,21 @@ class AdbProxy(object):
         Raises:
             AdbError is raised if adb cannot find the device.
         """
-        result = job.run(cmd, ignore_status=True, timeout=timeout)
+        result = job.run(args or cmd, ignore_status=True, timeout=timeout)
+        return self._process_result(cmd, result, ignore_status)
+
+    def _process_result(self, cmd, result, ignore_status):
+        """Returns the output of a finished adb command.
+
+        Args:
+            cmd: The adb command that was executed.
+            result: The job.Result of the command.
+            ignore_status: Whether to return stderr if there is no stdout,
+                instead of raising on adb connection errors.
+
+        Raises:
+            AdbError is raised if adb cannot find the device.
+        """
         ret, out, err = result.exit_status, result.stdout, result.stderr
 
         if DEVICE_OFFLINE_REGEX.match(err):
@@ -180,23 +239,71 @@ class AdbProxy(object):
         else:
             return out
 
+    def _get_adb_args(self, name, arg_str):
+        """Returns the arguments to run an adb command with, without a shell.
+
+        Returns:
+            The list of arguments, or None if arg_str uses shell syntax, e.g.
+            a redirection, or the adb binary was not found.
+        """
+        if self._adb_args is None:
+            return None
+        args = job.split_command(arg_str) if arg_str.strip() else []
+        if args is None:
+            return None
+        return self._adb_args + [name] + args
+
     def _exec_adb_cmd(self, name, arg_str, **kwargs):
         return self._exec_cmd(' '.join((self.adb_str, name, arg_str)),
+                              args=self._get_adb_args(name, arg_str),
                               **kwargs)
 
-    def _exec_cmd_nb(self, cmd, **kwargs):
+    def _exec_cmd_nb(self, cmd, args=None, **kwargs):
         """Executes adb commands in a new shell, non blocking.
 
         Args:
             cmds: A string that is the adb command to execute.
+            args: If not None, the list of arguments to run cmd with, without
+                a shell.
 
         """
-        return job.run_async(cmd, **kwargs)
+        return job.run_async(args or cmd, **kwargs)
 
     def _exec_adb_cmd_nb(self, name, arg_str, **kwargs):
         return self._exec_cmd_nb(' '.join((self.adb_str, name, arg_str)),
+                                 args=self._get_adb_args(name, arg_str),
                                  **kwargs)
 
+    def stream(self, name, arg_str='', ignore_status=False,
+               timeout=DEFAULT_ADB_TIMEOUT):
+        """Runs an adb command, yielding its output as it is produced.
+
+        Unlike the other adb commands, the output is not kept in memory, so
+        this suits commands with large outputs, such as bugreport.
+
+        Args:
+            name: The adb command, e.g. 'bugreport'.
+            arg_str: The arguments of the command, as a string.
+            ignore_status: Whether to ignore adb connection errors.
+            timeout: The number of seconds to wait for the command to finish.
+
+        Yields:
+            The stdout of the command, in chunks of bytes.
+
+        Raises:
+            AdbError is raised if adb cannot find the device.
+        """
+        cmd = ' '.join((self.adb_str, name, arg_str))
+        try:
+            for chunk in job.run_streaming(
+                    self._get_adb_args(name, arg_str) or cmd,
+                    timeout=timeout):
+                yield chunk
+        except job.TimeoutError:
+            raise
+        except job.Error as e:
+            self._process_result(cmd, e.result, ignore_status)
+
     def tcp_forward(self, host_port, device_port):
         """Starts tcp forwarding from localhost to this android device.
 
@@ -216,7 +323,17 @@ class AdbProxy(object):
             local_port = self._ssh_connection.create_ssh_tunnel(
                 remote_port, local_port=host_port)
             host_port = remote_port
-        output = self.forward("tcp:%d tcp:%d" % (host_port, device_port))
+        output = None
+        if self._host_client is not None:
+            try:
+                output = self._exec_host_protocol_cmd(
+                    'forward tcp:%d tcp:%d' % (host_port, device_port),
+                    self._host_client.forward, 'tcp:%d' % host_port,
+                    'tcp:%d' % device_port, timeout=DEFAULT_ADB_TIMEOUT)
+            except (ConnectionError, EOFError) as e:
+                logging.debug('Unable to reach the adb server: %s', e)
+        if output is None:
+            output = self.forward("tcp:%d tcp:%d" % (host_port, device_port))
         # If hinted_port is 0, the output will be the selected port.
         # Otherwise, there will be no output upon successfully
         # forwarding the hinted port.
@@ -239,6 +356,15 @@ class AdbProxy(object):
                 return
             # The actual port we need to disable via adb is on the remote host.
             host_port = remote_port
+        if self._host_client is not None:
+            try:
+                self._exec_host_protocol_cmd(
+                    'forward --remove tcp:%d' % host_port,
+                    self._host_client.kill_forward, 'tcp:%d' % host_port,
+                    timeout=DEFAULT_ADB_TIMEOUT)
+                return
+            except (ConnectionError, EOFError) as e:
+                logging.debug('Unable to reach the adb server: %s', e)
         self.forward("--remove tcp:%d" % host_port)
 
     def getprop(self, prop_name):
@@ -255,9 +381,174 @@ class AdbProxy(object):
         """
         return self.shell("getprop %s" % prop_name)
 
+    def getprops(self, prop_names, use_cache=False):
+        """Get several properties of the device with a single adb call.
+
+        All properties are read with one "adb shell getprop". With use_cache,
+        the result is kept and later lookups are served from it until the
+        cache is invalidated. The cache is invalidated automatically by adb
+        commands that may change properties (see PROP_CACHE_INVALIDATING_CMDS)
+        and can be invalidated explicitly with invalidate_prop_cache().
+
+        Only use the cache for properties that do not change while the device
+        is up, e.g. ro.* properties.
+
+        Args:
+            prop_names: An iterable of the names of the properties to get.
+            use_cache: Whether to read the properties from the cache, filling
+                it if it is empty.
+
+        Returns:
+            A dict mapping each requested name to the value of the property.
+            As with getprop, properties that do not exist have the value ''.
+        """
+        if use_cache and self._prop_cache is not None:
+            props = self._prop_cache
+        else:
+            props = parse_getprop_output(self.shell('getprop'))
+            if use_cache:
+                self._prop_cache = props
+        return {name: props.get(name, '') for name in prop_names}
+
+    def invalidate_prop_cache(self):
+        """Drops the properties cached by getprops.
+
+        Must be called after anything that may change device properties
+        without going through this AdbProxy, e.g. an OTA update.
+        """
+        self._prop_cache = None
+
+    def enable_persistent_shell(self):
+        """Sends shell commands over one long-lived `adb shell` process.
+
+        Commands that cannot use the session, e.g. because it is busy with a
+        command from another thread or the device is not reachable, fall back
+        to spawning a new adb process. If the session cannot be started, it
+        is not tried again until the persistent shell is disabled and enabled
+        again.
+        """
+        if self._shell_session is None:
+            self._shell_session = shell_session.AdbShellSession(
+                shlex.split(self.adb_str))
+
+    def disable_persistent_shell(self):
+        """Closes the persistent shell session, if any."""
+        if self._shell_session is not None:
+            self._shell_session.close()
+            self._shell_session = None
+
+    def enable_host_protocol(self,
+                             host=host_protocol.DEFAULT_ADB_SERVER_HOST,
+                             port=None):
+        """Talks to the adb server's socket directly instead of exec-ing adb.
+
+        Affects shell, getprop, pull, tcp_forward and remove_tcp_forward. All
+        other commands still exec the adb binary.
+
+        Args:
+            host: The host the adb server is listening on.
+            port: The port the adb server is listening on. Defaults to the
+                tunnelled server port if the device is on a remote host, and
+                the standard adb server port otherwise.
+        """
+        if port is None:
+            port = (self._server_local_port
+                    or host_protocol.DEFAULT_ADB_SERVER_PORT)
+        self._host_client = host_protocol.AdbHostClient(
+            self.serial, host=host, port=port)
+
+    def disable_host_protocol(self):
+        """Goes back to exec-ing the adb binary for every command."""
+        self._host_client = None
+
+    def _exec_host_protocol_cmd(self, cmd, func, *args, timeout=None):
+        """Calls a function of the AdbHostClient, raising errors as AdbErrors.
+
+        Args:
+            cmd: The equivalent adb command, used for logging and errors.
+            func: The AdbHostClient function to call.
+            *args: The args passed to func.
+            timeout: The timeout passed to func.
+
+        Returns:
+            The value returned by func.
+
+        Raises:
+            AdbError if the adb server rejected the request.
+            job.TimeoutError if the request timed out.
+        """
+        try:
+            return func(*args, timeout=timeout)
+        except socket.timeout:
+            logging.error('Command %s with %s timeout setting timed out', cmd,
+                          timeout)
+            raise job.TimeoutError(job.Result(command=cmd, did_timeout=True))
+        except host_protocol.AdbProtocolError as e:
+            raise AdbError(cmd=cmd, stdout='', stderr='error: %s' % e.message,
+                           ret_code=1)
+
+    def _exec_host_protocol_shell_cmd(self, command, ignore_status, timeout):
+        """Runs the shell command by talking to the adb server directly.
+
+        Returns:
+            The output of the command, or None if the adb server could not be
+            reached and the command has not been run.
+        """
+        cmd = 'shell %s' % shellescape.quote(command)
+        try:
+            shell_result = self._exec_host_protocol_cmd(
+                cmd, self._host_client.shell, command, timeout=timeout)
+        except AdbError as e:
+            result = job.Result(command=cmd, stderr=e.stderr.encode('utf-8'),
+                                exit_status=e.ret_code)
+        except (ConnectionError, EOFError) as e:
+            logging.debug('Unable to reach the adb server: %s', e)
+            return None
+        else:
+            result = job.Result(command=cmd, stdout=shell_result.stdout,
+                                stderr=shell_result.stderr,
+                                exit_status=shell_result.exit_status)
+        logging.debug(result)
+        return self._process_result(cmd, result, ignore_status)
+
+    def _exec_persistent_shell_cmd(self, command, ignore_status, timeout):
+        """Runs the command over the persistent shell session.
+
+        Returns:
+            The output of the command, or None if the session is unusable and
+            the command has not been run.
+
+        Raises:
+            job.TimeoutError if the command timed out.
+        """
+        cmd = '%s shell %s' % (self.adb_str, shellescape.quote(command))
+        try:
+            ret, out, err = self._shell_session.run(command, timeout=timeout)
+        except shell_session.ShellSessionTimeoutError:
+            logging.error('Command %s with %s timeout setting timed out', cmd,
+                          timeout)
+            raise job.TimeoutError(job.Result(command=cmd, did_timeout=True))
+        except shell_session.ShellSessionError as e:
+            logging.debug('Unable to use the persistent shell session: %s', e)
+            return None
+        result = job.Result(command=cmd, stdout=out, stderr=err,
+                            exit_status=ret)
+        logging.debug(result)
+        return self._process_result(cmd, result, ignore_status)
+
     # TODO: This should be abstracted out into an object like the other shell
     # command.
     def shell(self, command, ignore_status=False, timeout=DEFAULT_ADB_TIMEOUT):
+        if self._host_client is not None:
+            output = self._exec_host_protocol_shell_cmd(command, ignore_status,
+                                                        timeout)
+            if output is not None:
+                return output
+        if self._shell_session is not None:
+            output = self._exec_persistent_shell_cmd(command, ignore_status,
+                                                     timeout)
+            if output is not None:
+                return output
         return self._exec_adb_cmd(
             'shell',
             shellescape.quote(command),
@@ -271,12 +562,29 @@ class AdbProxy(object):
              command,
              ignore_status=False,
              timeout=DEFAULT_ADB_PULL_TIMEOUT):
+        if self._host_client is not None:
+            paths = shlex.split(command)
+            # Only plain "<remote> <local>" pulls are supported natively.
+            if len(paths) == 2 and not paths[0].startswith('-'):
+                try:
+                    self._exec_host_protocol_cmd('pull %s' % command,
+                                                 self._host_client.pull,
+                                                 *paths, timeout=timeout)
+                    return ''
+                except AdbError as e:
+                    if DEVICE_NOT_FOUND_REGEX.match(e.stderr):
+                        raise
+                    return e.stderr
+                except (ConnectionError, EOFError) as e:
+                    logging.debug('Unable to reach the adb server: %s', e)
         return self._exec_adb_cmd(
             'pull', command, ignore_status=ignore_status, timeout=timeout)
 
     def __getattr__(self, name):
         def adb_call(*args, **kwargs):
             clean_name = name.replace('_', '-')
+            if clean_name in PROP_CACHE_INVALIDATING_CMDS:
+                self.invalidate_prop_cache()
             arg_str = ' '.join(str(elem) for elem in args)
             return self._exec_adb_cmd(clean_name, arg_str, **kwargs)
 
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""A client for the adb server's smart socket protocol.
+
+The adb server listens on localhost:5037. Each request is sent as a 4 digit
+hex length followed by the request string, and is answered with 'OKAY' or
+'FAIL' followed by a hex length prefixed error message. Requests prefixed with
+'host' are handled by the server itself. Other requests are forwarded to the
+device selected by a preceding 'host:transport:<serial>' request.
+
+See system/core/adb/protocol.txt, SERVICES.TXT and SYNC.TXT in AOSP.
+"""
+import os
+import socket
+import stat
+import struct
+import time
+
+DEFAULT_ADB_SERVER_HOST = '127.0.0.1'
+DEFAULT_ADB_SERVER_PORT = 5037
+
+# The max size of a single DATA chunk in the sync protocol.
+SYNC_DATA_MAX = 64 * 1024
+
+# The ids of the packets sent by the v2 shell protocol.
+SHELL_V2_STDOUT = 1
+SHELL_V2_STDERR = 2
+SHELL_V2_EXIT = 3
+_SHELL_V2_HEADER = struct.Struct('<BI')
+
+_SYNC_HEADER = struct.Struct('<4sI')
+_SYNC_STAT = struct.Struct('<4sIII')
+_SYNC_DENT = struct.Struct('<4sIIII')
+
+
+class AdbProtocolError(Exception):
+    """Raised when the adb server replies with FAIL or an unexpected reply.
+
+    Attributes:
+        request: The request that failed.
+        message: The error message sent by the adb server.
+    """
+
+    def __init__(self, request, message):
+        super().__init__('%s: %s' % (request, message))
+        self.request = request
+        self.message = message
+
+
+class ShellResult(object):
+    """The result of a shell command run over the host protocol.
+
+    Attributes:
+        exit_status: The exit status of the command. 0 if the device does not
+            support the v2 shell protocol, which does not report it.
+        stdout: The raw bytes written to stdout.
+        stderr: The raw bytes written to stderr.
+    """
+
+    def __init__(self, exit_status, stdout, stderr):
+        self.exit_status = exit_status
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class AdbHostClient(object):
+    """Talks to an adb server directly, without exec-ing the adb binary.
+
+    Every request opens a new socket to the adb server, which is cheap
+    compared to forking an adb client process.
+
+    Attributes:
+        serial: The serial of the device this client targets.
+        host: The host the adb server is listening on.
+        port: The port the adb server is listening on.
+        _features: The cached list of features supported by the device.
+    """
+
+    def __init__(self,
+                 serial,
+                 host=DEFAULT_ADB_SERVER_HOST,
+                 port=DEFAULT_ADB_SERVER_PORT):
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self._features = None
+
+    def _connect(self, timeout=None):
+        """Returns a new socket connected to the adb server."""
+        return socket.create_connection((self.host, self.port),
+                                        timeout=timeout)
+
+    @staticmethod
+    def _recv_exactly(sock, size):
+        """Reads exactly size bytes from the socket."""
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise EOFError('Connection to the adb server closed.')
+            data.extend(chunk)
+        return bytes(data)
+
+    @classmethod
+    def _recv_until_close(cls, sock):
+        """Reads everything from the socket until it is closed."""
+        chunks = []
+        while True:
+            chunk = sock.recv(SYNC_DATA_MAX)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    @classmethod
+    def _read_hex_prefixed(cls, sock):
+        """Reads a 4 digit hex length prefixed string from the socket."""
+        length = int(cls._recv_exactly(sock, 4), 16)
+        return cls._recv_exactly(sock, length).decode('utf-8', 'replace')
+
+    @classmethod
+    def _read_status(cls, sock, request):
+        """Reads an OKAY/FAIL status, raising AdbProtocolError on FAIL."""
+        status = cls._recv_exactly(sock, 4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbProtocolError(request, cls._read_hex_prefixed(sock))
+        raise AdbProtocolError(request, 'Unexpected status %r' % status)
+
+    @classmethod
+    def _send_request(cls, sock, request):
+        """Sends a request and waits for the server to acknowledge it."""
+        payload = request.encode('utf-8')
+        sock.sendall(b'%04x' % len(payload) + payload)
+        cls._read_status(sock, request)
+
+    def _open_transport(self, timeout=None):
+        """Returns a socket switched over to this client's device."""
+        sock = self._connect(timeout)
+        try:
+            self._send_request(sock, 'host:transport:%s' % self.serial)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def host_query(self, request, timeout=None):
+        """Sends a request handled by the adb server, returning its reply.
+
+        Args:
+            request: The request, e.g. 'host:version'.
+            timeout: The socket timeout in seconds.
+
+        Returns:
+            The hex length prefixed reply as a string.
+        """
+        sock = self._connect(timeout)
+        try:
+            self._send_request(sock, request)
+            return self._read_hex_prefixed(sock)
+        finally:
+            sock.close()
+
+    def get_features(self):
+        """Returns the list of adb features supported by the device."""
+        if self._features is None:
+            self._features = self.host_query(
+                'host-serial:%s:features' % self.serial).split(',')
+        return self._features
+
+    def forward(self, local, remote, timeout=None):
+        """Forwards a host socket to a device socket.
+
+        Args:
+            local: The host socket, e.g. 'tcp:0' to let adb pick a free port.
+            remote: The device socket, e.g. 'tcp:8080'.
+            timeout: The socket timeout in seconds.
+
+        Returns:
+            The port chosen by adb as a string if it picked one, or ''.
+        """
+        request = 'host-serial:%s:forward:%s;%s' % (self.serial, local,
+                                                    remote)
+        sock = self._connect(timeout)
+        try:
+            self._send_request(sock, request)
+            # The first OKAY acknowledges the request, the second reports the
+            # status of the forward itself.
+            self._read_status(sock, request)
+            try:
+                return self._read_hex_prefixed(sock)
+            except EOFError:
+                return ''
+        finally:
+            sock.close()
+
+    def kill_forward(self, local, timeout=None):
+        """Removes a forward previously created with forward()."""
+        request = 'host-serial:%s:killforward:%s' % (self.serial, local)
+        sock = self._connect(timeout)
+        try:
+            self._send_request(sock, request)
+            self._read_status(sock, request)
+        finally:
+            sock.close()
+
+    def shell(self, command, timeout=None):
+        """Runs a shell command on the device.
+
+        Uses the v2 shell protocol when the device supports it, which reports
+        stderr and the exit status separately.
+
+        Args:
+            command: The shell command to run.
+            timeout: The socket timeout in seconds.
+
+        Returns:
+            A ShellResult.
+        """
+        use_shell_v2 = 'shell_v2' in self.get_features()
+        sock = self._open_transport(timeout)
+        try:
+            if not use_shell_v2:
+                self._send_request(sock, 'shell:%s' % command)
+                return ShellResult(0, self._recv_until_close(sock), b'')
+            self._send_request(sock, 'shell,v2,raw:%s' % command)
+            stdout = []
+            stderr = []
+            exit_status = None
+            while exit_status is None:
+                try:
+                    header = self._recv_exactly(sock, _SHELL_V2_HEADER.size)
+                except EOFError:
+                    # The device went away before reporting an exit status.
+                    exit_status = 255
+                    break
+                packet_id, length = _SHELL_V2_HEADER.unpack(header)
+                data = self._recv_exactly(sock, length)
+                if packet_id == SHELL_V2_STDOUT:
+                    stdout.append(data)
+                elif packet_id == SHELL_V2_STDERR:
+                    stderr.append(data)
+                elif packet_id == SHELL_V2_EXIT:
+                    exit_status = data[0]
+            return ShellResult(exit_status, b''.join(stdout), b''.join(stderr))
+        finally:
+            sock.close()
+
+    def _open_sync(self, timeout=None):
+        """Returns a socket in sync mode for transferring files."""
+        sock = self._open_transport(timeout)
+        try:
+            self._send_request(sock, 'sync:')
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _send_sync_request(sock, sync_id, path):
+        payload = path.encode('utf-8')
+        sock.sendall(_SYNC_HEADER.pack(sync_id, len(payload)) + payload)
+
+    def _stat(self, sock, path):
+        """Returns the (mode, size, mtime) of the remote path."""
+        self._send_sync_request(sock, b'STAT', path)
+        sync_id, mode, size, mtime = _SYNC_STAT.unpack(
+            self._recv_exactly(sock, _SYNC_STAT.size))
+        if sync_id != b'STAT':
+            raise AdbProtocolError('STAT %s' % path,
+                                   'Unexpected reply %r' % sync_id)
+        return mode, size, mtime
+
+    def _list(self, sock, path):
+        """Returns the names of the entries in the remote directory."""
+        self._send_sync_request(sock, b'LIST', path)
+        names = []
+        while True:
+            sync_id, _, _, _, name_length = _SYNC_DENT.unpack(
+                self._recv_exactly(sock, _SYNC_DENT.size))
+            if sync_id == b'DONE':
+                return names
+            name = self._recv_exactly(sock, name_length).decode('utf-8')
+            if name not in ('.', '..'):
+                names.append(name)
+
+    def _recv_file(self, sock, remote_path, local_path):
+        """Copies a single remote file to local_path."""
+        self._send_sync_request(sock, b'RECV', remote_path)
+        with open(local_path, 'wb') as local_file:
+            while True:
+                sync_id, length = _SYNC_HEADER.unpack(
+                    self._recv_exactly(sock, _SYNC_HEADER.size))
+                if sync_id == b'DONE':
+                    return
+                data = self._recv_exactly(sock, length)
+                if sync_id == b'FAIL':
+                    raise AdbProtocolError('RECV %s' % remote_path,
+                                           data.decode('utf-8', 'replace'))
+                if sync_id != b'DATA':
+                    raise AdbProtocolError('RECV %s' % remote_path,
+                                           'Unexpected reply %r' % sync_id)
+                local_file.write(data)
+
+    def _pull_path(self, sock, remote_path, local_path):
+        mode, _, _ = self._stat(sock, remote_path)
+        if mode == 0:
+            raise AdbProtocolError('pull %s' % remote_path,
+                                   'remote object does not exist')
+        if stat.S_ISDIR(mode):
+            os.makedirs(local_path, exist_ok=True)
+            for name in self._list(sock, remote_path):
+                self._pull_path(sock, '%s/%s' % (remote_path.rstrip('/'), name),
+                                os.path.join(local_path, name))
+        else:
+            self._recv_file(sock, remote_path, local_path)
+
+    def pull(self, remote_path, local_path, timeout=None):
+        """Copies a file or directory from the device, like `adb pull`.
+
+        Args:
+            remote_path: The path on the device.
+            local_path: The destination on the host. If it is an existing
+                directory, the remote object is copied into it.
+            timeout: The socket timeout in seconds.
+        """
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path,
+                                      os.path.basename(remote_path.rstrip('/')))
+        sock = self._open_sync(timeout)
+        try:
+            self._pull_path(sock, remote_path, local_path)
+        finally:
+            sock.close()
+
+    def push(self, local_path, remote_path, timeout=None):
+        """Copies a single file to the device, like `adb push`.
+
+        Args:
+            local_path: The file on the host.
+            remote_path: The destination path of the file on the device.
+            timeout: The socket timeout in seconds.
+        """
+        mode = stat.S_IMODE(os.stat(local_path).st_mode)
+        sock = self._open_sync(timeout)
+        try:
+            self._send_sync_request(sock, b'SEND',
+                                    '%s,%d' % (remote_path, mode))
+            with open(local_path, 'rb') as local_file:
+                while True:
+                    data = local_file.read(SYNC_DATA_MAX)
+                    if not data:
+                        break
+                    sock.sendall(_SYNC_HEADER.pack(b'DATA', len(data)) + data)
+            sock.sendall(_SYNC_HEADER.pack(b'DONE', int(time.time())))
+            sync_id, length = _SYNC_HEADER.unpack(
+                self._recv_exactly(sock, _SYNC_HEADER.size))
+            if sync_id != b'OKAY':
+                message = self._recv_exactly(sock, length)
+                raise AdbProtocolError('SEND %s' % remote_path,
+                                       message.decode('utf-8', 'replace'))
+        finally:
+            sock.close()
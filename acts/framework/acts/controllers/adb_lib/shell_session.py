@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import logging
+import queue
+import shellescape
+import subprocess
+import threading
+import time
+import uuid
+
+# The time to wait for a newly started session to echo its first sentinel.
+SESSION_START_TIMEOUT = 10
+
+# The start of the sentinel line marking the end of a command's stderr.
+_STDERR_SENTINEL_PREFIX = b'ACTS_SHELL_STDERR_DONE_'
+
+
+class ShellSessionError(Exception):
+    """Raised when the persistent shell session is unusable.
+
+    Callers are expected to fall back to spawning a new adb process.
+    """
+
+
+class ShellSessionTimeoutError(ShellSessionError):
+    """Raised when a command does not finish within its timeout."""
+
+
+class _SessionExited(Exception):
+    """Raised internally when the adb shell process exits mid-command."""
+
+
+class AdbShellSession(object):
+    """A long-lived `adb shell` process that runs many commands.
+
+    Each command runs in a subshell with stdin detached, so it cannot change
+    the session's state or consume the following commands. The start of each
+    command is marked by a unique sentinel line on stdout. The end of its
+    output, and its exit status, are marked by another sentinel line on
+    stdout, and the end of its stderr by a sentinel line on stderr. Without
+    shell_v2, `adb shell` merges the remote stderr into stdout, so the stderr
+    sentinel is also accepted on stdout. The command's stderr is then part of
+    its stdout, as with `adb shell` itself.
+
+    If the session cannot be started, it is not tried again, and every
+    command raises ShellSessionError.
+
+    Attributes:
+        adb_cmd: The argv used to start adb, excluding the 'shell' argument.
+        log: The logger for this session.
+        _proc: The `adb shell` subprocess.Popen object.
+        _stdout_lines: A Queue of lines read from the process's stdout.
+        _stderr_lines: A Queue of lines read from the process's stderr.
+        _lock: A lock held while a command is running. A session can only run
+            one command at a time.
+        _start_failed: Whether starting the session has failed.
+    """
+
+    def __init__(self, adb_cmd):
+        """Creates a new AdbShellSession. The session is started lazily.
+
+        Args:
+            adb_cmd: The argv used to start adb, e.g. ['adb', '-s', serial].
+        """
+        self.adb_cmd = list(adb_cmd)
+        self.log = logging.getLogger()
+        self._proc = None
+        self._stdout_lines = None
+        self._stderr_lines = None
+        self._lock = threading.Lock()
+        self._start_failed = False
+
+    @property
+    def is_alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _start(self):
+        """Starts the `adb shell` process and its output reader threads."""
+        self._proc = subprocess.Popen(
+            self.adb_cmd + ['shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self._stdout_lines = queue.Queue()
+        self._stderr_lines = queue.Queue()
+        for stream, lines in ((self._proc.stdout, self._stdout_lines),
+                              (self._proc.stderr, self._stderr_lines)):
+            reader = threading.Thread(
+                target=self._read_lines,
+                args=(stream, lines, self._stderr_lines))
+            reader.daemon = True
+            reader.start()
+        # Verify the shell is responsive before handing it out.
+        try:
+            self._run_locked('true', SESSION_START_TIMEOUT)
+        except (ShellSessionError, _SessionExited, OSError) as e:
+            self._start_failed = True
+            raise ShellSessionError(
+                'Unable to start an adb shell session: %s' % e)
+
+    @staticmethod
+    def _read_lines(stream, lines, stderr_lines):
+        """Reads lines from the stream into the queue until EOF.
+
+        Stderr sentinel lines go to stderr_lines instead, wherever they were
+        read from.
+        """
+        for line in iter(stream.readline, b''):
+            if line.startswith(_STDERR_SENTINEL_PREFIX):
+                stderr_lines.put(line)
+            else:
+                lines.put(line)
+        # None marks that the session has ended. Only the end of stdout
+        # counts, since stderr may be closed early when it is merged into
+        # stdout.
+        if lines is not stderr_lines:
+            lines.put(None)
+            stderr_lines.put(None)
+
+    def run(self, command, timeout=None):
+        """Runs a command in the session.
+
+        Args:
+            command: The shell command to run on the device.
+            timeout: The max seconds to wait for the command to finish.
+
+        Returns:
+            A tuple of (exit_status, stdout bytes, stderr bytes). If the adb
+            shell process exits while the command runs (e.g. the device
+            rebooted or adbd restarted), the output read so far is returned
+            with an exit status of 255, as `adb shell` itself would.
+
+        Raises:
+            ShellSessionError if the session is busy with another command,
+                could not be started now or before, or exited before the
+                command began. The command has not been run.
+            ShellSessionTimeoutError if the command timed out. The session is
+                closed, since its output stream is now out of sync.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ShellSessionError('The shell session is busy.')
+        try:
+            if self._start_failed:
+                raise ShellSessionError(
+                    'The adb shell session could not be started.')
+            if not self.is_alive:
+                self._start()
+            try:
+                return self._run_locked(command, timeout)
+            except _SessionExited as e:
+                self._kill()
+                return e.args
+        except ShellSessionError:
+            self._kill()
+            raise
+        except OSError as e:
+            self._kill()
+            raise ShellSessionError(e)
+        finally:
+            self._lock.release()
+
+    def _run_locked(self, command, timeout):
+        """Runs the command. Must be called while holding _lock."""
+        start_sentinel = 'ACTS_SHELL_START_%s' % uuid.uuid4().hex
+        sentinel_id = uuid.uuid4().hex
+        sentinel = 'ACTS_SHELL_DONE_%s' % sentinel_id
+        stderr_sentinel = _STDERR_SENTINEL_PREFIX.decode() + sentinel_id
+        script = ('echo %s; (eval %s) </dev/null; __acts_rc=$?; '
+                  'echo; echo %s:$__acts_rc; echo >&2; echo %s >&2\n' %
+                  (start_sentinel, shellescape.quote(command), sentinel,
+                   stderr_sentinel))
+        # The timeout bounds the whole command, however much it outputs.
+        deadline = None if timeout is None else time.time() + timeout
+        self._proc.stdin.write(script.encode('utf-8'))
+        self._proc.stdin.flush()
+
+        _, started = self._read_until(self._stdout_lines,
+                                      start_sentinel.encode('utf-8'),
+                                      deadline, timeout)
+        if not started:
+            raise ShellSessionError(
+                'The adb shell session exited before running the command.')
+        stdout_lines, stdout_done = self._read_until(
+            self._stdout_lines, sentinel.encode('utf-8'), deadline, timeout)
+        stderr_lines, stderr_done = self._read_until(
+            self._stderr_lines, stderr_sentinel.encode('utf-8'), deadline,
+            timeout)
+        if not (stdout_done and stderr_done):
+            raise _SessionExited(255, b''.join(stdout_lines).rstrip(b'\n'),
+                                 b''.join(stderr_lines).rstrip(b'\n'))
+        exit_status = int(stdout_lines.pop().split(b':')[-1])
+        stderr_lines.pop()
+        # Drop the newlines echoed before each sentinel.
+        return (exit_status, b''.join(stdout_lines)[:-1],
+                b''.join(stderr_lines)[:-1])
+
+    @staticmethod
+    def _read_until(lines, sentinel, deadline, timeout):
+        """Reads lines up to and including the sentinel line.
+
+        Args:
+            lines: The queue of lines to read.
+            sentinel: The start of the line to read up to.
+            deadline: The time.time() to give up at, or None to wait forever.
+            timeout: The timeout the deadline was computed from.
+
+        Returns:
+            A tuple of (lines read, whether the sentinel was found). The
+            sentinel is not found if the stream was closed first.
+        """
+        result = []
+        while True:
+            try:
+                if deadline is None:
+                    line = lines.get()
+                else:
+                    line = lines.get(
+                        timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                raise ShellSessionTimeoutError(
+                    'Timed out after %s seconds waiting for output.' % timeout)
+            if line is None:
+                return result, False
+            result.append(line)
+            if line.startswith(sentinel):
+                return result, True
+
+    def _kill(self):
+        """Kills the adb shell process, if running."""
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait()
+            except OSError as e:
+                self.log.debug('Error killing adb shell session: %s', e)
+            self._proc = None
+
+    def close(self):
+        """Closes the session."""
+        with self._lock:
+            self._kill()
@@ -15,6 +15,7 @@
 #   limitations under the License.
 
 import collections
+import contextlib
 import logging
 import math
 import os
@@ -23,6 +24,7 @@ import socket
 import time
 from builtins import open
 from builtins import str
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from acts import context
@@ -64,6 +66,11 @@ WAIT_FOR_DEVICE_TIMEOUT = 180
 ENCRYPTION_WINDOW = "CryptKeeper"
 DEFAULT_DEVICE_PASSWORD = "1111"
 RELEASE_ID_REGEXES = [re.compile(r'\w+\.\d+\.\d+'), re.compile(r'N\w+')]
+# The maximum number of devices brought up or torn down at the same time.
+MAX_CONCURRENT_DEVICE_SETUPS = 8
+# The number of search_logcat queries whose results are kept, so repeating
+# them only searches the logcat written since.
+MAX_CACHED_LOGCAT_SEARCHES = 32
 
 
 def create(configs):
@@ -92,13 +99,21 @@ def create(configs):
 
     ads[0].log.info('The primary device under test is "%s".' % ads[0].serial)
 
-    for ad in ads:
-        if not ad.is_connected():
+    def check_connected(ad):
+        with ad.record_setup_time('connect'):
+            return ad.is_connected()
+
+    for ad, connected in zip(ads, _run_on_ads(check_connected, ads)):
+        if not connected:
             raise errors.AndroidDeviceError(
                 ("Android device %s is specified in config"
                  " but is not attached.") % ad.serial,
                 serial=ad.serial)
     _start_services_on_ads(ads)
+    for ad in ads:
+        ad.log.info('Setup times: %s', ', '.join(
+            '%s %.2fs' % (phase, duration)
+            for phase, duration in ad.setup_times.items()))
     return ads
 
 
@@ -108,12 +123,39 @@ def destroy(ads):
     Args:
         ads: A list of AndroidDevice objects.
     """
-    for ad in ads:
+    def clean_up(ad):
         try:
             ad.clean_up()
         except:
             ad.log.exception("Failed to clean up properly.")
 
+    _run_on_ads(clean_up, ads)
+
+
+def _run_on_ads(func, ads):
+    """Calls a function on multiple AndroidDevice objects concurrently.
+
+    At most MAX_CONCURRENT_DEVICE_SETUPS calls run at the same time.
+
+    Args:
+        func: The function to call. Takes an AndroidDevice as its only
+            argument.
+        ads: A list of AndroidDevice objects.
+
+    Returns:
+        A list of the values returned by func, in the order of ads.
+
+    Raises:
+        The exception raised by func for the first device in ads it failed
+        on. All calls finish before anything is raised.
+    """
+    if not ads:
+        return []
+    with ThreadPoolExecutor(max_workers=min(
+            len(ads), MAX_CONCURRENT_DEVICE_SETUPS)) as executor:
+        futures = [executor.submit(func, ad) for ad in ads]
+    return [future.result() for future in futures]
+
 
 def get_info(ads):
     """Get information on a list of AndroidDevice objects.
@@ -153,16 +195,19 @@ def _start_services_on_ads(ads):
     Args:
         ads: A list of AndroidDevice objects whose services to start.
     """
-    running_ads = []
-    for ad in ads:
-        running_ads.append(ad)
+    def start_services(ad):
         try:
             ad.start_services()
         except:
             ad.log.exception('Failed to start some services, abort!')
-            destroy(running_ads)
             raise
 
+    try:
+        _run_on_ads(start_services, ads)
+    except:
+        destroy(ads)
+        raise
+
 
 def _parse_device_list(device_list_str, key):
     """Parses a byte string representing a list of devices. The string is
@@ -209,10 +254,7 @@ def get_instances(serials):
     Returns:
         A list of AndroidDevice objects.
     """
-    results = []
-    for s in serials:
-        results.append(AndroidDevice(s))
-    return results
+    return _create_ads(AndroidDevice, serials)
 
 
 def get_instances_with_configs(configs):
@@ -227,23 +269,57 @@ def get_instances_with_configs(configs):
     Returns:
         A list of AndroidDevice objects.
     """
-    results = []
     for c in configs:
-        try:
-            serial = c.pop('serial')
-        except KeyError:
+        if 'serial' not in c:
             raise errors.AndroidDeviceConfigError(
                 "Required value 'serial' is missing in AndroidDevice config %s."
                 % c)
+
+    def create_ad(c):
+        serial = c.pop('serial')
         ssh_config = c.pop('ssh_config', None)
+        persistent_adb_shell = c.pop('persistent_adb_shell', False)
+        adb_host_protocol = c.pop('adb_host_protocol', False)
         ssh_connection = None
         if ssh_config is not None:
             ssh_settings = settings.from_config(ssh_config)
             ssh_connection = connection.SshConnection(ssh_settings)
         ad = AndroidDevice(serial, ssh_connection=ssh_connection)
+        if persistent_adb_shell:
+            ad.adb.enable_persistent_shell()
+        if adb_host_protocol:
+            ad.adb.enable_host_protocol()
         ad.load_config(c)
-        results.append(ad)
-    return results
+        return ad
+
+    return _create_ads(create_ad, configs)
+
+
+def _create_ads(func, args):
+    """Creates AndroidDevice objects concurrently.
+
+    If any of them cannot be created, the ones that were are cleaned up.
+
+    Args:
+        func: The function creating an AndroidDevice from one of args.
+        args: A list of the arguments to create the AndroidDevice objects
+            from.
+
+    Returns:
+        A list of AndroidDevice objects, in the order of args.
+    """
+    ads = []
+
+    def create_ad(arg):
+        ad = func(arg)
+        ads.append(ad)
+        return ad
+
+    try:
+        return _run_on_ads(create_ad, args)
+    except:
+        destroy(ads)
+        raise
 
 
 def get_all_instances(include_fastboot=False):
@@ -342,6 +418,17 @@ def take_bug_reports(ads, test_name, begin_time):
     utils.concurrent_exec(take_br, args)
 
 
+def _basic_regex_to_python(pattern):
+    """Converts a grep basic regular expression to a Python one.
+
+    Only the characters that are literal in basic regular expressions, unless
+    escaped, and special in Python ones are converted.
+    """
+    return re.sub(r'(\\?)([+?(){}|])',
+                  lambda m: m.group(2) if m.group(1) else '\\' + m.group(2),
+                  pattern)
+
+
 class AndroidDevice:
     """Class representing an android device.
 
@@ -372,6 +459,8 @@ class AndroidDevice:
             AndroidDeviceLoggerAdapter(logging.getLogger(), {
                 'serial': serial
             }))
+        # How long each phase of bringing up the device took, in seconds.
+        self.setup_times = collections.OrderedDict()
         self._event_dispatchers = {}
         self._services = []
         self.register_service(services.AdbLogcatService(self))
@@ -381,13 +470,16 @@ class AndroidDevice:
         self.fastboot = fastboot.FastbootProxy(
             serial, ssh_connection=ssh_connection)
         if not self.is_bootloader:
-            self.root_adb()
+            with self.record_setup_time('root'):
+                self.root_adb()
         self._ssh_connection = ssh_connection
         self.skip_sl4a = False
         self.crash_report = None
         self.data_accounting = collections.defaultdict(int)
         self._sl4a_manager = sl4a_manager.Sl4aManager(self.adb)
         self.last_logcat_timestamp = None
+        # Maps search_logcat arguments to a LogcatCursor and the lines found.
+        self._logcat_searches = {}
         # Device info cache.
         self._user_added_device_info = {}
         self._sdk_api_level = None
@@ -400,9 +492,26 @@ class AndroidDevice:
         for service in self._services:
             service.unregister()
         self._services.clear()
+        self.adb.disable_persistent_shell()
         if self._ssh_connection:
             self._ssh_connection.close()
 
+    @contextlib.contextmanager
+    def record_setup_time(self, phase):
+        """Records how long a phase of bringing up the device takes.
+
+        The duration is stored in setup_times, replacing any previous value
+        for the phase.
+
+        Args:
+            phase: The name of the phase, e.g. 'logcat'.
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.setup_times[phase] = time.time() - start_time
+
     def register_service(self, service):
         """Registers the service on the device. """
         service.register()
@@ -420,7 +529,8 @@ class AndroidDevice:
             skip_setup_wizard: Whether or not to skip the setup wizard.
         """
         if skip_setup_wizard:
-            self.exit_setup_wizard()
+            with self.record_setup_time('setup_wizard'):
+                self.exit_setup_wizard()
 
         event_bus.post(android_events.AndroidStartServicesEvent(self))
 
@@ -453,8 +563,11 @@ class AndroidDevice:
                            "info.")
             return
 
-        build_id = self.adb.getprop("ro.build.id")
-        incremental_build_id = self.adb.getprop("ro.build.version.incremental")
+        props = self.adb.getprops(
+            ["ro.build.id", "ro.build.version.incremental", "ro.build.type"],
+            use_cache=True)
+        build_id = props["ro.build.id"]
+        incremental_build_id = props["ro.build.version.incremental"]
         valid_build_id = False
         for regex in RELEASE_ID_REGEXES:
             if re.match(regex, build_id):
@@ -466,7 +579,7 @@ class AndroidDevice:
         info = {
             "build_id": build_id,
             "incremental_build_id": incremental_build_id,
-            "build_type": self.adb.getprop("ro.build.type")
+            "build_type": props["ro.build.type"]
         }
         return info
 
@@ -493,7 +606,8 @@ class AndroidDevice:
                 'Device is in fastboot mode. Cannot get build info.')
             return
         self._sdk_api_level = int(
-            self.adb.shell('getprop ro.build.version.sdk'))
+            self.adb.getprops(['ro.build.version.sdk'],
+                              use_cache=True)['ro.build.version.sdk'])
         return self._sdk_api_level
 
     @property
@@ -527,11 +641,13 @@ class AndroidDevice:
                 if len(tokens) > 1:
                     return tokens[1].lower()
             return None
-        model = self.adb.getprop("ro.build.product").lower()
+        props = self.adb.getprops(["ro.build.product", "ro.product.name"],
+                                  use_cache=True)
+        model = props["ro.build.product"].lower()
         if model == "sprout":
             return model
         else:
-            return self.adb.getprop("ro.product.name").lower()
+            return props["ro.product.name"].lower()
 
     @property
     def droid(self):
@@ -582,6 +698,7 @@ class AndroidDevice:
         return context.get_current_context().get_full_output_path(self.serial)
 
     def update_sdk_api_level(self):
+        self.adb.invalidate_prop_cache()
         self._sdk_api_level = None
         self.sdk_api_level()
 
@@ -726,6 +843,13 @@ class AndroidDevice:
         tag_len = utils.MAX_FILENAME_LEN - len(out_name)
         out_name = '%s,%s' % (tag[:tag_len], out_name)
         adb_excerpt_path = os.path.join(adb_excerpt_dir, out_name)
+        logcat_writer = self._get_indexing_logcat_writer(logcat_path)
+        if logcat_writer is not None:
+            with open(adb_excerpt_path, 'w', encoding='utf-8') as out:
+                for line in logcat_writer.iter_lines(log_begin_time,
+                                                     log_end_time):
+                    out.write(line + '\n')
+            return adb_excerpt_path
         with open(adb_excerpt_path, 'w', encoding='utf-8') as out:
             in_file = logcat_path
             with open(in_file, 'r', encoding='utf-8', errors='replace') as f:
@@ -751,7 +875,10 @@ class AndroidDevice:
         """Search logcat message with given string.
 
         Args:
-            matching_string: matching_string to search.
+            matching_string: matching_string to search, as a grep basic
+                regular expression.
+            begin_time: Epoch time in ms of the first messages to return, or
+                None to return all messages.
 
         Returns:
             A list of dictionaries with full log message, time stamp string
@@ -766,6 +893,10 @@ class AndroidDevice:
         if not os.path.exists(logcat_path):
             self.log.warning("Logcat file %s does not exist." % logcat_path)
             return
+        logcat_writer = self._get_indexing_logcat_writer(logcat_path)
+        if logcat_writer is not None:
+            return self._search_indexed_logcat(logcat_path, logcat_writer,
+                                               matching_string, begin_time)
         output = job.run(
             "grep '%s' %s" % (matching_string, logcat_path), ignore_status=True)
         if not output.stdout or output.exit_status != 0:
@@ -789,6 +920,84 @@ class AndroidDevice:
             })
         return result
 
+    def subscribe_logcat(self, matching_strings, begin_time=None):
+        """Subscribes to the logcat messages matching any of the strings.
+
+        Unlike search_logcat, the messages are received as adb logcat outputs
+        them, without reading the logcat file.
+
+        Args:
+            matching_strings: A list of strings to match, as grep basic
+                regular expressions.
+            begin_time: If given, the epoch time in ms of the first messages
+                written before subscribing to receive too.
+
+        Returns:
+            A logcat.LogcatSubscription. Its get method returns each matching
+            message line. Close it once done.
+
+        Raises:
+            AndroidDeviceError: If adb logcat is not running.
+        """
+        logcat_writer = logcat.get_logcat_writer(self.serial)
+        if not self.is_adb_logcat_on or logcat_writer is None:
+            raise errors.AndroidDeviceError(
+                'Cannot subscribe to logcat messages, adb logcat is not '
+                'running.', serial=self.serial)
+        log_begin_time = None
+        if begin_time:
+            log_begin_time = acts_logger.epoch_to_log_line_timestamp(
+                begin_time)
+        return logcat_writer.subscribe(
+            [_basic_regex_to_python(string) for string in matching_strings],
+            log_begin_time)
+
+    def _get_indexing_logcat_writer(self, logcat_path):
+        """Returns the LogcatFileWriter indexing logcat_path, or None."""
+        logcat_writer = logcat.get_logcat_writer(self.serial)
+        if logcat_writer is None or not logcat_writer.is_indexing(
+                logcat_path):
+            return None
+        return logcat_writer
+
+    def _search_indexed_logcat(self, logcat_path, logcat_writer,
+                               matching_string, begin_time):
+        """Implements search_logcat with the index of the logcat file.
+
+        The lines found are kept with a cursor, so repeating a search only
+        searches the lines written since.
+        """
+        log_begin_time = None
+        begin_datetime = None
+        if begin_time:
+            log_begin_time = acts_logger.epoch_to_log_line_timestamp(
+                begin_time)
+            begin_datetime = datetime.strptime(log_begin_time,
+                                               "%Y-%m-%d %H:%M:%S.%f")
+        key = (logcat_path, matching_string, begin_time)
+        cursor, lines = self._logcat_searches.pop(key, (None, []))
+        new_lines, new_cursor = logcat_writer.search(
+            _basic_regex_to_python(matching_string), log_begin_time, cursor)
+        if cursor is not None and cursor.generation != new_cursor.generation:
+            # The file was rotated, so all of the new file was searched.
+            lines = []
+        lines = lines + new_lines
+        if len(self._logcat_searches) >= MAX_CACHED_LOGCAT_SEARCHES:
+            self._logcat_searches.clear()
+        self._logcat_searches[key] = (new_cursor, lines)
+        result = []
+        for line in lines:
+            time_stamp = line[:acts_logger.log_line_timestamp_len]
+            time_obj = datetime.strptime(time_stamp, "%Y-%m-%d %H:%M:%S.%f")
+            if begin_datetime and time_obj < begin_datetime:
+                continue
+            result.append({
+                "log_message": line,
+                "time_stamp": time_stamp,
+                "datetime_obj": time_obj
+            })
+        return result
+
     def start_adb_logcat(self):
         """Starts a standing adb logcat collection in separate subprocesses and
         save the logcat in a file.
@@ -807,8 +1016,10 @@ class AndroidDevice:
         else:
             extra_params = "-b all"
 
+        # Optional LogcatFileWriter settings, e.g. {"compress": true}.
+        file_options = getattr(self, 'adb_logcat_file_options', {})
         self.adb_logcat_process = logcat.create_logcat_keepalive_process(
-            self.serial, self.log_dir, extra_params)
+            self.serial, self.log_dir, extra_params, **file_options)
         self.adb_logcat_process.start()
 
     def stop_adb_logcat(self):
@@ -824,6 +1035,7 @@ class AndroidDevice:
         # but it does not pose a problem for our logging purposes.
         self.adb_logcat_process.stop()
         self.adb_logcat_process = None
+        logcat.close_logcat_writer(self.serial)
 
     def get_apk_uid(self, apk_name):
         """Get the uid of the given apk.
@@ -951,8 +1163,10 @@ class AndroidDevice:
             br_out_path = out.split(':')[1].strip().split()[0]
             self.adb.pull("%s %s" % (br_out_path, full_out_path))
         else:
-            self.adb.bugreport(
-                " > {}".format(full_out_path), timeout=BUG_REPORT_TIMEOUT)
+            with open(full_out_path, 'wb') as out:
+                for chunk in self.adb.stream('bugreport',
+                                             timeout=BUG_REPORT_TIMEOUT):
+                    out.write(chunk)
         self.log.info("Bugreport for %s taken at %s.", test_name,
                       full_out_path)
         self.adb.wait_for_device(timeout=WAIT_FOR_DEVICE_TIMEOUT)
@@ -1045,11 +1259,21 @@ class AndroidDevice:
                 timeout=PULL_TIMEOUT,
                 ignore_status=True)
 
-    def start_new_session(self, max_connections=None, server_port=None):
+    def start_new_session(self,
+                          max_connections=None,
+                          server_port=None,
+                          multiplex=False):
         """Start a new session in sl4a.
 
         Also caches the droid in a dict with its uid being the key.
 
+        Args:
+            max_connections: The max number of client connections for the
+                session.
+            server_port: The SL4A server port on the device to connect to.
+            multiplex: If True, RPCs are pipelined over one shared connection
+                rather than each opening its own forwarded socket.
+
         Returns:
             An Android object used to communicate with sl4a on the android
                 device.
@@ -1059,7 +1283,9 @@ class AndroidDevice:
             existing uid to a new session.
         """
         session = self._sl4a_manager.create_session(
-            max_connections=max_connections, server_port=server_port)
+            max_connections=max_connections,
+            server_port=server_port,
+            multiplex=multiplex)
 
         self._sl4a_manager.sessions[session.uid] = session
         return session.rpc_client
@@ -1172,6 +1398,7 @@ class AndroidDevice:
         """
         if self.is_bootloader:
             self.fastboot.reboot()
+            self.adb.invalidate_prop_cache()
             return
         self.stop_services()
         self.log.info("Rebooting")
@@ -14,14 +14,61 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import bisect
+import collections
+import gzip
 import logging
+import mmap
+import os
+import queue
 import re
+import threading
+from datetime import datetime
+from datetime import timedelta
 
+from acts import context
+from acts.event import event_bus
 from acts.libs.proc.process import Process
-from acts.libs.logging import log_stream
-from acts.libs.logging.log_stream import LogStyles
 
 TIMESTAMP_REGEX = r'((?:\d+-)?\d+-\d+ \d+:\d+:\d+.\d+)'
+# Matches a complete timestamp at the start of a line, in raw logcat output.
+_LINE_TIMESTAMP_REGEX = re.compile(
+    b'\n' + TIMESTAMP_REGEX.encode('ascii') + b'(?=\\s)')
+# Only this many bytes at the end of each chunk are searched for a timestamp,
+# unless the chunk's tail does not contain one.
+_TIMESTAMP_SEARCH_WINDOW = 4096
+# Matches the 'YYYY-MM-DD HH:MM:SS.mmm' timestamp starting a '-v year' line.
+_YEAR_TIMESTAMP_REGEX = re.compile(
+    br'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3}')
+_YEAR_TIMESTAMP_LEN = 23
+_YEAR_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# How far out of timestamp order logcat lines may be written. Lines from
+# different buffers are not always output in order.
+_TIMESTAMP_MARGIN_MS = 10000
+# The minimum number of bytes between two entries of a LogcatIndex.
+_INDEX_INTERVAL = 64 * 1024
+
+# A position in a logcat file, as returned by the LogcatFileWriter queries.
+LogcatCursor = collections.namedtuple('LogcatCursor', ['generation', 'offset'])
+
+
+def _shift_timestamp(timestamp, delta_ms):
+    """Returns the year timestamp moved by delta_ms milliseconds, or None if
+    it cannot be parsed.
+    """
+    try:
+        time = datetime.strptime(timestamp, _YEAR_TIMESTAMP_FORMAT)
+        time += timedelta(milliseconds=delta_ms)
+    except (ValueError, OverflowError):
+        return None
+    return time.strftime(_YEAR_TIMESTAMP_FORMAT)[:-3]
+
+
+def _line_timestamp(line):
+    """Returns the year timestamp starting the line, or None."""
+    if _YEAR_TIMESTAMP_REGEX.match(line) is None:
+        return None
+    return line[:_YEAR_TIMESTAMP_LEN].decode('ascii')
 
 
 class TimestampTracker(object):
@@ -29,6 +76,7 @@ class TimestampTracker(object):
 
     def __init__(self):
         self._last_timestamp = None
+        self._at_line_start = True
 
     @property
     def last_timestamp(self):
@@ -40,32 +88,516 @@ class TimestampTracker(object):
         if len(all_timestamps) > 0:
             self._last_timestamp = all_timestamps[0]
 
+    def read_output_chunk(self, data):
+        """Reads a chunk of raw logcat output, which may start or end in the
+        middle of a line, and keeps the timestamp of its last timestamped line.
+
+        Only the end of the chunk is searched, unless it has no timestamp.
+        """
+        # Prepending a newline lets the regex match a line starting the chunk.
+        prefix = b'\n' if self._at_line_start else b''
+        self._at_line_start = data.endswith(b'\n')
+        if len(data) > _TIMESTAMP_SEARCH_WINDOW:
+            tail = data[-_TIMESTAMP_SEARCH_WINDOW:]
+            match = self._find_last_timestamp(tail)
+            if match is not None:
+                self._last_timestamp = match
+                return
+        match = self._find_last_timestamp(prefix + data)
+        if match is not None:
+            self._last_timestamp = match
+
+    @staticmethod
+    def _find_last_timestamp(data):
+        """Returns the last line timestamp in data, or None if there is none.
+        """
+        last_match = None
+        for last_match in _LINE_TIMESTAMP_REGEX.finditer(data):
+            pass
+        if last_match is None:
+            return None
+        return last_match.group(1).decode('ascii')
+
+
+class LogcatIndex(object):
+    """A sparse index from timestamps to offsets in a logcat file.
+
+    Each entry maps the offset of a line start to the latest timestamp written
+    before it. Year timestamps are compared as strings, which orders them by
+    time.
+    """
+
+    def __init__(self, interval=_INDEX_INTERVAL):
+        """Creates a LogcatIndex.
+
+        Args:
+            interval: The minimum number of bytes between two entries.
+        """
+        self._interval = interval
+        self._timestamps = []
+        self._offsets = []
+
+    def add(self, offset, timestamp):
+        """Adds an entry, unless it is too close to the last one.
+
+        Args:
+            offset: The offset of the start of a line.
+            timestamp: The latest timestamp of the lines before offset.
+        """
+        if timestamp is None:
+            return
+        if self._offsets:
+            if offset - self._offsets[-1] < self._interval:
+                return
+            # Keeps the timestamps sorted, for bisecting.
+            timestamp = max(timestamp, self._timestamps[-1])
+        self._timestamps.append(timestamp)
+        self._offsets.append(offset)
+
+    def find_offset(self, timestamp):
+        """Returns the largest indexed offset only preceded by lines older
+        than timestamp, or 0.
+        """
+        i = bisect.bisect_left(self._timestamps, timestamp)
+        return self._offsets[i - 1] if i else 0
+
+
+def _matching_lines(regex, data, start, end):
+    """Yields the timestamped lines of data[start:end] that regex matches.
+
+    Only the matching lines are split out of data.
+
+    Args:
+        regex: The compiled bytes regular expression, with re.MULTILINE.
+        data: The bytes, or mmap, to search.
+        start: The offset of the first line to search.
+        end: The offset of the end of the last line to search.
+
+    Yields:
+        Each matching line, as bytes without its line separators.
+    """
+    match = regex.search(data, start, end)
+    while match is not None:
+        line_start = data.rfind(b'\n', start, match.start()) + 1
+        line_end = data.find(b'\n', match.start(), end)
+        if line_end < 0:
+            line_end = end
+        line = data[max(line_start, start):line_end].rstrip(b'\r')
+        if _line_timestamp(line) is not None:
+            yield line
+        match = regex.search(data, line_end + 1, end)
+
+
+class LogcatSubscription(object):
+    """Receives the logcat lines matching some patterns as they are written.
+
+    Created by LogcatFileWriter.subscribe. Closing the subscription stops it
+    from receiving lines.
+    """
+
+    def __init__(self, writer, patterns):
+        self._writer = writer
+        self._regex = re.compile(
+            '|'.join('(?:%s)' % pattern for pattern in patterns).encode(
+                'utf-8'), re.MULTILINE)
+        self._lines = queue.Queue()
+        self._lock = threading.Lock()
+        # The lines written while the older lines are replayed.
+        self._pending = []
+
+    def _replay(self, lines):
+        """Queues the older lines, then the lines written in the meantime."""
+        with self._lock:
+            for line in lines + self._pending:
+                self._lines.put(line)
+            self._pending = None
+
+    def _feed(self, data):
+        """Queues the lines of data, complete lines of output, that match."""
+        lines = [
+            line.decode('utf-8', errors='replace')
+            for line in _matching_lines(self._regex, data, 0, len(data))
+        ]
+        if not lines:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(lines)
+                return
+        for line in lines:
+            self._lines.put(line)
+
+    def get(self, timeout=None):
+        """Returns the next matching line.
 
-def _get_log_level(message):
-    """Returns the log level for the given message."""
-    if message.startswith('-') or len(message) < 37:
-        return logging.ERROR
-    else:
-        log_level = message[36]
-        if log_level in ('V', 'D'):
-            return logging.DEBUG
-        elif log_level == 'I':
-            return logging.INFO
-        elif log_level == 'W':
-            return logging.WARNING
-        elif log_level == 'E':
-            return logging.ERROR
-    return logging.NOTSET
+        Args:
+            timeout: The seconds to wait for a line, or None to wait forever.
+
+        Returns:
+            The line, without its line separators, or None if no line matched
+            within the timeout.
+        """
+        try:
+            return self._lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Stops receiving lines."""
+        self._writer.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class LogcatFileWriter(object):
+    """Writes raw logcat output to a file in the current test context.
+
+    The output is written as-is, without going through the logging module.
+    Like a TESTCASE_LOG log_stream, the file is moved to the output directory
+    of each new test class and test case context.
+
+    Uncompressed files are indexed by timestamp as they are written, and can
+    be queried with iter_lines, search and tail. The queries only read the
+    complete lines of the file currently written to. search and tail return
+    a LogcatCursor, with which the next query only reads the lines written
+    since. subscribe instead pushes the matching lines as they are written.
+
+    Attributes:
+        file_name: The name of the file written to, without its directory.
+    """
 
+    def __init__(self, serial, logcat_dir, timestamp_tracker, compress=False,
+                 max_bytes=0, backup_count=5):
+        """Creates a LogcatFileWriter.
 
-def _log_line_func(log, timestamp_tracker):
-    """Returns a lambda that logs a message to the given logger."""
+        Args:
+            serial: The serial of the device the logcat comes from.
+            logcat_dir: The directory, relative to the test context's output
+                directory, to write the logcat file in.
+            timestamp_tracker: The TimestampTracker to update with the written
+                output.
+            compress: Whether to gzip the file. Compressed files get a '.gz'
+                suffix.
+            max_bytes: If non-zero, the file is rotated before it exceeds this
+                many bytes of logcat output. Rotated files get the suffixes
+                '.1' (most recent) to '.<backup_count>'.
+            backup_count: The number of rotated files to keep.
+        """
+        self._log_name = serial
+        self.file_name = 'adblog_%s_debug.txt' % serial
+        if compress:
+            self.file_name += '.gz'
+        self._timestamp_tracker = timestamp_tracker
+        self._compress = compress
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._file = None
+        self._file_path = None
+        self._bytes_written = 0
+        # The size of the file, and the size of its complete lines.
+        self._offset = 0
+        self._complete_size = 0
+        # Incremented each time the file is opened.
+        self._generation = 0
+        self._index = None
+        # Whether the last chunk written ended in the middle of a line.
+        self._mid_line = False
+        # The incomplete last line written, and the LogcatSubscriptions to
+        # send the lines completed by each write to.
+        self._partial_line = b''
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        context.TestContext.add_base_output_path(
+            self._log_name, getattr(logging, 'log_path', '/tmp/logs'))
+        context.TestContext.add_subcontext(self._log_name, logcat_dir)
+        self._registration_id = event_bus.register(context.NewContextEvent,
+                                                   self._on_new_context)
 
-    def log_line(message):
-        timestamp_tracker.read_output(message)
-        log.log(_get_log_level(message), message)
+    def _open(self):
+        """Opens the file in the current context's output directory."""
+        directory = context.get_current_context().get_full_output_path(
+            self._log_name)
+        self._file_path = os.path.join(directory, self.file_name)
+        if self._compress:
+            self._file = gzip.open(self._file_path, 'ab')
+        else:
+            # Unbuffered, so readers of the file see every chunk written.
+            self._file = open(self._file_path, 'ab', buffering=0)
+            self._offset = os.fstat(self._file.fileno()).st_size
+            self._complete_size = self._offset
+            self._index = LogcatIndex()
+        self._bytes_written = 0
+        self._generation += 1
+        self._mid_line = False
 
-    return log_line
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self):
+        """Moves the current file to '.1', shifting older rotated files."""
+        self._close_file()
+        for i in range(self._backup_count - 1, 0, -1):
+            src = '%s.%d' % (self._file_path, i)
+            if os.path.exists(src):
+                os.replace(src, '%s.%d' % (self._file_path, i + 1))
+        if self._backup_count > 0:
+            os.replace(self._file_path, '%s.1' % self._file_path)
+        else:
+            os.remove(self._file_path)
+        self._open()
+
+    def _write_to_file(self, data):
+        """Writes data to the open file, indexing it if not compressed."""
+        if not data:
+            return
+        if self._index is not None and not self._compress:
+            line_start = data.find(b'\n') + 1 if self._mid_line else 0
+            if line_start or not self._mid_line:
+                self._index.add(self._offset + line_start,
+                                self._timestamp_tracker.last_timestamp)
+        self._file.write(data)
+        self._bytes_written += len(data)
+        self._offset += len(data)
+        last_newline = data.rfind(b'\n')
+        if last_newline >= 0:
+            self._complete_size = self._offset - len(data) + last_newline + 1
+        self._mid_line = not data.endswith(b'\n')
+
+    def _on_new_context(self, _):
+        """Makes the next write go to the file of the new context."""
+        with self._lock:
+            self._close_file()
+
+    def write(self, data):
+        """Writes a chunk of raw logcat output.
+
+        Args:
+            data: The bytes to write.
+        """
+        with self._lock:
+            if self._file is None:
+                self._open()
+            remaining = data
+            if (self._max_bytes and self._bytes_written
+                    and self._bytes_written + len(data) > self._max_bytes):
+                # Finish the current line in the old file, if possible.
+                split = data.find(b'\n') + 1 if self._mid_line else 0
+                self._write_to_file(data[:split])
+                remaining = data[split:]
+                self._rotate()
+            self._write_to_file(remaining)
+            self._publish(data)
+        self._timestamp_tracker.read_output_chunk(data)
+
+    def _publish(self, data):
+        """Sends the lines completed by data to the subscriptions."""
+        last_newline = data.rfind(b'\n')
+        if last_newline < 0:
+            self._partial_line += data
+            return
+        if self._subscriptions:
+            lines = self._partial_line + data[:last_newline]
+            for subscription in self._subscriptions:
+                subscription._feed(lines)
+        self._partial_line = data[last_newline + 1:]
+
+    def subscribe(self, patterns, begin_timestamp=None):
+        """Subscribes to the lines matching any of the patterns.
+
+        Lines are received as they are written, without reading the file.
+
+        Args:
+            patterns: A list of regular expressions, as str.
+            begin_timestamp: If given, the matching lines of the current file
+                since this year timestamp are received first, if the file is
+                indexed.
+
+        Returns:
+            The LogcatSubscription receiving the lines.
+        """
+        subscription = LogcatSubscription(self, patterns)
+        log_file = None
+        with self._lock:
+            self._subscriptions.append(subscription)
+            if (begin_timestamp is not None and not self._compress
+                    and self._index is not None):
+                log_file, start, end, _ = self._open_range_locked(
+                    begin_timestamp, None)
+        lines = []
+        if log_file is not None:
+            lines = self._search_range(subscription._regex, log_file, start,
+                                       end, begin_timestamp)
+        subscription._replay(lines)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stops sending lines to a LogcatSubscription."""
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def is_indexing(self, file_path):
+        """Returns whether file_path is the indexed file written to."""
+        with self._lock:
+            return (not self._compress and self._index is not None
+                    and self._file_path == file_path)
+
+    def _open_range(self, begin_timestamp, cursor):
+        """Opens the file for reading the complete lines after the cursor, or
+        else after the lines older than begin_timestamp.
+
+        Returns:
+            A tuple of the opened file, the offset to read from, the offset to
+            read to and the cursor at that end.
+        """
+        with self._lock:
+            return self._open_range_locked(begin_timestamp, cursor)
+
+    def _open_range_locked(self, begin_timestamp, cursor):
+        """Implements _open_range, with the lock held."""
+        if begin_timestamp is not None:
+            begin_timestamp = _shift_timestamp(begin_timestamp,
+                                               -_TIMESTAMP_MARGIN_MS)
+        end = self._complete_size
+        if cursor is not None and cursor.generation == self._generation:
+            start = cursor.offset
+        elif begin_timestamp is not None and self._index is not None:
+            start = self._index.find_offset(begin_timestamp)
+        else:
+            start = 0
+        # Opened while locked, so a rotation cannot move the file first.
+        log_file = open(self._file_path, 'rb')
+        return (log_file, min(start, end), end,
+                LogcatCursor(self._generation, end))
+
+    def _read_lines(self, log_file, start, end, begin_timestamp=None,
+                    end_timestamp=None):
+        """Yields the timestamped lines in a range of log_file, and closes it.
+        """
+        stop_timestamp = None
+        if end_timestamp is not None:
+            stop_timestamp = _shift_timestamp(end_timestamp,
+                                              _TIMESTAMP_MARGIN_MS)
+        with log_file:
+            log_file.seek(start)
+            offset = start
+            while offset < end:
+                line = log_file.readline(end - offset)
+                offset += len(line)
+                timestamp = _line_timestamp(line)
+                if timestamp is None:
+                    continue
+                if stop_timestamp is not None and timestamp > stop_timestamp:
+                    break
+                if begin_timestamp is not None and timestamp < begin_timestamp:
+                    continue
+                if end_timestamp is not None and timestamp > end_timestamp:
+                    continue
+                yield line.rstrip(b'\r\n').decode('utf-8', errors='replace')
+
+    def iter_lines(self, begin_timestamp=None, end_timestamp=None):
+        """Returns an iterator over the timestamped lines in a time range.
+
+        Only the lines near the time range are read.
+
+        Args:
+            begin_timestamp: The year timestamp of the first lines to return,
+                or None to start at the beginning of the file.
+            end_timestamp: The year timestamp of the last lines to return, or
+                None to read to the end of the file.
+
+        Returns:
+            An iterator over the lines, without their line separators.
+        """
+        log_file, start, end, _ = self._open_range(begin_timestamp, None)
+        return self._read_lines(log_file, start, end, begin_timestamp,
+                                end_timestamp)
+
+    def search(self, pattern, begin_timestamp=None, cursor=None):
+        """Finds the timestamped lines matching a regular expression.
+
+        The file is searched without splitting it into lines, so only the
+        matching lines are processed individually.
+
+        Args:
+            pattern: The regular expression to search, as a str.
+            begin_timestamp: The year timestamp of the first lines to search,
+                or None to search the whole file.
+            cursor: The LogcatCursor returned by a previous query, to only
+                search the lines written since.
+
+        Returns:
+            A tuple of the matching lines, without their line separators, and
+            the LogcatCursor at the end of the lines searched.
+        """
+        regex = re.compile(pattern.encode('utf-8'), re.MULTILINE)
+        log_file, start, end, end_cursor = self._open_range(
+            begin_timestamp, cursor)
+        return (self._search_range(regex, log_file, start, end,
+                                   begin_timestamp), end_cursor)
+
+    @staticmethod
+    def _search_range(regex, log_file, start, end, begin_timestamp):
+        """Returns the matching lines in a range of log_file, and closes it.
+        """
+        lines = []
+        with log_file:
+            if start == end:
+                return lines
+            with mmap.mmap(log_file.fileno(), end,
+                           access=mmap.ACCESS_READ) as data:
+                for line in _matching_lines(regex, data, start, end):
+                    if (begin_timestamp is None
+                            or _line_timestamp(line) >= begin_timestamp):
+                        lines.append(line.decode('utf-8', errors='replace'))
+        return lines
+
+    def tail(self, cursor=None):
+        """Returns the timestamped lines written since the cursor.
+
+        Args:
+            cursor: The LogcatCursor returned by a previous query, or None to
+                read the whole file. If the file has been rotated or moved to
+                a new context since, the whole new file is read.
+
+        Returns:
+            A tuple of the lines, without their line separators, and the
+            LogcatCursor at their end.
+        """
+        log_file, start, end, end_cursor = self._open_range(None, cursor)
+        return list(self._read_lines(log_file, start, end)), end_cursor
+
+    def close(self):
+        """Closes the file and stops following test context changes."""
+        event_bus.unregister(self._registration_id)
+        with self._lock:
+            self._close_file()
+
+
+_writers = {}
+
+
+def get_logcat_writer(serial):
+    """Returns the LogcatFileWriter of the device's logcat process, or None.
+    """
+    return _writers.get(serial)
+
+
+def close_logcat_writer(serial):
+    """Closes the LogcatFileWriter of the device's logcat process, if any.
+
+    This flushes the file, e.g. writes the end of a compressed file, so it
+    must be called once the logcat process has been stopped.
+    """
+    writer = _writers.pop(serial, None)
+    if writer is not None:
+        writer.close()
 
 
 def _on_retry(serial, extra_params, timestamp_tracker):
@@ -79,24 +611,35 @@ def _on_retry(serial, extra_params, timestamp_tracker):
     return on_retry
 
 
-def create_logcat_keepalive_process(serial, logcat_dir, extra_params=''):
+def create_logcat_keepalive_process(serial, logcat_dir, extra_params='',
+                                    compress=False, max_bytes=0,
+                                    backup_count=5):
     """Creates a Logcat Process that automatically attempts to reconnect.
 
+    The output is written in raw chunks to adblog_<serial>_debug.txt in the
+    logcat_dir of the current test context. When the process dies, it is
+    restarted from the last timestamp written.
+
     Args:
         serial: The serial of the device to read the logcat of.
         logcat_dir: The directory used for logcat file output.
         extra_params: Any additional params to be added to the logcat cmdline.
+        compress: Whether to gzip the logcat file. See LogcatFileWriter.
+        max_bytes: The size to rotate the logcat file at, or 0 to not rotate.
+        backup_count: The number of rotated logcat files to keep.
 
     Returns:
         A acts.libs.proc.process.Process object.
     """
-    logger = log_stream.create_logger(
-        'adblog_%s' % serial, log_name=serial, subcontext=logcat_dir,
-        log_styles=(LogStyles.LOG_DEBUG | LogStyles.TESTCASE_LOG))
+    timestamp_tracker = TimestampTracker()
+    close_logcat_writer(serial)
+    writer = LogcatFileWriter(serial, logcat_dir, timestamp_tracker,
+                              compress=compress, max_bytes=max_bytes,
+                              backup_count=backup_count)
+    _writers[serial] = writer
     process = Process('adb -s %s logcat -T 1 -v year %s' %
                       (serial, extra_params))
-    timestamp_tracker = TimestampTracker()
-    process.set_on_output_callback(_log_line_func(logger, timestamp_tracker))
+    process.set_on_output_callback(writer.write, binary=True)
     process.set_on_terminate_callback(
         _on_retry(serial, extra_params, timestamp_tracker))
     return process
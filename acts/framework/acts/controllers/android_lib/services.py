@@ -79,7 +79,8 @@ class AdbLogcatService(AndroidService):
     """Service for adb logcat."""
 
     def _start(self, _):
-        self.ad.start_adb_logcat()
+        with self.ad.record_setup_time('logcat'):
+            self.ad.start_adb_logcat()
 
     def _stop(self, _):
         self.ad.stop_adb_logcat()
@@ -92,18 +93,21 @@ class Sl4aService(AndroidService):
         if self.ad.skip_sl4a:
             return
 
-        if not self.ad.is_sl4a_installed():
-            self.ad.log.error('sl4a.apk is not installed')
-            raise errors.AndroidDeviceError(
-                'The required sl4a.apk is not installed',
-                serial=self.serial)
-        if not self.ad.ensure_screen_on():
-            self.ad.log.error("User window cannot come up")
-            raise errors.AndroidDeviceError(
-                "User window cannot come up", serial=self.serial)
-
-        droid, ed = self.ad.get_droid()
-        ed.start()
+        with self.ad.record_setup_time('sl4a_start'):
+            if not self.ad.is_sl4a_installed():
+                self.ad.log.error('sl4a.apk is not installed')
+                raise errors.AndroidDeviceError(
+                    'The required sl4a.apk is not installed',
+                    serial=self.serial)
+            if not self.ad.ensure_screen_on():
+                self.ad.log.error("User window cannot come up")
+                raise errors.AndroidDeviceError(
+                    "User window cannot come up", serial=self.serial)
+            self.ad._sl4a_manager.start_sl4a_service()
+
+        with self.ad.record_setup_time('sl4a_session'):
+            droid, ed = self.ad.get_droid()
+            ed.start()
 
     def _stop(self, _):
         self.ad.terminate_all_sessions()
@@ -16,10 +16,10 @@ import collections
 import itertools
 import logging
 import os
-import time
 
 from acts.controllers.ap_lib import hostapd_config
 from acts.controllers.utils_lib.commands import shell
+from acts.libs.proc import job
 
 
 class Error(Exception):
@@ -78,20 +78,18 @@ class Hostapd(object):
 
         self.config = config
 
-        self._shell.delete_file(self._ctrl_file)
-        self._shell.delete_file(self._log_file)
-        self._shell.delete_file(self._config_file)
+        self._shell.delete_files(
+            [self._ctrl_file, self._log_file, self._config_file])
         self._write_configs(additional_parameters=additional_parameters)
 
         hostapd_command = '%s -dd -t "%s"' % (self.PROGRAM_FILE,
                                               self._config_file)
         base_command = 'cd "%s"; %s' % (self._working_dir, hostapd_command)
         job_str = '%s > "%s" 2>&1' % (base_command, self._log_file)
-        self._runner.run_async(job_str)
+        pid = int(self._runner.run_async(job_str).stdout)
 
         try:
-            self._wait_for_process(timeout=timeout)
-            self._wait_for_interface(timeout=timeout)
+            self._wait_for_interface(pid, timeout=timeout)
         except:
             self.stop()
             raise
@@ -116,63 +114,39 @@ class Hostapd(object):
         # TODO: Auto pulling of logs when stop is called.
         return self._shell.read_file(self._log_file)
 
-    def _wait_for_process(self, timeout=60):
-        """Waits for the process to come up.
-
-        Waits until the hostapd process is found running, or there is
-        a timeout. If the program never comes up then the log file
-        will be scanned for errors.
-
-        Raises: See _scan_for_errors
-        """
-        start_time = time.time()
-        while time.time() - start_time < timeout and not self.is_alive():
-            self._scan_for_errors(False)
-            time.sleep(0.1)
-
-    def _wait_for_interface(self, timeout=60):
+    def _wait_for_interface(self, pid, timeout=60):
         """Waits for hostapd to report that the interface is up.
 
-        Waits until hostapd says the interface has been brought up or an
-        error occurs.
-
-        Raises: see _scan_for_errors
-        """
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            success = self._shell.search_file('Setup of interface done',
-                                              self._log_file)
-            if success:
-                return
-
-            self._scan_for_errors(True)
-
-    def _scan_for_errors(self, should_be_up):
-        """Scans the hostapd log for any errors.
+        Follows the hostapd log until hostapd says the interface has been
+        brought up, an error is logged or hostapd exits. Only the one remote
+        command following the log is run while waiting.
 
         Args:
-            should_be_up: If true then hostapd program is expected to be alive.
-                          If it is found not alive while this is true an error
-                          is thrown.
+            pid: The process id hostapd was started with.
+            timeout: The time to wait for the interface to come up.
 
         Raises:
             Error: Raised when a hostapd error is found.
         """
-        # Store this so that all other errors have priority.
-        is_dead = not self.is_alive()
-
-        bad_config = self._shell.search_file('Interface initialization failed',
-                                             self._log_file)
-        if bad_config:
-            raise Error('Interface failed to start', self)
-
-        bad_config = self._shell.search_file(
-            "Interface %s wasn't started" % self._interface, self._log_file)
-        if bad_config:
+        success = 'Setup of interface done'
+        try:
+            found = self._shell.watch_file(
+                self._log_file, [
+                    success, 'Interface initialization failed',
+                    "Interface %s wasn't started" % self._interface
+                ],
+                timeout=timeout,
+                pid=pid)
+        except job.TimeoutError:
+            logging.warning('Hostapd did not report the interface %s as up '
+                            'within %s seconds.' % (self._interface, timeout))
+            return
+
+        if found == success:
+            return
+        if found is not None:
             raise Error('Interface failed to start', self)
-
-        if should_be_up and is_dead:
-            raise Error('Hostapd failed to start', self)
+        raise Error('Hostapd failed to start', self)
 
     def _write_configs(self, additional_parameters=None):
         """Writes the configs to the hostapd config file."""
@@ -85,6 +85,7 @@ def create(configs):
 
 def destroy(fds):
     for fd in fds:
+        fd.session.close()
         del fd
 
 
@@ -160,27 +161,30 @@ class FuchsiaDevice:
         # TODO(): Come up with better client numbering system
         self.client_id = "FuchsiaClient" + str(random.randint(0, 1000000))
         self.test_counter = 0
+        # Keeps the connection to the SL4F server alive between commands.
+        self.session = requests.Session()
 
         # Grab commands from FuchsiaBleLib
         self.ble_lib = FuchsiaBleLib(self.address, self.test_counter,
-                                     self.client_id)
+                                     self.client_id, self.session)
         # Grab commands from FuchsiaBtaLib
         self.bta_lib = FuchsiaBtaLib(self.address, self.test_counter,
-                                     self.client_id)
+                                     self.client_id, self.session)
         # Grab commands from FuchsiaGattcLib
         self.gattc_lib = FuchsiaGattcLib(self.address, self.test_counter,
-                                         self.client_id)
+                                         self.client_id, self.session)
         # Grab commands from FuchsiaGattsLib
         self.gatts_lib = FuchsiaGattsLib(self.address, self.test_counter,
-                                         self.client_id)
+                                         self.client_id, self.session)
 
         # Grab commands from FuchsiaNetstackLib
         self.netstack_lib = FuchsiaNetstackLib(self.address,
                                                self.test_counter,
-                                               self.client_id)
+                                               self.client_id,
+                                               self.session)
         # Grab commands from FuchsiaWlanLib
         self.wlan_lib = FuchsiaWlanLib(self.address, self.test_counter,
-                                       self.client_id)
+                                       self.client_id, self.session)
         # Start sl4f on device
         self.start_services()
         # Init server
@@ -205,7 +209,7 @@ class FuchsiaDevice:
                 "client_id": self.client_id
             }
         })
-        requests.get(url=self.init_address, data=init_data)
+        self.session.get(url=self.init_address, data=init_data)
         self.test_counter += 1
 
     def print_clients(self):
@@ -221,7 +225,7 @@ class FuchsiaDevice:
             "params": print_args
         })
 
-        r = requests.get(url=self.print_address, data=data).json()
+        r = self.session.get(url=self.print_address, data=data).json()
         self.test_counter += 1
 
         return r
@@ -240,7 +244,7 @@ class FuchsiaDevice:
             "params": cleanup_args
         })
 
-        r = requests.get(url=self.cleanup_address, data=data).json()
+        r = self.session.get(url=self.cleanup_address, data=data).json()
         self.test_counter += 1
 
         self.log.debug("Cleaned up with status: ", r)
@@ -23,14 +23,42 @@ import random
 import re
 import requests
 import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The most commands sent at once by send_command_async, across all devices.
+MAX_ASYNC_COMMANDS = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Returns the executor that runs the commands of send_command_async."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_ASYNC_COMMANDS)
+        return _executor
 
 
 class BaseLib():
-    def __init__(self, addr, tc, client_id):
+    def __init__(self, addr, tc, client_id, session=None):
+        """
+        Args:
+            addr: string, the address of the SL4F server.
+            tc: int, the test counter.
+            client_id: string, the id of the SL4F client.
+            session: requests.Session, the session to send commands with, so
+                that the connection to the SL4F server is kept alive between
+                commands. Shared by all libs of a FuchsiaDevice. If None, a
+                new session is made.
+        """
         self.address = addr
         self.test_counter = tc
         self.client_id = client_id
+        self.session = session or requests.Session()
 
     def build_id(self, test_id):
         """Concatenates client_id and test_id to form a command_id.
@@ -51,10 +79,61 @@ class BaseLib():
         Returns:
             Dictionary, Result of sl4f command executed.
         """
-        test_data = json.dumps({
+        test_data = json.dumps(self._build_request(test_id, test_cmd,
+                                                   test_args))
+        return self.session.get(url=self.address, data=test_data).json()
+
+    def send_command_async(self, test_id, test_cmd, test_args):
+        """Sends a JSON command to SL4F server without waiting for the result.
+
+        Used to run commands on several Fuchsia devices concurrently.
+
+        Args:
+            test_id: string, unique identifier of test command.
+            test_cmd: string, sl4f method name of command.
+            test_args: dictionary, arguments required to execute test_cmd.
+
+        Returns:
+            A concurrent.futures.Future of the result of the sl4f command.
+        """
+        return _get_executor().submit(self.send_command, test_id, test_cmd,
+                                      test_args)
+
+    def send_batch(self, commands):
+        """Sends several JSON commands to SL4F server in one request.
+
+        The commands are sent as a JSON-RPC 2.0 batch. If the server does not
+        answer the batch with a list of results, the commands are sent one at
+        a time instead.
+
+        Args:
+            commands: list of (test_id, test_cmd, test_args) tuples, as given
+                      to send_command.
+
+        Returns:
+            List of dictionaries, the results of the sl4f commands, in the
+            order of commands.
+        """
+        if not commands:
+            return []
+        test_data = json.dumps([
+            self._build_request(test_id, test_cmd, test_args)
+            for test_id, test_cmd, test_args in commands
+        ])
+        results = self.session.get(url=self.address, data=test_data).json()
+        if not isinstance(results, list):
+            logging.debug("SL4F server does not accept batches, sending the "
+                          "commands one at a time.")
+            return [self.send_command(*command) for command in commands]
+
+        results_by_id = {result.get("id"): result for result in results}
+        return [results_by_id.get(test_id) for test_id, _, _ in commands]
+
+    @staticmethod
+    def _build_request(test_id, test_cmd, test_args):
+        return {
             "jsonrpc": "2.0",
             "id": test_id,
             "method": test_cmd,
             "params": test_args
-        })
-        return requests.get(url=self.address, data=test_data).json()
+        }
@@ -30,7 +30,4 @@ from acts.controllers.fuchsia_lib.base_lib import BaseLib
 # Placeholder for Bluetooth adapter commands
 
 class FuchsiaBtaLib(BaseLib):
-    def __init__(self, addr, tc, client_id):
-        self.address = addr
-        self.test_counter = tc
-        self.client_id = client_id
+    pass
@@ -18,11 +18,6 @@ from acts.controllers.fuchsia_lib.base_lib import BaseLib
 
 
 class FuchsiaGattcLib(BaseLib):
-    def __init__(self, addr, tc, client_id):
-        self.address = addr
-        self.test_counter = tc
-        self.client_id = client_id
-
     def bleStartBleScan(self, scan_filter):
         """Starts a BLE scan
 
@@ -21,11 +21,6 @@ COMMAND_CONNECT = "wlan.connect"
 COMMAND_DISCONNECT = "wlan.disconnect"
 
 class FuchsiaWlanLib(BaseLib):
-    def __init__(self, addr, tc, client_id):
-        self.address = addr
-        self.test_counter = tc
-        self.client_id = client_id
-
     def wlanStartScan(self):
         """ Starts a wlan scan
 
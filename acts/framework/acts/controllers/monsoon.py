@@ -27,6 +27,7 @@ import sys
 import time
 import collections
 
+import numpy as np
 # http://pyserial.sourceforge.net/
 # On ubuntu, apt-get install python3-pyserial
 import serial
@@ -39,6 +40,11 @@ from acts.controllers import android_device
 ACTS_CONTROLLER_CONFIG_NAME = "Monsoon"
 ACTS_CONTROLLER_REFERENCE_NAME = "monsoons"
 
+# One measurement record of a data packet: main, usb and aux current, and
+# voltage, as big-endian signed shorts.
+DATA_RECORD_DTYPE = np.dtype([("main", ">i2"), ("usb", ">i2"), ("aux", ">i2"),
+                              ("voltage", ">i2")])
+
 
 def create(configs):
     objs = []
@@ -302,6 +308,11 @@ class MonsoonProxy(object):
     def CollectData(self):
         """Return some current samples. Call StartDataCollection() first.
         """
+        return self.CollectDataArray().tolist()
+
+    def CollectDataArray(self):
+        """Like CollectData, but returns the samples as a numpy float64 array.
+        """
         while 1:  # loop until we get data or a timeout
             _bytes = self._ReadPacket()
             if not _bytes:
@@ -312,11 +323,12 @@ class MonsoonProxy(object):
                 continue
 
             seq, _type, x, y = struct.unpack("BBBB", _bytes[:4])
-            data = [
-                struct.unpack(">hhhh", _bytes[x:x + 8])
-                for x in range(4,
-                               len(_bytes) - 8, 8)
-            ]
+            # The trailing record is never complete, so it is not decoded.
+            data = np.frombuffer(
+                _bytes,
+                dtype=DATA_RECORD_DTYPE,
+                count=len(range(4, len(_bytes) - 8, 8)),
+                offset=4)
 
             if self._last_seq and seq & 0xF != (self._last_seq + 1) & 0xF:
                 logging.warning("Data sequence skipped, lost packet?")
@@ -327,20 +339,18 @@ class MonsoonProxy(object):
                     logging.warning(
                         "Waiting for calibration, dropped data packet.")
                     continue
-                out = []
-                for main, usb, aux, voltage in data:
-                    if main & 1:
-                        coarse = ((main & ~1) - self._coarse_zero)
-                        out.append(coarse * self._coarse_scale)
-                    else:
-                        out.append((main - self._fine_zero) * self._fine_scale)
-                return out
+                # Widen before subtracting so the int16 values cannot wrap.
+                main = data["main"].astype(np.int64)
+                return np.where(
+                    main & 1,
+                    ((main & ~1) - self._coarse_zero) * self._coarse_scale,
+                    (main - self._fine_zero) * self._fine_scale)
             elif _type == 1:
-                self._fine_zero = data[0][0]
-                self._coarse_zero = data[1][0]
+                self._fine_zero = int(data["main"][0])
+                self._coarse_zero = int(data["main"][1])
             elif _type == 2:
-                self._fine_ref = data[0][0]
-                self._coarse_ref = data[1][0]
+                self._fine_ref = int(data["main"][0])
+                self._coarse_ref = int(data["main"][1])
             else:
                 logging.warning("Discarding data packet type=0x%02x", _type)
                 continue
@@ -380,7 +390,7 @@ class MonsoonProxy(object):
                 "Length mismatch, expected %d bytes, got %d bytes.", data_len,
                 len(result))
         body = result[:-1]
-        checksum = (sum(struct.unpack("B" * len(body), body)) + data_len) % 256
+        checksum = (sum(body) + data_len) % 256
         if result[-1] != checksum:
             raise MonsoonError(
                 "Invalid checksum from serial port! Expected %s, got %s",
@@ -407,10 +417,51 @@ class MonsoonProxy(object):
         #     logging.info("dropped >%d bytes" % flushed)
 
 
+class _SampleBuffer(object):
+    """A FIFO of float samples stored in a reusable numpy array.
+
+    Consuming samples only moves the read position. The unread samples are
+    moved back to the start of the array when new samples do not fit after
+    them, and the array grows only when the unread samples fill it.
+    """
+
+    def __init__(self, capacity=4096):
+        self._data = np.empty(capacity)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def extend(self, samples):
+        """Appends an array of samples to the end of the buffer."""
+        size = len(self)
+        if self._end + len(samples) > len(self._data):
+            if size + len(samples) > len(self._data):
+                data = np.empty(max(2 * len(self._data), size + len(samples)))
+            else:
+                data = self._data
+            data[:size] = self._data[self._start:self._end]
+            self._data = data
+            self._start, self._end = 0, size
+        self._data[self._end:self._end + len(samples)] = samples
+        self._end += len(samples)
+
+    def peek(self, n):
+        """Returns a view of the first n samples without consuming them."""
+        return self._data[self._start:self._start + n]
+
+    def consume(self, n):
+        """Drops the first n samples."""
+        self._start += n
+
+
 class MonsoonData(object):
     """A class for reporting power measurement data from monsoon.
 
-    Data means the measured current value in Amps.
+    Data means the measured current value in Amps. The data points and
+    timestamps are either lists, or numpy arrays when loaded from a binary
+    file (see save_to_binary_file).
     """
     # Number of digits for long rounding.
     lr = 8
@@ -418,6 +469,13 @@ class MonsoonData(object):
     sr = 6
     # Delimiter for writing multiple MonsoonData objects to text file.
     delimiter = "\n\n==========\n\n"
+    # Binary files are a sequence of records, one per MonsoonData. Each record
+    # is a header, the tag padded to a multiple of 8 bytes, the int64
+    # timestamps and the float32 currents padded to a multiple of 8 bytes.
+    # The header holds: magic, hz, voltage, offset, number of samples and the
+    # length of the tag.
+    binary_magic = b"MONSOON1"
+    binary_header_format = "<8sddQQI4x"
 
     def __init__(self, data_points, timestamps, hz, voltage, offset=0):
         """Instantiates a MonsoonData object.
@@ -452,14 +510,14 @@ class MonsoonData(object):
         len_data_pt = len(self.data_points)
         if len_data_pt == 0:
             return 0
-        cur = sum(self.data_points) * 1000 / len_data_pt
+        cur = self._sum_data_points() * 1000 / len_data_pt
         return round(cur, self.sr)
 
     @property
     def total_charge(self):
         """Total charged used in the unit of mAh.
         """
-        charge = (sum(self.data_points) / self.hz) * 1000 / 3600
+        charge = (self._sum_data_points() / self.hz) * 1000 / 3600
         return round(charge, self.sr)
 
     @property
@@ -469,6 +527,12 @@ class MonsoonData(object):
         power = self.average_current * self.voltage
         return round(power, self.sr)
 
+    def _sum_data_points(self):
+        """Returns the sum of the data points after the offset."""
+        if isinstance(self.data_points, np.ndarray):
+            return float(np.sum(self.data_points, dtype=np.float64))
+        return sum(self.data_points)
+
     @staticmethod
     def from_string(data_str):
         """Creates a MonsoonData object from a string representation generated
@@ -554,6 +618,95 @@ class MonsoonData(object):
                 results.append(MonsoonData.from_string(data_str))
         return results
 
+    @staticmethod
+    def save_to_binary_file(monsoon_data, file_path):
+        """Save multiple MonsoonData objects to a binary file.
+
+        The file can be loaded with from_binary_file, which memory-maps the
+        data instead of parsing it. Currents are stored as float32.
+
+        Args:
+            monsoon_data: A list of MonsoonData objects to write to a binary
+                file.
+            file_path: The full path of the file to save to, including the file
+                name.
+        """
+        if not monsoon_data:
+            raise MonsoonError("Attempting to write empty Monsoon data to "
+                               "file, abort")
+        utils.create_dir(os.path.dirname(file_path))
+        with open(file_path, 'ab') as f:
+            for md in monsoon_data:
+                tag = (md.tag or "").encode("utf-8")
+                f.write(
+                    struct.pack(MonsoonData.binary_header_format,
+                                MonsoonData.binary_magic, md.hz, md.voltage,
+                                md.offset, len(md._data_points), len(tag)))
+                f.write(tag + b"\0" * (-len(tag) % 8))
+                f.write(np.asarray(md._timestamps, dtype="<i8").tobytes())
+                currents = np.asarray(md._data_points, dtype="<f4").tobytes()
+                f.write(currents + b"\0" * (-len(currents) % 8))
+
+    @staticmethod
+    def from_binary_file(file_path):
+        """Load MonsoonData objects from a binary file generated by
+        MonsoonData.save_to_binary_file.
+
+        The file is memory-mapped, so the data points and timestamps of the
+        returned objects are read-only numpy arrays backed by the file.
+
+        Args:
+            file_path: The full path of the file load from, including the file
+                name.
+
+        Returns:
+            A list of MonsoonData objects.
+        """
+        results = []
+        if not os.path.getsize(file_path):
+            return results
+        header_size = struct.calcsize(MonsoonData.binary_header_format)
+        raw = np.memmap(file_path, dtype=np.uint8, mode='r')
+        pos = 0
+        while pos < len(raw):
+            magic, hz, voltage, offset, num, tag_len = struct.unpack(
+                MonsoonData.binary_header_format,
+                raw[pos:pos + header_size].tobytes())
+            if magic != MonsoonData.binary_magic:
+                raise MonsoonError("Invalid Monsoon binary file %s: bad magic "
+                                   "at byte %d." % (file_path, pos))
+            pos += header_size
+            tag = raw[pos:pos + tag_len].tobytes().decode("utf-8")
+            pos += tag_len + -tag_len % 8
+            timestamps = np.frombuffer(raw, dtype="<i8", count=num, offset=pos)
+            pos += 8 * num
+            currents = np.frombuffer(raw, dtype="<f4", count=num, offset=pos)
+            pos += 4 * num + -(4 * num) % 8
+            if hz.is_integer():
+                hz = int(hz)
+            md = MonsoonData(currents, timestamps, hz, voltage, offset=offset)
+            md.tag = tag or None
+            results.append(md)
+        return results
+
+    @staticmethod
+    def from_file(file_path):
+        """Load MonsoonData objects from a file in either the text or the
+        binary format.
+
+        Args:
+            file_path: The full path of the file load from, including the file
+                name.
+
+        Returns:
+            A list of MonsoonData objects.
+        """
+        with open(file_path, 'rb') as f:
+            magic = f.read(len(MonsoonData.binary_magic))
+        if magic == MonsoonData.binary_magic:
+            return MonsoonData.from_binary_file(file_path)
+        return MonsoonData.from_text_file(file_path)
+
     def _validate_data(self):
         """Verifies that the data points contained in the class are valid.
         """
@@ -594,8 +747,16 @@ class MonsoonData(object):
             n: Number of data points to average over.
 
         Returns:
-            A list of average current values.
+            A list of average current values, or a numpy array if the data
+            points are a numpy array.
         """
+        if isinstance(self.data_points, np.ndarray):
+            sums = np.concatenate(
+                ([0], np.cumsum(self.data_points, dtype=np.float64)))
+            ends = np.arange(1, len(self.data_points) + 1)
+            starts = np.maximum(ends - n, 0)
+            return np.round((sums[ends] - sums[starts]) / (ends - starts),
+                            self.lr)
         history_deque = collections.deque()
         averages = []
         for d in self.data_points:
@@ -735,7 +896,7 @@ class Monsoon(object):
         # This is the error accumulator in a variation of Bresenham's
         # algorithm.
         emitted = offset = 0
-        collected = []
+        collected = _SampleBuffer()
         # past n samples for rolling average
         history_deque = collections.deque()
         current_values = []
@@ -748,8 +909,8 @@ class Monsoon(object):
                 # output
                 need = int((native_hz - offset + sample_hz - 1) / sample_hz)
                 if need > len(collected):  # still need more input samples
-                    samples = self.mon.CollectData()
-                    if not samples:
+                    samples = self.mon.CollectDataArray()
+                    if not len(samples):
                         break
                     collected.extend(samples)
                 else:
@@ -758,8 +919,9 @@ class Monsoon(object):
                     offset += need * sample_hz
                     # maybe multiple, if sample_hz > native_hz
                     while offset >= native_hz:
-                        # TODO(angli): Optimize "collected" operations.
-                        this_sample = sum(collected[:need]) / need
+                        # Summed as Python floats, in order, to keep the
+                        # rounding of the builtin sum.
+                        this_sample = sum(collected.peek(need).tolist()) / need
                         this_time = int(time.time())
                         timestamps.append(this_time)
                         if live:
@@ -768,7 +930,7 @@ class Monsoon(object):
                         sys.stdout.flush()
                         offset -= native_hz
                         emitted += 1  # adjust for emitting 1 output sample
-                    collected = collected[need:]
+                    collected.consume(need)
                     now = time.time()
                     if now - last_flush >= 0.99:  # flush every second
                         sys.stdout.flush()
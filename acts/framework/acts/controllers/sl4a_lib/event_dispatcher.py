@@ -36,6 +36,99 @@ class DuplicateError(EventDispatcherError):
     """Raise when two event handlers have been assigned to an event name."""
 
 
+class EventQueueOverflowError(EventDispatcherError):
+    """Raised when a bounded event queue is full under the RAISE policy."""
+
+
+class OverflowPolicy(object):
+    """What to do when an event arrives for a full, bounded event queue.
+
+    DROP_OLDEST: Discard the oldest stored event to make room.
+    RAISE: Discard the new event, and raise EventQueueOverflowError to the
+        next caller popping events of that name.
+    """
+    DROP_OLDEST = 'drop_oldest'
+    RAISE = 'raise'
+
+
+class _EventQueue(queue.Queue):
+    """A queue of events of a single name that notifies waiters on each put.
+
+    Attributes:
+        event_name: The name of the events stored in this queue.
+        max_events: The max number of stored events. 0 means unbounded.
+        overflow_policy: The OverflowPolicy used when the queue is full.
+        received: The total number of events put into the queue.
+        dropped: The number of events discarded due to overflow.
+        max_depth: The largest number of events stored at once.
+        overflow_error: The pending EventQueueOverflowError, if any.
+    """
+
+    def __init__(self,
+                 event_name,
+                 on_put_callback,
+                 max_events=0,
+                 overflow_policy=OverflowPolicy.DROP_OLDEST):
+        # The underlying queue is left unbounded so put() never blocks the
+        # polling thread. Overflow is handled by the policy instead.
+        super().__init__()
+        self.event_name = event_name
+        self.max_events = max_events
+        self.overflow_policy = overflow_policy
+        self.received = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.overflow_error = None
+        self._on_put = on_put_callback
+
+    def put(self, item, block=True, timeout=None):
+        with self.mutex:
+            self.received += 1
+            if self.max_events and len(self.queue) >= self.max_events:
+                self.dropped += 1
+                if self.overflow_policy == OverflowPolicy.RAISE:
+                    self.overflow_error = EventQueueOverflowError(
+                        'Event queue for %s overflowed. %s events dropped.' %
+                        (self.event_name, self.dropped))
+                    raise self.overflow_error
+                self.queue.popleft()
+        super().put(item, block, timeout)
+        with self.mutex:
+            self.max_depth = max(self.max_depth, len(self.queue))
+        self._on_put(self.event_name)
+
+    def raise_if_overflowed(self):
+        """Raises the pending EventQueueOverflowError, if there is one."""
+        with self.mutex:
+            overflow_error, self.overflow_error = self.overflow_error, None
+        if overflow_error:
+            raise overflow_error
+
+    def get_stats(self):
+        """Returns a dict of depth metrics for this queue."""
+        with self.mutex:
+            return {
+                'depth': len(self.queue),
+                'max_depth': self.max_depth,
+                'received': self.received,
+                'dropped': self.dropped,
+            }
+
+
+class _EventWaiter(object):
+    """A thread waiting for an event whose name satisfies a matcher.
+
+    Attributes:
+        matches: A function (str) -> bool returning whether an event name is
+            one this waiter is interested in.
+        ready: A threading.Event set when a matching event arrives.
+    """
+
+    def __init__(self, name_matcher):
+        self.matches = name_matcher
+        self.ready = threading.Event()
+
+
 class EventDispatcher:
     """A class for managing the events for an SL4A Session.
 
@@ -49,19 +142,49 @@ class EventDispatcher:
         _event_dict: A dictionary of str eventName = Queue<Event> eventQueue
         _handlers: A dictionary of str eventName => (lambda, args) handler
         _lock: A lock that prevents multiple reads/writes to the event queues.
+        _waiters: The set of _EventWaiters blocked on events to arrive.
+        _batch_size: The max number of events drained per poll.
+        _supports_event_poll: False once the device has been found to not
+            support the eventPoll RPC used for batched draining.
+        _max_queue_size: The max events stored per event name. 0 means
+            unbounded.
+        _overflow_policy: The OverflowPolicy for full event queues.
         log: The EventDispatcher's logger.
     """
 
     DEFAULT_TIMEOUT = 60
+    DEFAULT_BATCH_SIZE = 50
 
-    def __init__(self, serial, rpc_client):
+    def __init__(self,
+                 serial,
+                 rpc_client,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 max_queue_size=0,
+                 overflow_policy=OverflowPolicy.DROP_OLDEST):
+        """Creates a new EventDispatcher.
+
+        Args:
+            serial: The serial of the device.
+            rpc_client: The rpc client for the session.
+            batch_size: The max number of events drained per poll. 1 polls one
+                event per RPC.
+            max_queue_size: The max number of events stored per event name.
+                0 means unbounded.
+            overflow_policy: The OverflowPolicy to apply when a bounded event
+                queue is full.
+        """
         self._serial = serial
         self._rpc_client = rpc_client
+        self._batch_size = max(batch_size, 1)
+        self._supports_event_poll = True
+        self._max_queue_size = max_queue_size
+        self._overflow_policy = overflow_policy
         self._started = False
         self._executor = None
         self._event_dict = {}
         self._handlers = {}
         self._lock = threading.RLock()
+        self._waiters = set()
 
         def _log_formatter(message):
             """Defines the formatting used in the logger."""
@@ -80,8 +203,7 @@ class EventDispatcher:
         """
         while self._started:
             try:
-                # 60000 in ms, timeout in second
-                event_obj = self._rpc_client.eventWait(60000, timeout=120)
+                event_objs = self._wait_for_events()
             except rpc_client.Sl4aConnectionError as e:
                 if self._rpc_client.is_alive:
                     self.log.warning('Closing due to closed session.')
@@ -90,30 +212,117 @@ class EventDispatcher:
                     self.log.warning('Closing due to error: %s.' % e)
                     self.close()
                     raise e
-            if not event_obj:
-                continue
-            elif 'name' not in event_obj:
-                self.log.error('Received Malformed event {}'.format(event_obj))
-                continue
-            else:
-                event_name = event_obj['name']
-            # if handler registered, process event
-            if event_name == 'EventDispatcherShutdown':
-                self.log.debug('Received shutdown signal.')
-                # closeSl4aSession has been called, which closes the event
-                # dispatcher. Stop execution on this polling thread.
-                return
-            if event_name in self._handlers:
-                self.handle_subscribed_event(event_obj, event_name)
-            else:
-                self._lock.acquire()
-                if event_name in self._event_dict:  # otherwise, cache event
-                    self._event_dict[event_name].put(event_obj)
+            for event_obj in event_objs:
+                if not event_obj:
+                    continue
+                elif 'name' not in event_obj:
+                    self.log.error(
+                        'Received Malformed event {}'.format(event_obj))
+                    continue
+                else:
+                    event_name = event_obj['name']
+                # if handler registered, process event
+                if event_name == 'EventDispatcherShutdown':
+                    self.log.debug('Received shutdown signal.')
+                    # closeSl4aSession has been called, which closes the event
+                    # dispatcher. Stop execution on this polling thread.
+                    return
+                if event_name in self._handlers:
+                    self.handle_subscribed_event(event_obj, event_name)
                 else:
-                    q = queue.Queue()
-                    q.put(event_obj)
-                    self._event_dict[event_name] = q
-                self._lock.release()
+                    try:
+                        self.get_event_q(event_name).put(event_obj)
+                    except EventQueueOverflowError as e:
+                        self.log.error(e)
+
+    def _wait_for_events(self):
+        """Blocks until at least one event is available, then drains a batch.
+
+        The first event is waited on with eventWait. Up to batch_size - 1 more
+        already queued events are then drained in a single eventPoll round
+        trip. If the device does not support eventPoll, falls back to one
+        event per eventWait call.
+
+        Returns:
+            A list of the received events, oldest first.
+        """
+        # 60000 in ms, timeout in second
+        event_obj = self._rpc_client.eventWait(60000, timeout=120)
+        if not event_obj:
+            return []
+        events = [event_obj]
+        if self._batch_size > 1 and self._supports_event_poll:
+            try:
+                events.extend(
+                    self._rpc_client.eventPoll(self._batch_size - 1) or [])
+            except rpc_client.Sl4aApiError as e:
+                self.log.info('eventPoll is not supported. Falling back to '
+                              'polling one event at a time: %s' % e)
+                self._supports_event_poll = False
+        return events
+
+    def _new_event_queue(self, event_name):
+        """Returns a new queue for events of the given name."""
+        return _EventQueue(
+            event_name,
+            self._notify_waiters,
+            max_events=self._max_queue_size,
+            overflow_policy=self._overflow_policy)
+
+    def get_queue_stats(self):
+        """Returns the depth metrics of every event queue.
+
+        Returns:
+            A dict of event name to a dict with the keys 'depth' (events
+            currently stored), 'max_depth', 'received' and 'dropped'.
+        """
+        with self._lock:
+            event_queues = list(self._event_dict.items())
+        return {name: q.get_stats() for name, q in event_queues}
+
+    def _notify_waiters(self, event_name):
+        """Wakes up every waiter interested in events of the given name."""
+        with self._lock:
+            for waiter in self._waiters:
+                if waiter.matches(event_name):
+                    waiter.ready.set()
+
+    def _wait_until(self, name_matcher, check, timeout):
+        """Blocks until check() returns a truthy value or the timeout passes.
+
+        check() is re-run only when an event whose name satisfies name_matcher
+        is stored, rather than on a fixed polling interval.
+
+        Args:
+            name_matcher: A function (str) -> bool for the event names that
+                may change the result of check().
+            check: A function returning a truthy value once the wait is over.
+            timeout: The max number of seconds to wait. None waits forever.
+
+        Returns:
+            The last value returned by check().
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        waiter = _EventWaiter(name_matcher)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while True:
+                # Clear before checking, so events arriving mid-check are not
+                # missed by the wait below.
+                waiter.ready.clear()
+                result = check()
+                if result:
+                    return result
+                if deadline is None:
+                    waiter.ready.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0 or not waiter.ready.wait(remaining):
+                    return check()
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
 
     def register_handler(self, handler, event_name, args):
         """Registers an event handler.
@@ -189,6 +398,8 @@ class EventDispatcher:
         Raises:
             IllegalStateError: Raised if pop is called before the dispatcher
                 starts polling.
+            EventQueueOverflowError: Raised if events of this name were
+                dropped under the RAISE overflow policy.
         """
         if not self._started:
             raise IllegalStateError(
@@ -199,6 +410,7 @@ class EventDispatcher:
         if not e_queue:
             raise IllegalStateError(
                 'Failed to get an event queue for {}'.format(event_name))
+        e_queue.raise_if_overflowed()
 
         try:
             # Block for timeout
@@ -222,10 +434,11 @@ class EventDispatcher:
                        **kwargs):
         """Wait for an event that satisfies a predicate to appear.
 
-        Continuously pop events of a particular name and check against the
-        predicate until an event that satisfies the predicate is popped or
-        timed out. Note this will remove all the events of the same name that
-        do not satisfy the predicate in the process.
+        Checks the stored events of a particular name against the predicate,
+        waking up each time a new event of that name arrives, until an event
+        that satisfies the predicate is found or the wait times out. Note this
+        will remove all the events of the same name that do not satisfy the
+        predicate in the process, unless consume_ignored_events is False.
 
         Args:
             event_name: Name of the event to be popped.
@@ -243,30 +456,54 @@ class EventDispatcher:
         Raises:
             queue.Empty: Raised if no event that satisfies the predicate was
                 found before time out.
+            EventQueueOverflowError: Raised if events of this name were
+                dropped under the RAISE overflow policy.
         """
-        deadline = time.time() + timeout
-        ignored_events = []
+        if not self._started:
+            raise IllegalStateError(
+                'Dispatcher needs to be started before popping.')
         consume_events = kwargs.pop('consume_ignored_events', True)
-        while True:
-            event = None
-            try:
-                event = self.pop_event(event_name, 1)
-                if not consume_events:
-                    ignored_events.append(event)
-            except queue.Empty:
-                pass
-
-            if event and predicate(event, *args, **kwargs):
-                for ignored_event in ignored_events:
-                    self.get_event_q(event_name).put(ignored_event)
-                return event
-
-            if time.time() > deadline:
-                for ignored_event in ignored_events:
-                    self.get_event_q(event_name).put(ignored_event)
-                raise queue.Empty(
-                    'Timeout after {}s waiting for event: {}'.format(
-                        timeout, event_name))
+        # The ids of unconsumed events already known to fail the predicate.
+        rejected = set()
+
+        def pop_matching_event():
+            e_queue = self.get_event_q(event_name)
+            e_queue.raise_if_overflowed()
+            with e_queue.mutex:
+                candidates = [
+                    event for event in e_queue.queue
+                    if id(event) not in rejected
+                ]
+            for event in candidates:
+                if predicate(event, *args, **kwargs):
+                    if self._remove_event(e_queue, event):
+                        return event
+                elif consume_events:
+                    self._remove_event(e_queue, event)
+                else:
+                    rejected.add(id(event))
+            return None
+
+        event = self._wait_until(lambda name: name == event_name,
+                                 pop_matching_event, timeout)
+        if event is None:
+            raise queue.Empty('Timeout after {}s waiting for event: {}'.format(
+                timeout, event_name))
+        return event
+
+    @staticmethod
+    def _remove_event(e_queue, event):
+        """Removes the given event object from the queue, if still present.
+
+        Returns:
+            True if the event was removed, False if another thread took it.
+        """
+        with e_queue.mutex:
+            for index, queued_event in enumerate(e_queue.queue):
+                if queued_event is event:
+                    del e_queue.queue[index]
+                    return True
+        return False
 
     def pop_events(self, regex_pattern, timeout, freq=1):
         """Pop events whose names match a regex pattern.
@@ -282,6 +519,8 @@ class EventDispatcher:
                 should match in order to be popped.
             timeout: Number of seconds to wait for events in case no event
                 matching the condition exits when the function is called.
+            freq: Unused. Waiting is woken up by matching events as they
+                arrive. Kept for backwards compatibility.
 
         Returns:
             results: Pop events whose names match a regex pattern.
@@ -295,13 +534,9 @@ class EventDispatcher:
         if not self._started:
             raise IllegalStateError(
                 "Dispatcher needs to be started before popping.")
-        deadline = time.time() + timeout
-        while True:
-            # TODO: fix the sleep loop
-            results = self._match_and_pop(regex_pattern)
-            if len(results) != 0 or time.time() > deadline:
-                break
-            time.sleep(freq)
+        results = self._wait_until(
+            lambda name: re.match(regex_pattern, name),
+            lambda: self._match_and_pop(regex_pattern), timeout)
         if len(results) == 0:
             raise queue.Empty('Timeout after {}s waiting for event: {}'.format(
                 timeout, regex_pattern))
@@ -335,7 +570,7 @@ class EventDispatcher:
         self._lock.acquire()
         if (event_name not in self._event_dict
                 or self._event_dict[event_name] is None):
-            self._event_dict[event_name] = queue.Queue()
+            self._event_dict[event_name] = self._new_event_queue(event_name)
         self._lock.release()
 
         event_queue = self._event_dict[event_name]
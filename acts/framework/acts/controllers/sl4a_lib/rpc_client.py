@@ -87,21 +87,224 @@ class Sl4aRpcTimeoutError(Sl4aException):
     """An error raised when an SL4A RPC has timed out."""
 
 
+class Sl4aConnectionPoolTimeoutError(Sl4aConnectionError):
+    """Raised when no connection is freed within the pool's acquire timeout."""
+
+
+class ConnectionPoolStats(object):
+    """Counters describing how contended an RpcClient's connection pool is.
+
+    Attributes:
+        acquisitions: The number of connections handed out.
+        connections_created: The number of connections opened by the pool.
+        connections_discarded: The number of connections closed by the pool
+            because they were idle for too long or failed a health check.
+        saturated_acquisitions: The number of acquisitions that had to wait
+            because every connection was in use.
+        acquire_timeouts: The number of acquisitions that gave up waiting.
+        total_wait_time: The total seconds spent waiting for a connection.
+        max_wait_time: The longest wait for a single connection, in seconds.
+    """
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.connections_created = 0
+        self.connections_discarded = 0
+        self.saturated_acquisitions = 0
+        self.acquire_timeouts = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+
+    def record_wait(self, wait_time):
+        """Records the time taken to hand out a connection."""
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def to_dict(self):
+        """Returns the counters as a dict, keyed by attribute name."""
+        return dict(self.__dict__)
+
+
+class _PendingRpc(object):
+    """An RPC request sent over a multiplexed connection awaiting a response.
+
+    Attributes:
+        ready: An Event set once the response (or a failure) has arrived.
+        response: The raw response line, or None if the channel failed.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.response = None
+
+
+class RpcMultiplexer(object):
+    """Sends many in-flight RPCs over a single RpcConnection.
+
+    Requests are tagged with the tickets handed out by the connection, and a
+    reader thread routes each response line back to the caller waiting on the
+    matching id. Note that SL4A services the requests of a single connection
+    in the order they are received, so RPCs that block on the device (e.g.
+    eventWait) should not be sent over a multiplexed connection.
+
+    Attributes:
+        connection: The RpcConnection shared by all requests.
+        is_alive: False once the underlying connection has failed or closed.
+        _pending: A dict of ticket ids to _PendingRpc objects.
+        _pending_lock: A lock guarding _pending.
+        _send_lock: A lock preventing interleaved writes on the socket.
+        _on_error: A callback for when the connection fails unexpectedly.
+        _reader: The thread reading responses off of the connection.
+        _log: The logger for this RpcMultiplexer.
+    """
+
+    def __init__(self, connection, on_error_callback, log):
+        """Creates a new RpcMultiplexer and starts its reader thread.
+
+        Args:
+            connection: The RpcConnection to multiplex requests over.
+            on_error_callback: A callback for when a connection error occurs.
+            log: The logger to use.
+        """
+        self.connection = connection
+        self.is_alive = True
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._on_error = on_error_callback
+        self._log = log
+        # The reader must block until a response arrives. Per-request
+        # timeouts are handled by the waiting callers instead.
+        self.connection.set_timeout(None)
+        self._reader = threading.Thread(
+            target=self._read_responses,
+            name='RpcMultiplexer-%s' % connection.ports.client_port)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_responses(self):
+        """Reads responses off of the connection until it closes."""
+        try:
+            while self.is_alive:
+                response = self.connection.get_response()
+                if not response:
+                    break
+                try:
+                    ticket = json.loads(str(response, encoding='utf8'))['id']
+                except (ValueError, KeyError, TypeError):
+                    self._log.error('Unable to parse multiplexed response: %s',
+                                    response)
+                    continue
+                with self._pending_lock:
+                    pending = self._pending.pop(ticket, None)
+                if pending is None:
+                    self._log.debug(
+                        'Dropping response for abandoned request %s.', ticket)
+                    continue
+                pending.response = response
+                pending.ready.set()
+        except (OSError, ValueError) as e:
+            if self.is_alive:
+                self._log.warning('Multiplexed connection failed: %s', e)
+        self._fail_pending()
+
+    def _fail_pending(self):
+        """Marks the channel as dead and wakes up all waiting callers."""
+        was_alive = self.is_alive
+        self.is_alive = False
+        with self._pending_lock:
+            pending_rpcs = list(self._pending.values())
+            self._pending.clear()
+        for pending in pending_rpcs:
+            pending.ready.set()
+        if was_alive:
+            self._on_error(self.connection)
+
+    def send(self, method, args, timeout=None):
+        """Sends an RPC and waits for its response.
+
+        Args:
+            method: str, The name of the method to execute.
+            args: The list of args to send to sl4a.
+            timeout: The amount of time to wait for a response.
+
+        Returns:
+            A tuple of (ticket, raw response line).
+
+        Raises:
+            Sl4aConnectionError: The connection failed before a response came.
+            Sl4aRpcTimeoutError: No response arrived within the timeout.
+        """
+        ticket = self.connection.get_new_ticket()
+        pending = _PendingRpc()
+        with self._pending_lock:
+            if not self.is_alive:
+                raise Sl4aConnectionError(
+                    'The multiplexed connection has been closed.')
+            self._pending[ticket] = pending
+        request = json.dumps({'id': ticket, 'method': method, 'params': args})
+        try:
+            with self._send_lock:
+                self.connection.send_request(request)
+        except OSError as e:
+            with self._pending_lock:
+                self._pending.pop(ticket, None)
+            raise Sl4aConnectionError(e)
+
+        if not pending.ready.wait(timeout or SOCKET_TIMEOUT):
+            with self._pending_lock:
+                self._pending.pop(ticket, None)
+            self._log.warning('RPC "%s" (id: %s) timed out after %s seconds.',
+                              method, ticket, timeout or SOCKET_TIMEOUT)
+            raise Sl4aRpcTimeoutError(
+                'RPC "%s" (id: %s) timed out.' % (method, ticket))
+        if pending.response is None:
+            raise Sl4aConnectionError(
+                'The multiplexed connection closed while waiting on RPC '
+                '"%s" (id: %s).' % (method, ticket))
+        return ticket, pending.response
+
+    def close(self):
+        """Closes the underlying connection and fails any pending requests."""
+        self.is_alive = False
+        self.connection.close()
+        self._fail_pending()
+
+
 class RpcClient(object):
     """An RPC client capable of processing multiple RPCs concurrently.
 
     Attributes:
         _free_connections: A list of all idle RpcConnections.
         _working_connections: A list of all working RpcConnections.
+        _idle_since: A dict of free RpcConnections to the time they were
+            last released.
+        _pending_creations: The number of connections currently being opened
+            outside of the lock. These count against max_connections.
         _lock: A lock used for accessing critical memory.
+        _connection_available: A Condition on _lock, notified whenever a
+            connection is released or a pool slot opens up.
+        _multiplexer: The RpcMultiplexer shared by all multiplexed RPCs, if
+            one has been opened.
         max_connections: The maximum number of RpcConnections at a time.
             Increasing or decreasing the number of max connections does NOT
             modify the thread pool size being used for self.future RPC calls.
+        acquire_timeout: The max seconds to wait for a free connection, or
+            None to wait indefinitely.
+        idle_timeout: Free connections idle for longer than this many seconds
+            are closed instead of being reused. None disables the reaping.
+        health_check: Whether to verify a free connection is still open
+            before handing it out.
+        pool_stats: The ConnectionPoolStats for this client's pool.
+        multiplex: Whether RPCs share a single pipelined connection.
         _log: The logger for this RpcClient.
     """
     """The default value for the maximum amount of connections for a client."""
     DEFAULT_MAX_CONNECTION = 15
 
+    """RPCs that block on the device, and must never share a connection."""
+    BLOCKING_RPCS = frozenset(['eventWait', 'eventWaitFor'])
+
     class AsyncClient(object):
         """An object that allows RPC calls to be called asynchronously.
 
@@ -134,7 +337,11 @@ class RpcClient(object):
                  serial,
                  on_error_callback,
                  _create_connection_func,
-                 max_connections=None):
+                 max_connections=None,
+                 multiplex=False,
+                 acquire_timeout=None,
+                 idle_timeout=None,
+                 health_check=True):
         """Creates a new RpcClient object.
 
         Args:
@@ -145,6 +352,14 @@ class RpcClient(object):
                 new session.
             max_connections: The maximum number of connections the RpcClient
                 can have.
+            multiplex: If True, non-blocking RPCs are pipelined over a single
+                shared connection instead of each checking out a connection.
+            acquire_timeout: The max seconds to wait for a free connection.
+                None waits indefinitely.
+            idle_timeout: The max seconds a connection may sit unused in the
+                pool before it is closed. None keeps connections forever.
+            health_check: If True, free connections are checked to still be
+                open before they are reused.
         """
         self._serial = serial
         self.on_error = on_error_callback
@@ -152,7 +367,10 @@ class RpcClient(object):
         self._free_connections = [self._create_connection_func(uid)]
 
         self.uid = self._free_connections[0].uid
+        self._idle_since = {self._free_connections[0]: time.time()}
+        self._pending_creations = 0
         self._lock = threading.Lock()
+        self._connection_available = threading.Condition(self._lock)
 
         def _log_formatter(message):
             """Formats the message to be logged."""
@@ -165,6 +383,14 @@ class RpcClient(object):
             self.max_connections = RpcClient.DEFAULT_MAX_CONNECTION
         else:
             self.max_connections = max_connections
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self.pool_stats = ConnectionPoolStats()
+        self.pool_stats.connections_created = 1
+
+        self.multiplex = multiplex
+        self._multiplexer = None
 
         self._async_client = RpcClient.AsyncClient(self)
         self.is_alive = True
@@ -176,43 +402,135 @@ class RpcClient(object):
                 '%s connections are still active, and waiting on '
                 'responses.Closing these connections now.' % len(
                     self._working_connections))
-        connections = self._free_connections + self._working_connections
+        with self._connection_available:
+            connections = self._free_connections + self._working_connections
+            self._free_connections = []
+            self._working_connections = []
+            self._idle_since = {}
+            self.is_alive = False
+            # Wake up any threads still waiting on a connection.
+            self._connection_available.notify_all()
         for connection in connections:
             self._log.debug(
                 'Closing connection over ports %s' % connection.ports)
             connection.close()
-        self._free_connections = []
-        self._working_connections = []
-        self.is_alive = False
+        if self._multiplexer is not None:
+            self._log.debug('Closing multiplexed connection over ports %s' %
+                            self._multiplexer.connection.ports)
+            self._multiplexer.close()
+            self._multiplexer = None
 
-    def _get_free_connection(self):
+    def _get_free_connection(self, timeout=None):
         """Returns a free connection to be used for an RPC call.
 
         This function also adds the client to the working set to prevent
-        multiple users from obtaining the same client.
+        multiple users from obtaining the same client. If every connection is
+        in use, blocks until one is released.
+
+        Args:
+            timeout: The max seconds to wait. Defaults to acquire_timeout.
+
+        Raises:
+            Sl4aConnectionPoolTimeoutError if no connection is freed in time.
+            Sl4aConnectionError if the client is terminated while waiting.
         """
-        while True:
-            if len(self._free_connections) > 0:
-                with self._lock:
-                    # Check if another thread grabbed the remaining connection.
-                    # while we were waiting for the lock.
-                    if len(self._free_connections) == 0:
-                        continue
-                    client = self._free_connections.pop()
-                    self._working_connections.append(client)
-                    return client
-
-            client_count = (len(self._free_connections) +
-                            len(self._working_connections))
-            if client_count < self.max_connections:
-                with self._lock:
-                    client_count = (len(self._free_connections) +
-                                    len(self._working_connections))
-                    if client_count < self.max_connections:
-                        client = self._create_connection_func(self.uid)
-                        self._working_connections.append(client)
-                        return client
-            time.sleep(.01)
+        if timeout is None:
+            timeout = self.acquire_timeout
+        start_time = time.time()
+        waited = False
+        with self._connection_available:
+            while True:
+                if not self.is_alive:
+                    raise Sl4aConnectionError(
+                        'The RpcClient was terminated while waiting for a '
+                        'free connection.')
+                connection = self._pop_healthy_free_connection()
+                if connection is not None:
+                    self._working_connections.append(connection)
+                    self._record_acquisition(start_time, waited)
+                    return connection
+
+                client_count = (len(self._free_connections) +
+                                len(self._working_connections) +
+                                self._pending_creations)
+                if client_count < self.max_connections:
+                    # Reserve the slot so the lock can be released while the
+                    # connection is opened.
+                    self._pending_creations += 1
+                    break
+
+                waited = True
+                if timeout is None:
+                    self._connection_available.wait()
+                else:
+                    remaining = start_time + timeout - time.time()
+                    if remaining <= 0:
+                        self.pool_stats.acquire_timeouts += 1
+                        raise Sl4aConnectionPoolTimeoutError(
+                            'No connection was freed within %s seconds. All %s '
+                            'connections are in use.' % (timeout,
+                                                         self.max_connections))
+                    self._connection_available.wait(remaining)
+
+        connection = None
+        try:
+            connection = self._create_connection_func(self.uid)
+        finally:
+            with self._connection_available:
+                self._pending_creations -= 1
+                if connection is None:
+                    self._connection_available.notify()
+                else:
+                    self.pool_stats.connections_created += 1
+                    self._working_connections.append(connection)
+                    self._record_acquisition(start_time, waited)
+        return connection
+
+    def _pop_healthy_free_connection(self):
+        """Pops the most recently used usable free connection, if any.
+
+        Connections that have been idle for longer than idle_timeout, or that
+        fail the health check, are closed and dropped from the pool. Must be
+        called while holding _lock.
+        """
+        now = time.time()
+        if self.idle_timeout is not None:
+            for connection in list(self._free_connections):
+                idle_since = self._idle_since.get(connection, now)
+                if now - idle_since > self.idle_timeout:
+                    self._log.debug('Closing connection over %s, idle for %.1f'
+                                    ' seconds.' % (connection.ports,
+                                                   now - idle_since))
+                    self._discard_free_connection(connection)
+
+        while self._free_connections:
+            connection = self._free_connections.pop()
+            self._idle_since.pop(connection, None)
+            if self.health_check and not connection.is_alive():
+                self._log.debug('Discarding closed connection over %s.' %
+                                connection.ports)
+                self._free_connections.append(connection)
+                self._discard_free_connection(connection)
+                continue
+            return connection
+        return None
+
+    def _discard_free_connection(self, connection):
+        """Closes a free connection and removes it from the pool."""
+        self._free_connections.remove(connection)
+        self._idle_since.pop(connection, None)
+        self.pool_stats.connections_discarded += 1
+        try:
+            connection.close()
+        except Exception as e:
+            self._log.debug('Error closing connection: %s' % e)
+
+    def _record_acquisition(self, start_time, waited):
+        """Updates the pool stats for a handed out connection."""
+        self.pool_stats.acquisitions += 1
+        if waited:
+            self.pool_stats.saturated_acquisitions += 1
+        self.pool_stats.record_wait(time.time() - start_time)
 
     def _release_working_connection(self, connection):
         """Marks a working client as free.
@@ -224,20 +542,53 @@ class RpcClient(object):
         """
         # We need to keep this code atomic because the client count is based on
         # the length of the free and working connection list lengths.
-        with self._lock:
+        with self._connection_available:
             self._working_connections.remove(connection)
             self._free_connections.append(connection)
+            self._idle_since[connection] = time.time()
+            self._connection_available.notify()
+
+    def _remove_working_connection(self, connection):
+        """Removes a (closed) working connection from the pool entirely."""
+        with self._connection_available:
+            if connection in self._working_connections:
+                self._working_connections.remove(connection)
+            # The removed connection opens up a slot for a new one.
+            self._connection_available.notify()
+
+    def _get_multiplexer(self):
+        """Returns the live RpcMultiplexer, opening a new one if needed."""
+        with self._lock:
+            if self._multiplexer is None or not self._multiplexer.is_alive:
+                if self._multiplexer is not None:
+                    try:
+                        self._multiplexer.close()
+                    except Exception as e:
+                        self._log.debug('Error closing multiplexer: %s' % e)
+                # Prefer reusing an idle connection over opening a new one.
+                if self._free_connections:
+                    connection = self._free_connections.pop()
+                    self._idle_since.pop(connection, None)
+                else:
+                    connection = self._create_connection_func(self.uid)
+                self._multiplexer = RpcMultiplexer(connection, self.on_error,
+                                                   self._log)
+            return self._multiplexer
 
     def rpc(self, method, *args, timeout=None, retries=3):
         """Sends an rpc to sl4a.
 
         Sends an rpc call to sl4a over this RpcClient's corresponding session.
+        If this client is multiplexed, the call is pipelined over the shared
+        connection unless the RPC is known to block on the device.
 
         Args:
             method: str, The name of the method to execute.
             args: any, The args to send to sl4a.
             timeout: The amount of time to wait for a response.
-            retries: Misnomer, is actually the number of tries.
+            retries: Misnomer, is actually the number of tries. Multiplexed
+                RPCs are retried over a new multiplexer when the shared
+                connection fails.
 
         Returns:
             The result of the rpc.
@@ -246,6 +597,20 @@ class RpcClient(object):
             Sl4aProtocolError: Something went wrong with the sl4a protocol.
             Sl4aApiError: The rpc went through, however executed with errors.
         """
+        if self.multiplex and method not in RpcClient.BLOCKING_RPCS:
+            for i in range(1, retries + 1):
+                try:
+                    ticket, response = self._get_multiplexer().send(
+                        method, args, timeout=timeout)
+                    break
+                except Sl4aConnectionError as e:
+                    if i == retries:
+                        raise
+                    self._log.warning(
+                        'Multiplexed RPC method %s failed on iteration %s: %s',
+                        method, i, e)
+            return self._process_response(method, ticket, response)
+
         connection = self._get_free_connection()
         ticket = connection.get_new_ticket()
         timed_out = False
@@ -292,7 +657,7 @@ class RpcClient(object):
             self._log.debug(
                 'Closing timed out connection over %s' % connection.ports)
             connection.close()
-            self._working_connections.remove(connection)
+            self._remove_working_connection(connection)
             # Re-raise the error as an SL4A Error so end users can process it.
             raise Sl4aRpcTimeoutError(err)
         finally:
@@ -300,6 +665,19 @@ class RpcClient(object):
                 if timeout:
                     connection.set_timeout(SOCKET_TIMEOUT)
                 self._release_working_connection(connection)
+        return self._process_response(method, ticket, response)
+
+    def _process_response(self, method, ticket, response):
+        """Parses a raw RPC response, raising on any reported error.
+
+        Args:
+            method: str, The name of the method that was executed.
+            ticket: The id the request was sent with.
+            response: The raw response line received from sl4a.
+
+        Returns:
+            The result of the rpc.
+        """
         result = json.loads(str(response, encoding='utf8'))
 
         if result['error']:
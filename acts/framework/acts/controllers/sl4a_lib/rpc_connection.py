@@ -14,6 +14,7 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 import json
+import select
 import socket
 import threading
 
@@ -121,6 +122,24 @@ class RpcConnection(object):
         """Sets the socket's wait for response timeout."""
         self._client_socket.settimeout(timeout)
 
+    def is_alive(self):
+        """Returns whether an idle connection is still open on both ends.
+
+        An idle connection has no responses pending, so a socket that polls as
+        readable has either been closed by the server or is out of sync.
+        """
+        fileno = self._client_socket.fileno()
+        if fileno == -1:
+            return False
+        # poll, unlike select, works with file descriptors above FD_SETSIZE.
+        poller = select.poll()
+        poller.register(fileno, select.POLLIN)
+        try:
+            events = poller.poll(0)
+        except OSError:
+            return False
+        return not events
+
     def send_request(self, request):
         """Sends a request over the connection."""
         self._socket_file.write(request.encode('utf8') + b'\n')
@@ -135,5 +154,10 @@ class RpcConnection(object):
 
     def close(self):
         """Closes the connection gracefully."""
+        try:
+            # Wakes up any thread blocked reading from the socket file.
+            self._client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         self._client_socket.close()
         self.adb.remove_tcp_forward(self.ports.forwarded_port)
@@ -244,7 +244,8 @@ class Sl4aManager(object):
     def create_session(self,
                        max_connections=None,
                        client_port=0,
-                       server_port=None):
+                       server_port=None,
+                       multiplex=False):
         """Creates an SL4A server with the given ports if possible.
 
         The ports are not guaranteed to be available for use. If the port
@@ -256,6 +257,7 @@ class Sl4aManager(object):
             server_port: The port on the Android device.
             max_connections: The max number of client connections for the
                 session.
+            multiplex: If True, RPCs are pipelined over one shared connection.
 
         Returns:
             A new Sl4aServer instance.
@@ -275,7 +277,8 @@ class Sl4aManager(object):
             server_port,
             self.obtain_sl4a_server,
             self.diagnose_failure,
-            max_connections=max_connections)
+            max_connections=max_connections,
+            multiplex=multiplex)
         self.sessions[session.uid] = session
         return session
 
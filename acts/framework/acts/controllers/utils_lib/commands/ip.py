@@ -132,10 +132,13 @@ class LinuxIpCommand(object):
                            (eg. wlan0).
         """
         ip_info = self.get_ipv4_addresses(net_interface)
+        addresses = [address for address, _ in ip_info]
+        results = self._runner.run_batch([
+            'ip addr del %s dev %s' % (address, net_interface)
+            for address in addresses
+        ], ignore_status=True)
 
-        for address, _ in ip_info:
-            result = self.remove_ipv4_address(net_interface, address,
-                                              ignore_status=True)
+        for address, result in zip(addresses, results):
             # It is possible that the address has already been removed by the
             # time this command has been called. In such a case, we would get
             # this error message.
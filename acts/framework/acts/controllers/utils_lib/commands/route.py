@@ -16,6 +16,7 @@ import ipaddress
 import re
 
 from acts.controllers.utils_lib.ssh import connection
+from acts.libs.proc import job
 
 
 class Error(Exception):
@@ -187,5 +188,11 @@ class LinuxRouteCommand(object):
         """
         routes = self.get_routes(net_interface)
 
-        for a, d in routes:
-            self.remove_route(a, d)
+        results = self._runner.run_batch(
+            ['ip route del %s dev %s' % (a, d) for a, d in routes],
+            ignore_status=True)
+        for result in results:
+            # Like remove_route, ignore routes that no longer exist.
+            if (result.exit_status
+                    and 'No such process' not in result.stderr):
+                raise job.Error(result)
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+import math
+import re
 import shellescape
 import signal
 import time
@@ -19,6 +22,10 @@ import time
 from acts.controllers.utils_lib.ssh import connection
 from acts.libs.proc import job
 
+# The time (in seconds) that watch_file keeps following a file on the remote
+# side after its timeout has passed.
+_WATCH_FILE_GRACE_PERIOD = 2
+
 
 class ShellCommand(object):
     """Wraps basic commands that tend to be tied very closely to a shell.
@@ -64,6 +71,31 @@ class ShellCommand(object):
 
         return self._runner.run(command_str, timeout=timeout)
 
+    def run_batch(self, commands, timeout=3600, ignore_status=False):
+        """Runs several commands through the runner in one round trip.
+
+        Args:
+            commands: The list of commands to run.
+            timeout: How long to wait for all of the commands (in seconds).
+            ignore_status: True to run every command even if an earlier one
+                           failed, and to not raise on failures.
+
+        Returns:
+            A list of the CmdResult objects of the commands.
+
+        Raises:
+            job.Error: When a command executed but had an error, and
+                       ignore_status is False.
+        """
+        if self._working_dir:
+            commands = [
+                'cd %s; %s' % (self._working_dir, command)
+                for command in commands
+            ]
+
+        return self._runner.run_batch(
+            commands, timeout=timeout, ignore_status=ignore_status)
+
     def is_alive(self, identifier):
         """Checks to see if a program is alive.
 
@@ -136,6 +168,59 @@ class ShellCommand(object):
         except job.Error:
             return False
 
+    def watch_file(self, file_name, patterns, timeout=60, pid=None):
+        """Follows a file until a line matching one of the patterns appears.
+
+        The file is followed with a single long running command, so no
+        commands are run per check. The lines already in the file are
+        included.
+
+        Args:
+            file_name: The name of the file to follow.
+            patterns: A list of regular expressions to look for.
+            timeout: The time to wait for a matching line (in seconds).
+            pid: If given, stop following the file once the program with this
+                 process id has exited.
+
+        Returns:
+            The first pattern that a line matched, or None if the program
+            with the given pid exited before any line matched.
+
+        Raises:
+            job.TimeoutError: When no line matched within the timeout.
+        """
+        # The ssh session has no terminal, so closing it does not stop the
+        # remote command. Instead, tail is stopped from the remote side once
+        # the program with the given pid exits, or a little after the timeout
+        # so that the timeout is still raised here first.
+        check_pid = ''
+        if pid is not None:
+            check_pid = ' && kill -0 %d 2> /dev/null' % pid
+        command = ('tail -n +1 -F %s & tail_pid=$!; '
+                   'end=$(($(date +%%s) + %d)); '
+                   'while kill -0 $tail_pid 2> /dev/null && '
+                   '[ $(date +%%s) -lt $end ]%s; do sleep 0.5; done; '
+                   # Give tail a moment to output what the program wrote last.
+                   'sleep 1; kill $tail_pid 2> /dev/null' %
+                   (shellescape.quote(file_name),
+                    math.ceil(timeout) + _WATCH_FILE_GRACE_PERIOD, check_pid))
+        if self._working_dir:
+            command = 'cd %s; %s' % (self._working_dir, command)
+
+        regexes = [re.compile(pattern) for pattern in patterns]
+        partial_line = b''
+        output = self._runner.run_streaming(command, timeout=timeout)
+        with contextlib.closing(output):
+            for data in output:
+                lines = (partial_line + data).split(b'\n')
+                partial_line = lines.pop()
+                for line in lines:
+                    line = line.decode('utf-8', errors='replace')
+                    for regex in regexes:
+                        if regex.search(line):
+                            return regex.pattern
+        return None
+
     def read_file(self, file_name):
         """Reads a file through the shell.
 
@@ -187,6 +272,20 @@ class ShellCommand(object):
 
             raise
 
+    def delete_files(self, file_names):
+        """Deletes several files through the shell at once.
+
+        Args:
+            file_names: The names of the files to delete.
+        """
+        results = self.run_batch(['rm %s' % file_name
+                                  for file_name in file_names],
+                                 ignore_status=True)
+        for result in results:
+            if (result.exit_status
+                    and 'No such file or directory' not in result.stderr):
+                raise job.Error(result)
+
     def kill(self, identifier, timeout=10):
         """Kills a program or group of programs through the shell.
 
@@ -211,11 +310,9 @@ class ShellCommand(object):
 
         signal_duration = timeout / len(signal_queue)
         for sig in signal_queue:
-            for pid in pids:
-                try:
-                    self.signal(pid, sig)
-                except job.Error:
-                    pass
+            # Failures mean the program is already dead.
+            self.run_batch(['kill -%d %d' % (sig, pid) for pid in pids],
+                           ignore_status=True)
 
             start_time = time.time()
             while pids and time.time() - start_time < signal_duration:
@@ -53,6 +53,12 @@ class CommandError(Exception):
 _Tunnel = collections.namedtuple('_Tunnel',
                                  ['local_port', 'remote_port', 'proc'])
 
+# The number of free ports found at once by SshConnection.find_free_port.
+FREE_PORT_BATCH_SIZE = 8
+# How long, in seconds, free ports found by find_free_port are handed out
+# before finding new ones.
+FREE_PORT_POOL_TIMEOUT = 10
+
 
 class SshConnection(object):
     """Provides a connection to a remote machine through ssh.
@@ -81,6 +87,10 @@ class SshConnection(object):
         self._master_ssh_proc = None
         self._master_ssh_tempdir = None
         self._tunnels = list()
+        # Maps interface names to the time their free ports were found and
+        # the ports not handed out yet.
+        self._free_ports = {}
+        self._free_ports_lock = threading.Lock()
 
         def log_line(msg):
             return '[SshConnection | %s] %s' % (self._settings.hostname, msg)
@@ -151,6 +161,22 @@ class SshConnection(object):
                     self._cleanup_master_ssh()
                     raise Error('Master ssh connection timed out.')
 
+    def _get_extra_options(self):
+        """Returns the ssh options to run commands with.
+
+        The commands go over the master ssh connection if it can be set up.
+        """
+        try:
+            self.setup_master_ssh(self._settings.connect_timeout)
+        except Error:
+            self.log.warning('Failed to create master ssh connection, using '
+                             'normal ssh connection.')
+
+        extra_options = {'BatchMode': True}
+        if self._master_ssh_proc:
+            extra_options['ControlPath'] = self.socket_path
+        return extra_options
+
     def run(self,
             command,
             timeout=3600,
@@ -187,15 +213,7 @@ class SshConnection(object):
         if env is None:
             env = {}
 
-        try:
-            self.setup_master_ssh(self._settings.connect_timeout)
-        except Error:
-            self.log.warning('Failed to create master ssh connection, using '
-                             'normal ssh connection.')
-
-        extra_options = {'BatchMode': True}
-        if self._master_ssh_proc:
-            extra_options['ControlPath'] = self.socket_path
+        extra_options = self._get_extra_options()
 
         identifier = str(uuid.uuid4())
         full_command = 'echo "CONNECTED: %s"; %s' % (identifier, command)
@@ -278,6 +296,134 @@ class SshConnection(object):
                      attempts - 1)
         raise Error('The job failed for unknown reasons.', result)
 
+    def run_batch(self,
+                  commands,
+                  timeout=3600,
+                  ignore_status=False,
+                  env=None,
+                  io_encoding='utf-8'):
+        """Runs several commands on the remote host in one ssh invocation.
+
+        Each command runs in its own subshell, so the commands behave as
+        though they were given to run() one after another, without the cost
+        of a connection per command.
+
+        Args:
+            commands: A list of string commands to execute over ssh.
+            timeout: int seconds to wait for all of the commands to finish.
+            ignore_status: bool True to run every command regardless of the
+                           exit status of the previous ones. Otherwise no
+                           commands are run after the first one that fails.
+            env: dict environment variables to setup on the remote host.
+            io_encoding: str unicode encoding of command output.
+
+        Returns:
+            A list of job.Result, one for each command.
+
+        Raises:
+            job.TimeoutError: When the commands took to long to execute.
+            Error: When the ssh connection failed to be created.
+            job.Error: When a command failed and ignore_status is False.
+        """
+        if not commands:
+            return []
+        marker = 'BATCH_DONE: %s' % uuid.uuid4()
+        script = []
+        for index, command in enumerate(commands):
+            script.append('(%s)' % command)
+            script.append('_status=$?')
+            # The leading newline ends any unterminated output of the command,
+            # and is removed again when the output is split.
+            status_line = "printf '\\n%s %d %%d\\n' $_status" % (marker,
+                                                                 index)
+            script.append(status_line)
+            script.append('%s >&2' % status_line)
+            if not ignore_status:
+                script.append('[ $_status -eq 0 ] || exit $_status')
+        result = self.run(
+            '; '.join(script),
+            timeout=timeout,
+            ignore_status=True,
+            env=env,
+            io_encoding=io_encoding)
+
+        status_regex = re.compile(b'\n%s (\\d+) (-?\\d+)\n' %
+                                  re.escape(marker.encode(io_encoding)))
+        stdouts = self._split_batch_output(status_regex, result._raw_stdout)
+        stderrs = self._split_batch_output(status_regex, result._raw_stderr)
+        results = []
+        for index, command in enumerate(commands):
+            if index not in stdouts:
+                break
+            stdout, exit_status = stdouts[index]
+            stderr, _ = stderrs.get(index, (bytes(), None))
+            command_result = job.Result(
+                command=command,
+                stdout=stdout,
+                stderr=stderr,
+                exit_status=exit_status,
+                duration=result.duration,
+                encoding=io_encoding)
+            if exit_status and not ignore_status:
+                raise job.Error(command_result)
+            results.append(command_result)
+        if len(results) != len(commands):
+            raise job.Error(result)
+        return results
+
+    @staticmethod
+    def _split_batch_output(status_regex, output):
+        """Splits the output of run_batch by the status line of each command.
+
+        Returns:
+            A dict of the index of each command to a tuple of its output and
+            its exit status.
+        """
+        outputs = {}
+        start = 0
+        for match in status_regex.finditer(output):
+            outputs[int(match.group(1))] = (output[start:match.start()],
+                                            int(match.group(2)))
+            start = match.end()
+        return outputs
+
+    def run_streaming(self,
+                      command,
+                      timeout=3600,
+                      ignore_status=False,
+                      env=None,
+                      io_encoding='utf-8'):
+        """Runs a remote command over ssh and yields its output as it comes.
+
+        Stopping the iteration early closes the ssh session. The session has
+        no terminal, so this does not end the remote command; the command
+        must end on its own.
+
+        Args:
+            command: string The command to execute over ssh.
+            timeout: int seconds to wait for command to finish.
+            ignore_status: bool True to ignore the exit code of the remote
+                           subprocess.
+            env: dict environment variables to setup on the remote host.
+            io_encoding: str unicode encoding of command output.
+
+        Returns:
+            An iterator of the standard output of the command, in chunks of
+            bytes.
+
+        Raises:
+            job.TimeoutError: When the remote command took to long to execute.
+            job.Error: When the ssh command or remote command had an error.
+        """
+        terminal_command = self._formatter.format_command(
+            command, env or {}, self._settings,
+            extra_options=self._get_extra_options())
+        return job.run_streaming(
+            terminal_command,
+            timeout=timeout,
+            ignore_status=ignore_status,
+            io_encoding=io_encoding)
+
     def run_async(self, command, env=None):
         """Starts up a background command over ssh.
 
@@ -393,6 +539,14 @@ class SshConnection(object):
             return tunnel.remote_port
         return None
 
+    def _copy_files(self, sources, destination, ignore_status):
+        """Copies files with scp, over the master ssh connection if possible.
+        """
+        extra_options = self._get_extra_options()
+        scp_cmd = self._formatter.format_scp_command(
+            self._settings, sources, destination, extra_options=extra_options)
+        return job.run(scp_cmd, ignore_status=ignore_status)
+
     def send_file(self, local_path, remote_path, ignore_status=False):
         """Send a file from the local host to the remote host.
 
@@ -401,11 +555,21 @@ class SshConnection(object):
             remote_path: string path to copy file to on remote host.
             ignore_status: Whether or not to ignore the command's exit_status.
         """
-        # TODO: This may belong somewhere else: b/32572515
-        user_host = self._formatter.format_host_name(self._settings)
-        job.run(
-            'scp %s %s:%s' % (local_path, user_host, remote_path),
-            ignore_status=ignore_status)
+        self.send_files([local_path], remote_path, ignore_status=ignore_status)
+
+    def send_files(self, local_paths, remote_dir, ignore_status=False):
+        """Send several files from the local host to the remote host at once.
+
+        Args:
+            local_paths: list of string paths of files to send on local host.
+            remote_dir: string path of the directory to copy the files to on
+                        remote host.
+            ignore_status: Whether or not to ignore the command's exit_status.
+        """
+        self._copy_files(
+            local_paths,
+            self._formatter.format_remote_path(self._settings, remote_dir),
+            ignore_status)
 
     def pull_file(self, local_path, remote_path, ignore_status=False):
         """Send a file from remote host to local host
@@ -415,10 +579,22 @@ class SshConnection(object):
             remote_path: string path to copy file from on remote host.
             ignore_status: Whether or not to ignore the command's exit_status.
         """
-        user_host = self._formatter.format_host_name(self._settings)
-        job.run(
-            'scp %s:%s %s' % (user_host, remote_path, local_path),
-            ignore_status=ignore_status)
+        self.pull_files(local_path, [remote_path], ignore_status=ignore_status)
+
+    def pull_files(self, local_dir, remote_paths, ignore_status=False):
+        """Send several files from remote host to local host at once.
+
+        Args:
+            local_dir: string path of the directory to copy the files to on
+                       local host.
+            remote_paths: list of string paths of files to copy from on remote
+                          host.
+            ignore_status: Whether or not to ignore the command's exit_status.
+        """
+        self._copy_files([
+            self._formatter.format_remote_path(self._settings, path)
+            for path in remote_paths
+        ], local_dir, ignore_status)
 
     def find_free_port(self, interface_name='localhost'):
         """Find a unused port on the remote host.
@@ -434,11 +610,26 @@ class SshConnection(object):
             integer port number on remote interface that was free.
         """
         # TODO: This may belong somewhere else: b/3257251
+        with self._free_ports_lock:
+            found_at, ports = self._free_ports.get(interface_name, (0, []))
+            if not ports or time.time() - found_at > FREE_PORT_POOL_TIMEOUT:
+                ports = self._find_free_ports(interface_name)
+                self._free_ports[interface_name] = (time.time(), ports)
+            return ports.pop()
+
+    def _find_free_ports(self, interface_name):
+        """Finds FREE_PORT_BATCH_SIZE distinct unused ports on the remote host
+        with a single command.
+        """
+        # The sockets are all bound before closing any, so the ports differ.
         free_port_cmd = (
-            'python -c "import socket; s=socket.socket(); '
-            's.bind((\'%s\', 0)); print(s.getsockname()[1]); s.close()"'
-        ) % interface_name
-        port = int(self.run(free_port_cmd).stdout)
-        # Yield to the os to ensure the port gets cleaned up.
+            'python -c "import socket; '
+            'sockets = [socket.socket() for _ in range(%d)]; '
+            '[s.bind((\'%s\', 0)) for s in sockets]; '
+            'print(\' \'.join(str(s.getsockname()[1]) for s in sockets)); '
+            '[s.close() for s in sockets]"'
+        ) % (FREE_PORT_BATCH_SIZE, interface_name)
+        ports = [int(port) for port in self.run(free_port_cmd).stdout.split()]
+        # Yield to the os to ensure the ports get cleaned up.
         time.sleep(0.001)
-        return port
+        return ports
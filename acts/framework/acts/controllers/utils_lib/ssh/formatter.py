@@ -161,6 +161,47 @@ class SshFormatter(object):
         local_command.append(remote_command)
         return local_command
 
+    def format_scp_command(self,
+                           settings,
+                           sources,
+                           destination,
+                           extra_options={}):
+        """Formats an scp command.
+
+        Args:
+            settings: The ssh settings to use.
+            sources: A list of the paths to copy. Remote paths must be
+                     formatted with format_remote_path.
+            destination: The path to copy to. A remote path must be formatted
+                         with format_remote_path.
+            extra_options: Extra options to include in the settings.
+
+        Returns:
+            A list of strings that make up the scp command.
+        """
+        options = settings.construct_ssh_options()
+        for extra_option_name in extra_options:
+            options[extra_option_name] = extra_options[extra_option_name]
+        options_list = list(self.format_options_list(options))
+        flags_list = list(
+            self.format_flag_list(settings.construct_scp_flags()))
+
+        return ['scp'] + options_list + flags_list + list(sources) + [
+            destination
+        ]
+
+    def format_remote_path(self, settings, path):
+        """Formats a path on the remote host for scp.
+
+        Args:
+            settings: The ssh settings being used.
+            path: The path on the remote host.
+
+        Returns:
+            A string of the path, prefixed with the host to connect to.
+        """
+        return '%s:%s' % (self.format_host_name(settings), path)
+
     def format_remote_command(self, command, env):
         """Formats the remote part of the ssh command.
 
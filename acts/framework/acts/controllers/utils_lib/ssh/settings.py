@@ -109,3 +109,22 @@ class SshSettings(object):
         if self.ssh_config:
             current_flags['-F'] = self.ssh_config
         return current_flags
+
+    def construct_scp_flags(self):
+        """Construct the scp flags.
+
+        Constructs what flags should be used to copy files over scp. These
+        match the ssh flags, where scp supports them.
+
+        Returns:
+            A dictonary of flag name to value. If value is none then it is
+            treated as a binary flag.
+        """
+        current_flags = {}
+        current_flags['-q'] = None
+        current_flags['-P'] = self.port
+        if self.identity_file:
+            current_flags['-i'] = self.identity_file
+        if self.ssh_config:
+            current_flags['-F'] = self.ssh_config
+        return current_flags
@@ -50,6 +50,7 @@ class ActsErrorCode:
     Sl4aProtocolError = 1004
     Sl4aNotInstalledError = 1005
     Sl4aRpcTimeoutError = 1006
+    Sl4aConnectionPoolTimeoutError = 1007
 
     # Util Errors 4000-9999
 
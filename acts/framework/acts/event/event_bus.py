@@ -110,11 +110,13 @@ class _EventBus(object):
             ignore_errors: Deliver to all subscribers, ignoring any errors.
         """
         listening_subscriptions = []
-        for current_type in inspect.getmro(type(event)):
-            if current_type not in self._subscriptions.keys():
-                continue
-            for subscription in self._subscriptions[current_type]:
-                listening_subscriptions.append(subscription)
+        # Events may be posted while other threads (un)register subscriptions.
+        with self._subscription_lock:
+            for current_type in inspect.getmro(type(event)):
+                if current_type not in self._subscriptions.keys():
+                    continue
+                for subscription in self._subscriptions[current_type]:
+                    listening_subscriptions.append(subscription)
 
         # The subscriptions will be collected in sorted runs of sorted order.
         # Running timsort here is the optimal way to sort this list.
@@ -39,6 +39,7 @@ class Config(enum.Enum):
     key_random = "random"
     key_test_case_iterations = "test_case_iterations"
     key_test_failure_tracebacks = "test_failure_tracebacks"
+    key_test_class_index_path = "test_class_index_path"
     # Config names for controllers packaged in ACTS.
     key_android_device = "AndroidDevice"
     key_fuchsia_device = "FuchsiaDevice"
@@ -50,6 +50,8 @@ class OtaRunner(object):
         self.android_device.stop_services()
         log.info('Beginning tool.')
         self.ota_tool.update(self)
+        # The tool may have rebooted the device without going through adb.
+        self.android_device.adb.invalidate_prop_cache()
         log.info('Tool finished. Waiting for boot completion.')
         self.android_device.wait_for_boot_completion()
         new_info = self.android_device.adb.getprop('ro.build.fingerprint')
@@ -105,8 +107,11 @@ class OtaRunner(object):
             InvalidOtaUpdateError if the ota version is not valid, or cannot be
                 validated.
         """
+        props = self.android_device.adb.getprops(
+            ['ro.build.date.utc', 'ro.bootimage.build.fingerprint'],
+            use_cache=True)
         # The timestamp the current device build was created at.
-        cur_img_timestamp = self.android_device.adb.getprop('ro.build.date.utc')
+        cur_img_timestamp = props['ro.build.date.utc']
         ota_img_timestamp = self.get_ota_package_metadata('post-timestamp')
 
         if ota_img_timestamp is None:
@@ -115,8 +120,7 @@ class OtaRunner(object):
 
         try:
             if int(ota_img_timestamp) <= int(cur_img_timestamp):
-                cur_fingerprint = self.android_device.adb.getprop(
-                    'ro.bootimage.build.fingerprint')
+                cur_fingerprint = props['ro.bootimage.build.fingerprint']
                 ota_fingerprint = self.get_post_build_id()
                 raise InvalidOtaUpdateError(
                     'The OTA image comes from an earlier build than the '
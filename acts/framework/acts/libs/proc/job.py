@@ -14,6 +14,8 @@
 
 import logging
 import os
+import re
+import selectors
 import shlex
 import sys
 import time
@@ -26,6 +28,14 @@ else:
     # Only exists in python3.3
     from subprocess import DEVNULL
 
+# Quoted strings that shlex.split parses like a shell does. Double quoted
+# strings with expansions or escapes are left to the shell.
+_QUOTED_REGEX = re.compile(r"'[^']*'" r'|"[^"\\$`]*"')
+# Shell syntax that shlex.split does not handle, outside of quoted strings.
+_SHELL_SYNTAX_REGEX = re.compile(r'[|&;<>()$`\\*?\[\]{}~#\n]|^\s*\w+=')
+# The most bytes run_streaming reads from the process at once.
+_STREAM_READ_SIZE = 65536
+
 
 class Error(Exception):
     """Indicates that a command failed, is fatal to the test unless caught."""
@@ -109,6 +119,42 @@ class Result(object):
                     self._encoding)
 
 
+def split_command(command):
+    """Splits a shell command into its arguments, if it needs no shell.
+
+    Args:
+        command: The shell command, as a string.
+
+    Returns:
+        The list of arguments, or None if the command uses shell syntax, such
+        as pipes, redirections, variables or globs.
+    """
+    if _SHELL_SYNTAX_REGEX.search(_QUOTED_REGEX.sub('', command)):
+        return None
+    try:
+        return shlex.split(command) or None
+    except ValueError:
+        return None
+
+
+def _start_process(command, **kwargs):
+    """Starts the command, without a shell unless it needs one.
+
+    Lists are run as the path and arguments to an executable. Strings that
+    split_command can split are too, unless the executable cannot be run,
+    e.g. because it is a shell builtin. The rest are run by a shell.
+    """
+    if isinstance(command, list):
+        return subprocess.Popen(command, shell=False, **kwargs)
+    args = split_command(command)
+    if args is not None:
+        try:
+            return subprocess.Popen(args, shell=False, **kwargs)
+        except (FileNotFoundError, PermissionError):
+            pass
+    return subprocess.Popen(command, shell=True, **kwargs)
+
+
 def run(command,
         timeout=60,
         ignore_status=False,
@@ -117,7 +163,8 @@ def run(command,
     """Execute a command in a subproccess and return its output.
 
     Commands can be either shell commands (given as strings) or the
-    path and arguments to an executable (given as a list).  This function
+    path and arguments to an executable (given as a list).  Shell commands
+    that do not use any shell syntax are run without a shell. This function
     will block until the subprocess finishes or times out.
 
     Args:
@@ -138,12 +185,8 @@ def run(command,
         CommandError: Ssh worked, but the command had an error executing.
     """
     start_time = time.time()
-    proc = subprocess.Popen(
-        command,
-        env=env,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=not isinstance(command, list))
+    proc = _start_process(
+        command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     # Wait on the process terminating
     timed_out = False
     out = bytes()
@@ -176,6 +219,85 @@ def run(command,
     return result
 
 
+def run_streaming(command,
+                  timeout=60,
+                  ignore_status=False,
+                  env=None,
+                  io_encoding='utf-8'):
+    """Execute a command in a subprocess and yield its output as it comes.
+
+    Unlike run, the standard output is not kept in memory. Commands are run
+    like with run.
+
+    Args:
+        command: The command to execute. Can be either a string or a list.
+        timeout: number seconds to wait for command to finish, including the
+                 time spent by the caller between chunks.
+        ignore_status: bool True to ignore the exit code of the subprocess.
+        env: dict enviroment variables to setup on the remote host.
+        io_encoding: str unicode encoding of command output.
+
+    Yields:
+        The standard output of the command, in chunks of bytes.
+
+    Raises:
+        job.TimeoutError: When the command took to long to execute.
+        Error: When the command had an error executing. The stdout of its
+            result is empty.
+    """
+    start_time = time.time()
+    proc = _start_process(
+        command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    err = []
+    timed_out = False
+    selector = selectors.DefaultSelector()
+    try:
+        selector.register(proc.stdout, selectors.EVENT_READ)
+        selector.register(proc.stderr, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = start_time + timeout - time.time()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, _STREAM_READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                elif key.fileobj is proc.stdout:
+                    yield data
+                else:
+                    err.append(data)
+        if not timed_out:
+            try:
+                proc.wait(timeout=max(start_time + timeout - time.time(), 0))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+    finally:
+        selector.close()
+        if proc.returncode is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    result = Result(
+        command=command,
+        stderr=b''.join(err),
+        exit_status=proc.returncode,
+        duration=time.time() - start_time,
+        encoding=io_encoding,
+        did_timeout=timed_out)
+    logging.debug(result)
+
+    if timed_out:
+        logging.error("Command %s with %s timeout setting timed out", command,
+                      timeout)
+        raise TimeoutError(result)
+
+    if not ignore_status and proc.returncode != 0:
+        raise Error(result)
+
+
 def run_async(command, env=None):
     """Execute a command in a subproccess asynchronously.
 
@@ -183,8 +305,8 @@ def run_async(command, env=None):
     subprocess.Popen object.
 
     Commands can be either shell commands (given as strings) or the
-    path and arguments to an executable (given as a list).  This function
-    will not block.
+    path and arguments to an executable (given as a list), and are run like
+    with run.  This function will not block.
 
     Args:
         command: The command to execute. Can be either a string or a list.
@@ -194,13 +316,17 @@ def run_async(command, env=None):
         A subprocess.Popen object representing the created subprocess.
 
     """
-    proc = subprocess.Popen(
+    if sys.version_info >= (3, 11):
+        # Unlike a preexec_fn, this lets the process be spawned with vfork.
+        group_kwargs = {'process_group': 0}
+    else:
+        group_kwargs = {'preexec_fn': os.setpgrp}
+    proc = _start_process(
         command,
         env=env,
-        preexec_fn=os.setpgrp,
-        shell=not isinstance(command, list),
         stdout=DEVNULL,
-        stderr=subprocess.STDOUT)
+        stderr=subprocess.STDOUT,
+        **group_kwargs)
     logging.debug("command %s started with pid %s", command, proc.pid)
     return proc
 
@@ -16,14 +16,122 @@
 
 import logging
 import os
+import selectors
 import shlex
 import signal
 import subprocess
 import sys
+import threading
 import time
 from threading import Thread
 
 _on_windows = sys.platform == 'win32'
+# The maximum number of bytes passed to the output callback at once when
+# reading binary output.
+_BINARY_READ_SIZE = 65536
+# How long start() waits for the process to be opened, in seconds.
+_START_TIMEOUT = 1
+
+
+class _OutputReactor(object):
+    """Reads the output of many processes from a single thread.
+
+    The output callbacks are called from the reactor thread, so a slow
+    callback delays the output of every other process.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = []
+        # Wakes the reactor thread up to register new pipes, so that the
+        # selector is only used from that thread.
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run,
+                                        name='ProcessOutputReactor',
+                                        daemon=True)
+        self._thread.start()
+
+    def register(self, pipe, on_data, on_eof):
+        """Starts reading a pipe.
+
+        Args:
+            pipe: The file object to read.
+            on_data: The function to call with each chunk of bytes read.
+            on_eof: The function to call once the pipe has been closed.
+        """
+        with self._lock:
+            self._pending.append((pipe, on_data, on_eof))
+        os.write(self._wakeup_write, b'\0')
+
+    def _register_pending(self):
+        os.read(self._wakeup_read, _BINARY_READ_SIZE)
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for pipe, on_data, on_eof in pending:
+            try:
+                self._selector.register(pipe, selectors.EVENT_READ,
+                                        (on_data, on_eof))
+            except (ValueError, OSError):
+                logging.exception('Unable to read the output of a process.')
+                on_eof()
+
+    def _read(self, key):
+        on_data, on_eof = key.data
+        try:
+            data = os.read(key.fd, _BINARY_READ_SIZE)
+        except OSError:
+            data = b''
+        try:
+            if data:
+                on_data(data)
+            else:
+                self._selector.unregister(key.fileobj)
+                on_eof()
+        except Exception:
+            logging.exception('Output callback of a process failed.')
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.fd == self._wakeup_read:
+                    self._register_pending()
+                else:
+                    self._read(key)
+
+
+_output_reactor = None
+_output_reactor_lock = threading.Lock()
+
+
+def _get_output_reactor():
+    """Returns the _OutputReactor shared by all processes."""
+    global _output_reactor
+    with _output_reactor_lock:
+        if _output_reactor is None:
+            _output_reactor = _OutputReactor()
+        return _output_reactor
+
+
+class _LineSplitter(object):
+    """Splits chunks of output into lines, like Process._redirect_output."""
+
+    def __init__(self, on_line):
+        self._on_line = on_line
+        self._partial_line = b''
+
+    def feed(self, data):
+        lines = (self._partial_line + data).split(b'\n')
+        self._partial_line = lines.pop()
+        for line in lines:
+            self._on_line(line.decode('utf-8', errors='replace').rstrip())
+
+    def flush(self):
+        if self._partial_line:
+            self._on_line(
+                self._partial_line.decode('utf-8', errors='replace').rstrip())
+            self._partial_line = b''
 
 
 class ProcessError(Exception):
@@ -39,7 +147,13 @@ class Process(object):
                             execution.
         _process: The subprocess.Popen object currently executing a process.
         _listening_thread: The thread that is listening for the process to stop.
-        _redirection_thread: The thread that is redirecting process output.
+        _redirection_thread: The thread that is redirecting process output, on
+                             Windows. Elsewhere, the output of all processes
+                             is redirected by a shared _OutputReactor.
+        _redirection_done: The event set once all output of the current
+                           process has been redirected, if redirected by the
+                           _OutputReactor.
+        _process_started: The event set once the process has been opened.
         _on_output_callback: The callback to call when output is received.
         _on_terminate_callback: The callback to call when the process terminates
                                 without stop() being called first.
@@ -67,6 +181,9 @@ class Process(object):
 
         self._listening_thread = None
         self._redirection_thread = None
+        self._redirection_done = None
+        self._process_started = threading.Event()
+        self._start_error = None
         self._on_output_callback = lambda *args, **kw: None
         self._binary_output = False
         self._on_terminate_callback = lambda *args, **kw: ''
@@ -119,15 +236,16 @@ class Process(object):
             raise ProcessError('Process has already started.')
         self._started = True
         self._process = None
+        self._start_error = None
+        self._process_started.clear()
 
         self._listening_thread = Thread(target=self._exec_loop)
         self._listening_thread.start()
 
-        time_up_at = time.time() + 1
-
-        while self._process is None:
-            if time.time() > time_up_at:
-                raise OSError('Unable to open process!')
+        if not self._process_started.wait(_START_TIMEOUT):
+            raise OSError('Unable to open process!')
+        if self._start_error is not None:
+            raise OSError('Unable to open process!') from self._start_error
 
         self._stopped = False
 
@@ -153,6 +271,10 @@ class Process(object):
             self._redirection_thread.join()
             self._redirection_thread = None
 
+        if self._redirection_done is not None:
+            self._redirection_done.wait()
+            self._redirection_done = None
+
     def _kill_process(self):
         """Kills the underlying process/process group. Implementation is
         platform-dependent."""
@@ -201,7 +323,9 @@ class Process(object):
         """Redirects the output from the command into the on_output_callback."""
         if self._binary_output:
             while True:
-                data = self._process.stdout.read(1024)
+                # read1 returns what is available instead of waiting for
+                # the whole buffer to fill.
+                data = self._process.stdout.read1(_BINARY_READ_SIZE)
 
                 if not data:
                     return
@@ -218,6 +342,34 @@ class Process(object):
                     # Output the line without trailing \n and whitespace.
                     self._on_output_callback(line.rstrip())
 
+    def _start_redirection(self):
+        """Starts redirecting the output of the current process."""
+        if _on_windows:
+            # Pipes cannot be waited on with selectors on Windows.
+            self._redirection_thread = Thread(target=self._redirect_output)
+            self._redirection_thread.start()
+            return
+        done = threading.Event()
+        self._redirection_done = done
+        if self._binary_output:
+            on_data = self._on_output_callback
+            on_eof = done.set
+        else:
+            splitter = _LineSplitter(self._on_output_callback)
+            on_data = splitter.feed
+
+            def on_eof():
+                splitter.flush()
+                done.set()
+        _get_output_reactor().register(self._process.stdout, on_data, on_eof)
+
+    def _wait_for_redirection(self):
+        """Waits for all output of the current process to be redirected."""
+        if self._redirection_thread is not None:
+            self._redirection_thread.join()
+        if self._redirection_done is not None:
+            self._redirection_done.wait()
+
     @staticmethod
     def __start_process(command, **kwargs):
         """A convenient wrapper function for starting the process."""
@@ -237,13 +389,22 @@ class Process(object):
         """
         command = self._command
         while True:
-            self._process = self.__start_process(command,
-                                                 stdout=subprocess.PIPE,
-                                                 stderr=subprocess.STDOUT,
-                                                 bufsize=1,
-                                                 **self._subprocess_kwargs)
-            self._redirection_thread = Thread(target=self._redirect_output)
-            self._redirection_thread.start()
+            try:
+                self._process = self.__start_process(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    bufsize=1,
+                    **self._subprocess_kwargs)
+            except Exception as e:
+                if self._process_started.is_set():
+                    logging.exception('Unable to restart process.')
+                else:
+                    self._start_error = e
+                    self._process_started.set()
+                return
+            self._start_redirection()
+            self._process_started.set()
             self._process.wait()
 
             if self._stopped:
@@ -251,7 +412,7 @@ class Process(object):
             else:
                 # Wait for all output to be processed before sending
                 # _on_terminate_callback()
-                self._redirection_thread.join()
+                self._wait_for_redirection()
                 retry_value = self._on_terminate_callback(self._process)
                 if retry_value:
                     command = retry_value
@@ -22,10 +22,13 @@ import copy
 import importlib
 import inspect
 import fnmatch
+import json
 import logging
 import os
 import pkgutil
+import re
 import sys
+import tempfile
 
 from acts import base_test
 from acts import config_parser
@@ -36,6 +39,79 @@ from acts import signals
 from acts import utils
 from acts import error
 
+# Matches the names of the test classes defined at the top of a test script.
+_TEST_CLASS_NAME_REGEX = re.compile(r'^class\s+(\w+Test)\b', re.MULTILINE)
+# Where the test classes found in each test script are cached by default, keyed
+# by the script's modification time. The test_class_index_path config key
+# moves the cache, or disables it if empty.
+TEST_CLASS_INDEX_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'acts', 'test_class_index.json')
+
+
+def _load_test_class_index_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_test_class_index_cache(cache_path, cache):
+    # The cache is written to a temporary file that then replaces the cache,
+    # so concurrent runs never read a partially written cache.
+    tmp_path = None
+    try:
+        cache_dir = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.debug('Failed to save the test class index: %s', e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def build_test_class_index(file_list, cache_path=None):
+    """Finds the test classes defined in test scripts, without importing
+    them.
+
+    Test scripts are scanned for top level class definitions with names
+    ending in 'Test'. The results are cached on disk, so only the scripts
+    modified since the last scan are read again.
+
+    Args:
+        file_list: A list of (directory, module name, extension) tuples, as
+            returned by utils.find_files.
+        cache_path: The path of the cache file, or None to not use one.
+
+    Returns:
+        A dictionary mapping test class names to lists of the (directory,
+        module name) tuples of the scripts defining them.
+    """
+    cache = _load_test_class_index_cache(cache_path) if cache_path else {}
+    new_cache = {}
+    index = {}
+    for path, name, ext in file_list:
+        file_path = os.path.abspath(os.path.join(path, name + ext))
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
+            continue
+        entry = cache.get(file_path)
+        if entry is None or entry.get('mtime') != mtime:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                class_names = _TEST_CLASS_NAME_REGEX.findall(f.read())
+            entry = {'mtime': mtime, 'classes': class_names}
+        new_cache[file_path] = entry
+        for class_name in entry['classes']:
+            index.setdefault(class_name, []).append((path, name))
+    if cache_path and new_cache != cache:
+        _save_test_class_index_cache(cache_path, new_cache)
+    return index
+
 
 def _find_test_class():
     """Finds the test class in a test script.
@@ -152,9 +228,15 @@ class TestRunner(object):
         """Imports test classes from test scripts.
 
         1. Locate all .py files under test paths.
-        2. Import the .py files as modules.
-        3. Find the module members that are test classes.
-        4. Categorize the test classes by name.
+        2. Find the test classes each file defines, with
+           build_test_class_index, and select the files defining the test
+           classes on the run list. The index is cached at the
+           test_class_index_path of the config, TEST_CLASS_INDEX_PATH by
+           default. If a test class on the run list is not
+           found this way, all files are selected.
+        3. Import the selected .py files as modules.
+        4. Find the module members that are test classes.
+        5. Categorize the test classes by name.
 
         Args:
             test_paths: A list of directory paths where the test files reside.
@@ -171,6 +253,24 @@ class TestRunner(object):
             return False
 
         file_list = utils.find_files(test_paths, is_testfile_name)
+        cache_path = self.test_configs.get(
+            keys.Config.key_test_class_index_path.value,
+            TEST_CLASS_INDEX_PATH)
+        class_index = build_test_class_index(file_list, cache_path or None)
+        selected_files = set()
+        for test_cls_name, _ in self.run_list:
+            matches = fnmatch.filter(class_index.keys(), test_cls_name)
+            if not matches:
+                self.log.debug(
+                    "Test class %s not found in the test class index, "
+                    "importing all test modules.", test_cls_name)
+                selected_files = None
+                break
+            for match in matches:
+                selected_files.update(class_index[match])
+        if selected_files is not None:
+            file_list = [(path, name, ext) for path, name, ext in file_list
+                         if (path, name) in selected_files]
         test_classes = {}
         for path, name, _ in file_list:
             sys.path.append(path)
@@ -15,10 +15,15 @@
 #   limitations under the License.
 """This module provides utilities to do audio data analysis."""
 
+import functools
 import logging
 import numpy
 import soundfile
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import as_strided
+from scipy.ndimage import maximum_filter1d
 from scipy.signal import blackmanharris
+from scipy.signal import correlate
 from scipy.signal import iirnotch
 from scipy.signal import lfilter
 
@@ -47,6 +52,10 @@ ANOMALY_GROUPING_TOLERANCE = 1.0
 # Window size for peak detection.
 PEAK_WINDOW_SIZE_HZ = 20
 
+# The maximum number of samples in the windows analyzed at once by
+# THDN_series. Each batch is also the unit of work of the process pool.
+THDN_BATCH_SAMPLES = 2**22
+
 
 class RMSTooSmallError(Exception):
     """Error when signal RMS is too small."""
@@ -133,12 +142,87 @@ def spectral_analysis(signal,
 
     # y_f is complex so consider its absolute value for magnitude.
     abs_y_f = numpy.abs(y_f)
+    return _spectral_peaks(x_f, abs_y_f, min_peak_ratio, peak_window_size_hz)
+
+
+def spectral_analysis_chunks(chunks,
+                             rate,
+                             min_peak_ratio=DEFAULT_MIN_PEAK_RATIO,
+                             peak_window_size_hz=PEAK_WINDOW_SIZE_HZ):
+    """Gets the dominant frequencies of a signal read one chunk at a time.
+
+    Like spectral_analysis, but averages the spectra of the chunks instead of
+    transforming the whole signal at once, so that only one chunk is kept in
+    memory. The frequency resolution is the one of the first chunk, and
+    shorter chunks are zero padded to its length.
+
+    Args:
+        chunks: An iterable of consecutive 1-D arrays of one-channel PCM
+                data, normalized to [-1, 1].
+        rate: Sampling rate in samples per second. Example inputs: 44100,
+        48000
+        min_peak_ratio: See spectral_analysis.
+        peak_window_size_hz: See spectral_analysis.
+
+    Returns:
+        A list of tuples as returned by spectral_analysis.
+
+    Raises:
+        EmptyDataError: if there is no data in the chunks.
+    """
+    chunk_size = None
+    length = 0
+    sum_squares = 0.0
+    weighted_abs_y_f = None
+    for chunk in chunks:
+        chunk = numpy.asarray(chunk, dtype=float)
+        if len(chunk) == 0:
+            continue
+        if chunk_size is None:
+            chunk_size = len(chunk)
+            weighted_abs_y_f = numpy.zeros(chunk_size // 2 + 1)
+        length += len(chunk)
+        sum_squares += numpy.dot(chunk, chunk)
+        y_conv_w = chunk * numpy.hanning(len(chunk))
+        y_f = 2.0 / len(chunk) * numpy.fft.rfft(y_conv_w, chunk_size)
+        # Weights the spectrum of each chunk with its length.
+        weighted_abs_y_f += len(chunk) * numpy.abs(y_f)
+
+    # Checks the signal is meaningful.
+    if length == 0:
+        raise EmptyDataError('Signal data is empty')
+
+    signal_rms = numpy.sqrt(sum_squares / length)
+    logging.debug('signal RMS = %s', signal_rms)
+
+    # If RMS is too small, set dominant frequency and coefficient to 0.
+    if signal_rms < MEANINGFUL_RMS_THRESHOLD:
+        logging.warning(
+            'RMS %s is too small to be meaningful. Set frequency to 0.',
+            signal_rms)
+        return [(0, 0)]
+
+    x_f = _rfft_freq(chunk_size, rate)
+    abs_y_f = weighted_abs_y_f / length
+    return _spectral_peaks(x_f, abs_y_f, min_peak_ratio, peak_window_size_hz)
+
+
+def _spectral_peaks(x_f, abs_y_f, min_peak_ratio, peak_window_size_hz):
+    """Finds the dominant frequencies in a spectrum.
+
+    Args:
+        x_f: The frequency in Hz of each coefficient.
+        abs_y_f: The magnitude of each coefficient. Modified in place.
+        min_peak_ratio: See spectral_analysis.
+        peak_window_size_hz: See spectral_analysis.
+
+    Returns:
+        A list of tuples as returned by spectral_analysis.
+    """
     threshold = max(abs_y_f) * min_peak_ratio
 
     # Suppresses all coefficients that are below threshold.
-    for i in range(len(abs_y_f)):
-        if abs_y_f[i] < threshold:
-            abs_y_f[i] = 0
+    abs_y_f[abs_y_f < threshold] = 0
 
     # Gets the peak detection window size in indice.
     # x_f[1] is the frequency difference per index.
@@ -195,76 +279,32 @@ def peak_detection(array, window_size):
               where the tuples are sorted by peak values.
 
     """
-    half_window_size = window_size / 2
-    length = len(array)
-
-    def mid_is_peak(array, mid, left, right):
-        """Checks if value at mid is the largest among left to right in array.
-
-        Args:
-            array: A list of numbers.
-            mid: The mid index.
-            left: The left index.
-            rigth: The right index.
-
-        Returns:
-            A tuple (is_peak, next_candidate)
-                  is_peak is True if array[index] is the maximum among numbers
-                  in array between index [left, right] inclusively.
-                  next_candidate is the index of next candidate for peak if
-                  is_peak is False. It is the index of maximum value in
-                  [mid + 1, right]. If is_peak is True, next_candidate is
-                  right + 1.
-
-        """
-        value_mid = array[int(mid)]
-        is_peak = True
-        next_peak_candidate_index = None
-
-        # Check the left half window.
-        for index in range(int(left), int(mid)):
-            if array[index] >= value_mid:
-                is_peak = False
-                break
-
-        # Mid is at the end of array.
-        if mid == right:
-            return is_peak, right + 1
-
-        # Check the right half window and also record next candidate.
-        # Favor the larger index for next_peak_candidate_index.
-        for index in range(int(right), int(mid), -1):
-            if (next_peak_candidate_index is None or
-                    array[index] > array[next_peak_candidate_index]):
-                next_peak_candidate_index = index
-
-        if array[next_peak_candidate_index] >= value_mid:
-            is_peak = False
-
-        if is_peak:
-            next_peak_candidate_index = right + 1
-
-        return is_peak, next_peak_candidate_index
-
-    results = []
-    mid = 0
-    next_candidate_idx = None
-    while mid < length:
-        left = max(0, mid - half_window_size)
-        right = min(length - 1, mid + half_window_size)
-
-        # Only consider value greater than 0.
-        if array[int(mid)] == 0:
-            mid = mid + 1
-            continue
-
-        is_peak, next_candidate_idx = mid_is_peak(array, mid, left, right)
+    half_window_size = int(window_size) // 2
+    values = numpy.asarray(array)
+    length = len(values)
+    if length == 0:
+        return []
+
+    if half_window_size > 0:
+        # Pads the array so that windows stay in range at both ends.
+        padded = numpy.full(length + 2 * half_window_size, -numpy.inf)
+        padded[half_window_size:half_window_size + length] = values
+        # window_max[k] is the maximum of padded[k:k + half_window_size].
+        window_max = maximum_filter1d(
+            padded, half_window_size,
+            origin=-(half_window_size // 2))[:length + half_window_size + 1]
+        left_max = window_max[:length]
+        right_max = window_max[half_window_size + 1:]
+        # A peak is strictly larger than everything else in its window.
+        is_peak = (values > left_max) & (values > right_max)
+    else:
+        is_peak = numpy.ones(length, dtype=bool)
 
-        if is_peak:
-            results.append((mid, array[int(mid)]))
+    # Only consider value greater than 0.
+    is_peak &= values != 0
 
-        # Use the next candidate found in [mid + 1, right], or right + 1.
-        mid = next_candidate_idx
+    results = [(index, array[index])
+               for index in numpy.flatnonzero(is_peak).tolist()]
 
     # Sort the peaks by values.
     return sorted(results, key=lambda x: x[1], reverse=True)
@@ -305,20 +345,86 @@ def anomaly_detection(signal,
     if len(signal) == 0:
         raise EmptyDataError('Signal data is empty')
 
-    golden_y = _generate_golden_pattern(rate, freq, block_size)
+    detector = AnomalyDetector(rate, freq, block_size, threshold)
+    detector.feed(signal)
+    return detector.finish()
 
-    results = []
 
-    for start in range(0, len(signal), int(block_size / 2)):
-        end = start + block_size
-        test_signal = signal[start:end]
-        matched = _moving_pattern_matching(golden_y, test_signal, threshold)
-        if not matched:
-            results.append(start)
+class AnomalyDetector(object):
+    """Detects anomaly in a sine wave signal fed one chunk at a time.
 
-    results = [float(x) / rate for x in results]
+    Finds the same anomalies as anomaly_detection would in the whole signal,
+    while only keeping less than a block of samples between chunks.
+    """
 
-    return results
+    def __init__(self,
+                 rate,
+                 freq,
+                 block_size=ANOMALY_DETECTION_BLOCK_SIZE,
+                 threshold=PATTERN_MATCHING_THRESHOLD):
+        """Initializes an AnomalyDetector.
+
+        Args:
+            rate: Sampling rate in samples per second.
+            freq: The expected frequency of signal.
+            block_size: The block size in samples to detect anomaly. Blocks
+                        start every int(block_size / 2) samples.
+            threshold: The threshold of correlation index to be judge as
+                       matched.
+        """
+        self._rate = rate
+        self._block_size = block_size
+        self._step = int(block_size / 2)
+        if self._step < 1:
+            raise ValueError('block_size must be at least 2.')
+        self._threshold = threshold
+        self._golden_y = _generate_golden_pattern(rate, freq, block_size)
+        # The samples from the start of the next block to check, and the
+        # index in the signal of the first of them.
+        self._pending = numpy.zeros(0)
+        self._pending_start = 0
+        self._anomalies = []
+
+    def _check_block(self, start, test_signal):
+        if not _moving_pattern_matching(self._golden_y, test_signal,
+                                        self._threshold):
+            self._anomalies.append(self._pending_start + start)
+
+    def feed(self, chunk):
+        """Checks the blocks ending in a chunk of the signal.
+
+        Args:
+            chunk: A 1-D array-like object following the previous chunks.
+        """
+        if len(self._pending):
+            samples = numpy.concatenate((self._pending, chunk))
+        else:
+            samples = numpy.asarray(chunk)
+        start = 0
+        while start + self._block_size <= len(samples):
+            self._check_block(start, samples[start:start + self._block_size])
+            start += self._step
+        # Copies the samples left so that the chunk can be released.
+        self._pending = numpy.array(samples[start:])
+        self._pending_start += start
+
+    def finish(self):
+        """Checks the blocks cut short by the end of the signal.
+
+        Returns:
+            A list containing time markers in seconds that have an anomaly
+                within block_size samples.
+
+        Raises:
+            EmptyDataError: if no samples were fed.
+        """
+        if self._pending_start + len(self._pending) == 0:
+            raise EmptyDataError('Signal data is empty')
+        for start in range(0, len(self._pending), self._step):
+            self._check_block(start, self._pending[start:])
+        self._pending_start += len(self._pending)
+        self._pending = numpy.zeros(0)
+        return [float(x) / self._rate for x in self._anomalies]
 
 
 def get_anomaly_durations(signal,
@@ -420,26 +526,34 @@ def _moving_pattern_matching(golden_signal, test_signal, threshold):
     if len(golden_signal) < len(test_signal):
         raise ValueError('Test signal is longer than golden signal')
 
+    golden_signal = numpy.asarray(golden_signal, dtype=float)
+    test_signal = numpy.asarray(test_signal, dtype=float)
     block_length = len(test_signal)
-    number_of_movings = len(golden_signal) - block_length + 1
-    correlation_indices = []
-    for moving_index in range(number_of_movings):
-        # Cuts one block of golden signal from start index.
-        # The block length is the same as test signal.
-        start = moving_index
-        end = start + block_length
-        golden_signal_block = golden_signal[start:end]
-        try:
-            correlation_index = _get_correlation_index(golden_signal_block,
-                                                       test_signal)
-        except TestSignalNormTooSmallError:
-            logging.info(
-                'Caught one block of test signal that has no meaningful norm')
-            return False
-        correlation_indices.append(correlation_index)
+
+    # The norms of every block of golden signal, from a cumulative sum of
+    # squares, and the correlations with every block at once, which
+    # scipy computes with an FFT when faster.
+    squares_sum = numpy.concatenate(([0.0], numpy.cumsum(golden_signal**2)))
+    golden_norms = numpy.sqrt(
+        numpy.maximum(squares_sum[block_length:] - squares_sum[:-block_length],
+                      0.0))
+    # Checked in the order _get_correlation_index would check the blocks.
+    if golden_norms[0] <= _MINIMUM_SIGNAL_NORM:
+        raise GoldenSignalNormTooSmallError(
+            'No meaningful data as norm is too small.')
+    test_norm = numpy.linalg.norm(test_signal)
+    if test_norm <= _MINIMUM_SIGNAL_NORM:
+        logging.info(
+            'Caught one block of test signal that has no meaningful norm')
+        return False
+    if numpy.any(golden_norms <= _MINIMUM_SIGNAL_NORM):
+        raise GoldenSignalNormTooSmallError(
+            'No meaningful data as norm is too small.')
+    correlations = correlate(golden_signal, test_signal, 'valid')
+    correlation_indices = correlations / (golden_norms * test_norm)
 
     # Checks if the maximum correlation index is high enough.
-    max_corr = max(correlation_indices)
+    max_corr = numpy.max(correlation_indices)
     if max_corr < threshold:
         logging.debug('Got one unmatched block with max_corr: %s', max_corr)
         return False
@@ -498,10 +612,68 @@ def fundamental_freq(signal, rate):
     return fund_freq
 
 
-def rms(array):
-    """Return the root mean square of array.
+def rms(array, axis=None):
+    """Return the root mean square of array, or of each row if axis=1.
     """
-    return numpy.sqrt(numpy.mean(numpy.absolute(array)**2))
+    return numpy.sqrt(numpy.mean(numpy.absolute(array)**2, axis=axis))
+
+
+@functools.lru_cache()
+def _analysis_window(length):
+    """Return the blackmanharris window used by THDN, of the given length."""
+    return blackmanharris(length)
+
+
+@functools.lru_cache()
+def _notch_filter(freq, rate, q):
+    """Return the (b, a) coefficients of the notch filter removing freq."""
+    w0 = freq / (rate / 2.0)
+    return iirnotch(w0, q)
+
+
+def _windows_THDN(windows, rate, q, freq):
+    """Measure the THD+N of each row of a 2-D array of windows.
+
+    See THDN for the arguments. If freq is not specified, the fundamental
+    frequency is calculated for each window.
+
+    Returns:
+        A numpy array of the THD+N of each window.
+    """
+    # Normalize and window signal. This copies the windows, which may be
+    # views of the caller's signal.
+    windows = windows - numpy.mean(windows, axis=1, keepdims=True)
+    windowed = windows * _analysis_window(windows.shape[1])
+    # Find fundamental frequency to remove if not specified.
+    if freq:
+        freqs = numpy.full(len(windowed), freq)
+    else:
+        dft = numpy.fft.rfft(windowed, axis=1)
+        freqs = rate * (numpy.argmax(numpy.abs(dft), axis=1) /
+                        windowed.shape[1])
+    # Filter the windows sharing a fundamental frequency together, with the
+    # same notch filter, to isolate noise.
+    noise = numpy.empty_like(windowed)
+    for fund_freq in numpy.unique(freqs):
+        rows = freqs == fund_freq
+        b, a = _notch_filter(fund_freq, rate, q)
+        noise[rows] = lfilter(b, a, windowed[rows], axis=1)
+    # Calculate THD+N.
+    return rms(noise, axis=1) / rms(windowed, axis=1)
+
+
+def _batch_THDN(signal, rate, step_size, window_size, q, freq):
+    """Measure the THD+N of every window of a signal that fits in it.
+
+    Runs in the worker processes of THDN_series.
+    """
+    count = (len(signal) - window_size) // step_size + 1
+    windows = as_strided(signal,
+                         shape=(count, window_size),
+                         strides=(signal.strides[0] * step_size,
+                                  signal.strides[0]),
+                         writeable=False)
+    return _windows_THDN(windows, rate, q, freq)
 
 
 def THDN(signal, rate, q, freq):
@@ -520,21 +692,57 @@ def THDN(signal, rate, q, freq):
         THDN: THD+N ratio calculated from the ratio of RMS of pure harmonics
             and noise signal to RMS of original signal.
     """
-    # Normalize and window signal.
-    signal -= numpy.mean(signal)
-    windowed = signal * blackmanharris(len(signal))
-    # Find fundamental frequency to remove if not specified.
-    freq = freq or fundamental_freq(windowed, rate)
-    # Create notch filter to isolate noise.
-    w0 = freq / (rate / 2.0)
-    b, a = iirnotch(w0, q)
-    noise = lfilter(b, a, windowed)
-    # Calculate THD+N.
-    THDN = rms(noise) / rms(windowed)
-    return THDN
+    signal = numpy.asarray(signal, dtype=float)
+    return _windows_THDN(signal[numpy.newaxis, :], rate, q, freq)[0]
+
+
+def THDN_series(signal, rate, step_size, window_size, q, freq,
+                processes=None):
+    """Analyze signal with moving window and find the THD+N of each window.
 
+    The windows start every step_size samples, and end before the end of the
+    signal. They are analyzed in batches of up to THDN_BATCH_SAMPLES samples,
+    which are spread across processes if more than one process is allowed.
 
-def max_THDN(signal, rate, step_size, window_size, q, freq):
+    Args:
+        signal: array representing the signal
+        rate: sample rate of the signal.
+        step_size: how many samples to move the window by for each analysis.
+        window_size: how many samples to analyze each time.
+        q: quality factor for the notch filter.
+        freq: fundamental frequency of the signal. All other frequencies
+            are noise. If not specified, will be calculated using FFT for
+            each window.
+        processes: the maximum number of processes analyzing the batches. If
+            not specified, the batches are analyzed in this process.
+    Returns:
+        A numpy array of the THD+N value of each window.
+    """
+    signal = numpy.asarray(signal, dtype=float)
+    if len(signal) <= window_size:
+        return numpy.empty(0)
+    count = (len(signal) - window_size - 1) // step_size + 1
+    batch_count = max(1, THDN_BATCH_SAMPLES // window_size)
+    batches = []
+    for first in range(0, count, batch_count):
+        last = min(count, first + batch_count) - 1
+        batches.append(signal[first * step_size:
+                              last * step_size + window_size])
+
+    args = (rate, step_size, window_size, q, freq)
+    if processes and processes > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(_batch_THDN, batch, *args)
+                for batch in batches
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [_batch_THDN(batch, *args) for batch in batches]
+    return numpy.concatenate(results)
+
+
+def max_THDN(signal, rate, step_size, window_size, q, freq, processes=None):
     """Analyze signal with moving window and find maximum THD+N value.
     Args:
         signal: array representing the signal
@@ -544,18 +752,16 @@ def max_THDN(signal, rate, step_size, window_size, q, freq):
         q: quality factor for the notch filter.
         freq: fundamental frequency of the signal. All other frequencies
             are noise. If not specified, will be calculated using FFT.
+        processes: the maximum number of processes analyzing the signal. See
+            THDN_series.
     Returns:
         greatest_THDN: the greatest THD+N value found across all windows
     """
-    greatest_THDN = 0
-    cur = 0
-    while cur + window_size < len(signal):
-        window = signal[cur:cur + window_size]
-        res = THDN(window, rate, q, freq)
-        cur += step_size
-        if res > greatest_THDN:
-            greatest_THDN = res
-    return greatest_THDN
+    series = THDN_series(signal, rate, step_size, window_size, q, freq,
+                         processes)
+    # Silent windows have no THD+N value, and the greatest is 0 if no
+    # window has one.
+    return numpy.nanmax(numpy.append(series, 0))
 
 
 def get_file_THDN(filename, q, freq=None):
@@ -587,7 +793,8 @@ def get_file_THDN(filename, q, freq=None):
     return channel_results
 
 
-def get_file_max_THDN(filename, step_size, window_size, q, freq=None):
+def get_file_max_THDN(filename, step_size, window_size, q, freq=None,
+                      processes=None):
     """Get max THD+N value across analysis windows for each channel of file.
 
     Args:
@@ -598,6 +805,8 @@ def get_file_max_THDN(filename, step_size, window_size, q, freq=None):
         q (float): quality factor for the notch filter.
         freq (int|float): fundamental frequency of the signal. All other
             frequencies are noise. If None, will be calculated with FFT.
+        processes (int): the maximum number of processes analyzing each
+            channel. If None, the channels are analyzed in this process.
     Returns:
         channel_results (list): max THD+N value for each channel's signal.
             List index corresponds to channel index.
@@ -610,7 +819,8 @@ def get_file_max_THDN(filename, step_size, window_size, q, freq=None):
                                         step_size=step_size,
                                         window_size=window_size,
                                         q=q,
-                                        freq=freq))
+                                        freq=freq,
+                                        processes=processes))
     else:
         for ch_no, channel in enumerate(audio_file.read().transpose()):
             channel_results.append(max_THDN(signal=channel,
@@ -618,7 +828,8 @@ def get_file_max_THDN(filename, step_size, window_size, q, freq=None):
                                             step_size=step_size,
                                             window_size=window_size,
                                             q=q,
-                                            freq=freq))
+                                            freq=freq,
+                                            processes=processes))
     return channel_results
 
 
@@ -18,6 +18,7 @@
 import contextlib
 import copy
 import numpy
+import os
 import struct
 from io import StringIO
 """The dict containing information on how to parse sample from raw data.
@@ -65,7 +66,9 @@ class AudioRawData(object):
     @property channel: The number of channels.
     @property channel_data: A list of lists containing samples in each channel.
                             E.g., The third sample in the second channel is
-                            channel_data[1][2].
+                            channel_data[1][2]. The channels read by
+                            read_binary and read_file are views of the
+                            samples, which are not copied.
     @property sample_format: The sample format which should be one of the keys
                              in audio_data.SAMPLE_FORMATS.
     """
@@ -86,6 +89,20 @@ class AudioRawData(object):
         if binary:
             self.read_binary(binary)
 
+    def _get_dtype(self):
+        """Returns the numpy dtype of the samples, e.g. <i4 for S32_LE."""
+        sample_format_dict = SAMPLE_FORMATS[self.sample_format]
+        return numpy.dtype('%s%d' % (sample_format_dict['dtype_str'],
+                                     sample_format_dict['size_bytes']))
+
+    def _set_samples(self, np_array):
+        """Shapes a 1-D array of interleaved samples into each channel."""
+        n_frames = len(np_array) / self.channel
+        # Reshape np_array into an array of shape (n_frames, channel).
+        np_array = np_array.reshape(int(n_frames), self.channel)
+        # Transpose np_arrya so it becomes of shape (channel, n_frames).
+        self.channel_data = np_array.transpose()
+
     def read_binary(self, binary):
         """Reads samples from binary and fills channel_data.
 
@@ -93,20 +110,52 @@ class AudioRawData(object):
         and shapes them into each channel.
 
         Args:
-            binary: A string containing binary data.
+            binary: A string containing binary data, or any object supporting
+                    the buffer protocol, such as an mmap. The samples are
+                    not copied, so it must not be modified afterwards.
         """
-        sample_format_dict = SAMPLE_FORMATS[self.sample_format]
+        # Reads data from a string into 1-D array.
+        np_array = numpy.frombuffer(binary, dtype=self._get_dtype())
+        self._set_samples(np_array)
 
-        # The data type used in numpy fromstring function. For example,
-        # <i4 for 32-bit signed int.
-        np_dtype = '%s%d' % (sample_format_dict['dtype_str'],
-                             sample_format_dict['size_bytes'])
+    def read_file(self, filename, offset=0, n_frames=None):
+        """Memory-maps samples from a file and fills channel_data.
 
-        # Reads data from a string into 1-D array.
-        np_array = numpy.fromstring(binary, dtype=np_dtype)
+        The samples are only read from the file as they are used, so that
+        files larger than the memory can be analyzed one chunk at a time.
 
-        n_frames = len(np_array) / self.channel
-        # Reshape np_array into an array of shape (n_frames, channel).
-        np_array = np_array.reshape(int(n_frames), self.channel)
-        # Transpose np_arrya so it becomes of shape (channel, n_frames).
-        self.channel_data = np_array.transpose()
+        Args:
+            filename: The file containing the samples.
+            offset: The offset in bytes of the first sample in the file.
+            n_frames: The number of frames to read. If None or past the end
+                      of the file, reads all the frames until the end of the
+                      file.
+        """
+        dtype = self._get_dtype()
+        # A truncated file has less frames than expected.
+        max_frames = ((os.path.getsize(filename) - offset) //
+                      (dtype.itemsize * self.channel))
+        if n_frames is None or n_frames > max_frames:
+            n_frames = max_frames
+        if n_frames <= 0:
+            self._set_samples(numpy.zeros(0, dtype=dtype))
+            return
+        np_array = numpy.memmap(filename, dtype=dtype, mode='r',
+                                offset=offset,
+                                shape=(n_frames * self.channel, ))
+        self._set_samples(np_array)
+
+    def channel_chunks(self, channel_idx, chunk_size):
+        """Yields the samples of a channel in chunks.
+
+        Args:
+            channel_idx: The index of the channel.
+            chunk_size: The number of samples in each chunk. The last chunk
+                        may be shorter.
+
+        Yields:
+            Consecutive views of channel_data[channel_idx].
+        """
+        samples = self.channel_data[channel_idx]
+        for start in range(0, len(samples), chunk_size):
+            yield samples[start:start + chunk_size]
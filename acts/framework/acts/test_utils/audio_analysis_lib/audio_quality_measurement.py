@@ -349,41 +349,34 @@ def find_block_average_value(arr, side_block_size, block_size):
                                  right_block_average_array,
                                  block_average_array)
     """
+    arr = numpy.asarray(arr, dtype=float)
     length = len(arr)
-    left_border, right_border = 0, 1
-    left_block_sum = arr[0]
-    right_block_sum = arr[0]
-    left_average_array = numpy.zeros(length)
-    right_average_array = numpy.zeros(length)
-    block_average_array = numpy.zeros(length)
-    for index in range(0, length):
-        while left_border < index - side_block_size:
-            left_block_sum -= arr[left_border]
-            left_border += 1
-        while right_border < min(length, index + side_block_size):
-            right_block_sum += arr[right_border]
-            right_border += 1
-
-        left_average_value = float(left_block_sum) / (index - left_border + 1)
-        right_average_value = float(right_block_sum) / (right_border - index)
-        left_average_array[index] = left_average_value
-        right_average_array[index] = right_average_value
-
-        if index + 1 < length:
-            left_block_sum += arr[index + 1]
-        right_block_sum -= arr[index]
-    left_border, right_border = 0, 1
-    block_sum = 0
-    for index in range(0, length):
-        while left_border < index - block_size / 2:
-            block_sum -= arr[left_border]
-            left_border += 1
-        while right_border < min(length, index + block_size / 2):
-            block_sum += arr[right_border]
-            right_border += 1
-
-        average_value = float(block_sum) / (right_border - left_border)
-        block_average_array[index] = average_value
+    index = numpy.arange(length)
+    # cumulative_sum[i] is the sum of arr[0:i].
+    cumulative_sum = numpy.concatenate(([0.0], numpy.cumsum(arr)))
+
+    def block_sum(left_border, right_border):
+        """Returns the sums of arr[left_border:right_border]."""
+        return cumulative_sum[right_border] - cumulative_sum[left_border]
+
+    left_border = numpy.maximum(0, numpy.ceil(index - side_block_size))
+    left_border = left_border.astype(int)
+    right_border = numpy.minimum(length, numpy.ceil(index + side_block_size))
+    right_border = numpy.maximum(index + 1, right_border).astype(int)
+    left_average_array = (block_sum(left_border, index + 1) /
+                          (index - left_border + 1))
+    right_average_array = (block_sum(index, right_border) /
+                           (right_border - index))
+
+    left_border = numpy.maximum(0, numpy.ceil(index - block_size / 2))
+    left_border = left_border.astype(int)
+    right_border = numpy.minimum(length, numpy.ceil(index + block_size / 2))
+    right_border = numpy.maximum(1, right_border).astype(int)
+    # The block sums have always been short of arr[0], which used to be
+    # subtracted once the block moved past it without ever being added.
+    # Keep doing so to give the same averages.
+    block_average_array = ((block_sum(left_border, right_border) - arr[0]) /
+                           (right_border - left_border))
     return (left_average_array, right_average_array, block_average_array)
 
 
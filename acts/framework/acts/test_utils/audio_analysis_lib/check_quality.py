@@ -23,6 +23,7 @@ import math
 import numpy
 import os
 import pprint
+import struct
 import subprocess
 import tempfile
 import wave
@@ -45,6 +46,10 @@ DEFAULT_DELAY_AMPLITUDE_THRESHOLD = 0.6
 DEFAULT_FREQUENCY_ERROR_THRESHOLD = 0.5
 DEFAULT_NOISE_AMPLITUDE_THRESHOLD = 0.5
 
+# The size in bytes of the RIFF header, and of each chunk header.
+RIFF_HEADER_SIZE = 12
+RIFF_CHUNK_HEADER_SIZE = 8
+
 
 class WaveFileException(Exception):
     """Error in WaveFile."""
@@ -56,9 +61,40 @@ class WaveFormatExtensibleException(Exception):
     pass
 
 
+def find_wave_data_offset(filename):
+    """Finds where the samples start in a wave file.
+
+    Args:
+        filename: The wave file.
+
+    Returns:
+        The offset in bytes of the data chunk content in the file.
+
+    Raises:
+        WaveFileException: There is no data chunk in the file.
+    """
+    with open(filename, 'rb') as f:
+        offset = RIFF_HEADER_SIZE
+        f.seek(offset)
+        while True:
+            header = f.read(RIFF_CHUNK_HEADER_SIZE)
+            if len(header) < RIFF_CHUNK_HEADER_SIZE:
+                raise WaveFileException('No data chunk in %s' % filename)
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            offset += RIFF_CHUNK_HEADER_SIZE
+            if chunk_id == b'data':
+                return offset
+            # Chunks are padded to an even size.
+            offset += chunk_size + chunk_size % 2
+            f.seek(offset)
+
+
 class WaveFile(object):
     """Class which handles wave file reading.
 
+    The samples are memory-mapped rather than read, see
+    audio_data.AudioRawData.read_file.
+
     Properties:
         raw_data: audio_data.AudioRawData object for data in wave file.
         rate: sampling rate.
@@ -79,7 +115,6 @@ class WaveFile(object):
         self._n_channels = None
         self._sample_width_bits = None
         self._n_frames = None
-        self._binary = None
 
         try:
             self._read_wave_file(filename)
@@ -130,7 +165,7 @@ class WaveFile(object):
         try:
             self._wave_reader = wave.open(filename, 'r')
             self._read_wave_header()
-            self._read_wave_binary()
+            self._map_wave_binary(filename)
         except wave.Error as e:
             if 'unknown format: 65534' in str(e):
                 raise WaveFormatExtensibleException()
@@ -162,14 +197,20 @@ class WaveFile(object):
         if comptype != 'NONE' or compname != 'not compressed':
             raise WaveFileException('Can not support compressed wav file.')
 
-    def _read_wave_binary(self):
-        """Reads in samples in wave file."""
-        self._binary = self._wave_reader.readframes(self._n_frames)
+    def _map_wave_binary(self, filename):
+        """Memory-maps the samples in wave file.
+
+        Args:
+            filename: The wave file to be read.
+
+        """
         format_str = 'S%d_LE' % self._sample_width_bits
         self.raw_data = audio_data.AudioRawData(
-            binary=self._binary,
-            channel=self._n_channels,
-            sample_format=format_str)
+            binary=None, channel=self._n_channels, sample_format=format_str)
+        self.raw_data.read_file(
+            filename,
+            offset=find_wave_data_offset(filename),
+            n_frames=self._n_frames)
 
 
 class QualityCheckerError(Exception):
@@ -190,17 +231,22 @@ class QualityFailure(QualityCheckerError):
 class QualityChecker(object):
     """Quality checker controls the flow of checking quality of raw data."""
 
-    def __init__(self, raw_data, rate):
+    def __init__(self, raw_data, rate, chunk_size=None):
         """Inits a quality checker.
 
         Args:
             raw_data: An audio_data.AudioRawData object.
             rate: Sampling rate in samples per second. Example inputs: 44100,
             48000
+            chunk_size: If not None, the spectral analysis reads the samples
+                        of each channel in chunks of chunk_size samples,
+                        instead of loading the whole channel into memory.
+                        See audio_analysis.spectral_analysis_chunks.
 
         """
         self._raw_data = raw_data
         self._rate = rate
+        self._chunk_size = chunk_size
         self._spectrals = []
         self._quality_result = []
 
@@ -215,9 +261,11 @@ class QualityChecker(object):
 
         """
         self.has_data()
+        saturate_value = audio_data.get_maximum_value_from_sample_format(
+            self._raw_data.sample_format)
         for channel_idx in range(self._raw_data.channel):
             signal = self._raw_data.channel_data[channel_idx]
-            max_abs = max(numpy.abs(signal))
+            max_abs = self._max_abs(channel_idx)
             logging.debug('Channel %d max abs signal: %f', channel_idx,
                           max_abs)
             if max_abs == 0:
@@ -225,15 +273,18 @@ class QualityChecker(object):
                              channel_idx)
                 continue
 
-            saturate_value = audio_data.get_maximum_value_from_sample_format(
-                self._raw_data.sample_format)
-            normalized_signal = audio_analysis.normalize_signal(
-                signal, saturate_value)
             logging.debug('saturate_value: %f', saturate_value)
-            logging.debug('max signal after normalized: %f',
-                          max(normalized_signal))
-            spectral = audio_analysis.spectral_analysis(
-                normalized_signal, self._rate)
+            if self._chunk_size:
+                spectral = audio_analysis.spectral_analysis_chunks(
+                    (audio_analysis.normalize_signal(chunk, saturate_value)
+                     for chunk in self._chunks(channel_idx)), self._rate)
+            else:
+                normalized_signal = audio_analysis.normalize_signal(
+                    signal, saturate_value)
+                logging.debug('max signal after normalized: %f',
+                              numpy.max(normalized_signal))
+                spectral = audio_analysis.spectral_analysis(
+                    normalized_signal, self._rate)
 
             logging.debug('Channel %d spectral:\n%s', channel_idx,
                           pprint.pformat(spectral))
@@ -247,6 +298,10 @@ class QualityChecker(object):
 
             try:
                 if check_quality:
+                    # The quality measurement needs the whole signal.
+                    if self._chunk_size:
+                        normalized_signal = audio_analysis.normalize_signal(
+                            signal, saturate_value)
                     quality = audio_quality_measurement.quality_measurement(
                         signal=normalized_signal,
                         rate=self._rate,
@@ -270,6 +325,21 @@ class QualityChecker(object):
                     "Failed to analyze channel {} with error: {}".format(
                         channel_idx, error))
 
+    def _chunks(self, channel_idx):
+        """Yields the samples of a channel, in chunks if chunk_size is set."""
+        if self._chunk_size:
+            for chunk in self._raw_data.channel_chunks(channel_idx,
+                                                       self._chunk_size):
+                yield chunk
+        else:
+            yield self._raw_data.channel_data[channel_idx]
+
+    def _max_abs(self, channel_idx):
+        """Returns the maximum absolute value of the samples of a channel."""
+        return max((numpy.max(numpy.abs(chunk))
+                    for chunk in self._chunks(channel_idx) if len(chunk)),
+                   default=0)
+
     def has_data(self):
         """Checks if data has been set.
 
@@ -447,11 +517,9 @@ def read_audio_file(filename, channel, bit_width, rate):
         raw_data = wavefile.raw_data
         rate = wavefile.rate
     elif filename.endswith('.raw'):
-        binary = None
-        with open(filename, 'rb') as f:
-            binary = f.read()
         raw_data = audio_data.AudioRawData(
-            binary=binary, channel=channel, sample_format='S%d_LE' % bit_width)
+            binary=None, channel=channel, sample_format='S%d_LE' % bit_width)
+        raw_data.read_file(filename)
     else:
         raise CheckQualityError(
             'File format for %s is not supported' % filename)
@@ -505,6 +573,7 @@ def quality_analysis(
         quality_delay_amplitude_threshold=DEFAULT_DELAY_AMPLITUDE_THRESHOLD,
         quality_frequency_error_threshold=DEFAULT_FREQUENCY_ERROR_THRESHOLD,
         quality_noise_amplitude_threshold=DEFAULT_NOISE_AMPLITUDE_THRESHOLD,
+        chunk_size=None,
 ):
     """ Runs various functions to measure audio quality base on user input.
 
@@ -529,12 +598,15 @@ def quality_analysis(
         threshold.
         quality_burst_amplitude_threshold: Input the burst aplitutde
         threshold.
+        chunk_size: If not None, the spectral analysis reads the file in
+        chunks of chunk_size samples to bound the memory used. Only useful
+        with spectral_only, as the quality measurement needs whole channels.
     """
     format = '%(asctime)-15s:%(levelname)s:%(pathname)s:%(lineno)d: %(message)s'
     logging.basicConfig(format=format, level=logging.INFO)
     raw_data, rate = read_audio_file(filename, channel, bit_width, rate)
 
-    checker = QualityChecker(raw_data, rate)
+    checker = QualityChecker(raw_data, rate, chunk_size)
 
     quality_params = get_quality_params(
         quality_block_size_secs, quality_frequency_error_threshold,
@@ -86,7 +86,8 @@ class SshAudioCapture(AudioCapture):
         else:
             self.terminate_audio()
 
-    def THDN(self, win_size=None, step_size=None, q=1, freq=None):
+    def THDN(self, win_size=None, step_size=None, q=1, freq=None,
+             processes=None):
         """Calculate THD+N value for most recently recorded file.
 
         Args:
@@ -99,6 +100,9 @@ class SshAudioCapture(AudioCapture):
                 frequency from signal to isolate noise.
             freq: the fundamental frequency to remove from the signal. If none,
                 the fundamental frequency will be determined using FFT.
+            processes: the maximum number of processes analyzing the windows
+                of each channel. If not specified, the windows are analyzed
+                in this process.
         Returns:
             channel_results (list): THD+N value for each channel's signal.
                 List index corresponds to channel index.
@@ -113,7 +117,8 @@ class SshAudioCapture(AudioCapture):
                                                     step_size=step_size,
                                                     window_size=win_size,
                                                     q=q,
-                                                    freq=freq)
+                                                    freq=freq,
+                                                    processes=processes)
 
     def detect_anomalies(self, freq=None,
                          block_size=ANOMALY_DETECTION_BLOCK_SIZE,
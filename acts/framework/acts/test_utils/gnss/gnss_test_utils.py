@@ -33,6 +33,12 @@ WifiEnums = wutils.WifiEnums
 PULL_TIMEOUT = 300
 GNSSSTATUS_LOG_PATH = "/storage/emulated/0/Android/data/com.android.gpstool/files"
 QXDM_MASKS = ["GPS-general.cfg", "GPS.cfg", "default.cfg"]
+# How often, in seconds, waiting for logcat messages checks that adb logcat
+# is still running.
+LOGCAT_CHECK_INTERVAL = 5
+TTFF_STOP_MESSAGE = "stop gps test()"
+TTFF_CRASH_MESSAGE = "Force finishing activity com.android.gpstool/.GPSTool"
+TTFF_LOG_MESSAGE = "write TTFF log"
 
 
 class GnssTestUtilsError(Exception):
@@ -496,23 +502,22 @@ def process_gnss_by_gtw_gpstool(ad, criteria):
         begin_time = get_current_epoch_time()
         clear_aiding_data_by_gtw_gpstool(ad)
         ad.log.info("Start GNSS on GTW_GPSTool - attempt %d" % (i+1))
-        start_gnss_by_gtw_gpstool(ad, True)
-        for _ in range(10 + criteria):
-            logcat_results = ad.search_logcat("First fixed", begin_time)
-            if logcat_results:
-                first_fixed = int(logcat_results[-1]["log_message"].split()[-1])
-                ad.log.info("GNSS First fixed = %.3f seconds" % (first_fixed / 1000))
-                if (first_fixed / 1000) <= criteria:
-                    return True
-                ad.log.error("DUT takes more than %d seconds to get location "
-                             "fixed. Test Abort and Close GPS for next test "
-                             "item." % criteria)
-                start_gnss_by_gtw_gpstool(ad, False)
-                return False
-            time.sleep(1)
-        start_gnss_by_gtw_gpstool(ad, False)
         if not ad.is_adb_logcat_on:
             ad.start_adb_logcat()
+        with ad.subscribe_logcat(["First fixed"], begin_time) as subscription:
+            start_gnss_by_gtw_gpstool(ad, True)
+            first_fixed_log = subscription.get(timeout=10 + criteria)
+        if first_fixed_log:
+            first_fixed = int(first_fixed_log.split()[-1])
+            ad.log.info("GNSS First fixed = %.3f seconds" % (first_fixed / 1000))
+            if (first_fixed / 1000) <= criteria:
+                return True
+            ad.log.error("DUT takes more than %d seconds to get location "
+                         "fixed. Test Abort and Close GPS for next test "
+                         "item." % criteria)
+            start_gnss_by_gtw_gpstool(ad, False)
+            return False
+        start_gnss_by_gtw_gpstool(ad, False)
     ad.log.error("Test Abort. DUT can't get location fixed within %d attempts."
                  % retries)
     return False
@@ -546,33 +551,44 @@ def process_ttff_by_gtw_gpstool(ad, begin_time):
     """
     loop = 1
     ttff_result = []
-    ttff_log_loop = []
-    while True:
-        stop_gps_results = ad.search_logcat("stop gps test()", begin_time)
-        if stop_gps_results:
-            ad.send_keycode("HOME")
-            break
-        crash_result = ad.search_logcat("Force finishing activity "
-                                        "com.android.gpstool/.GPSTool", begin_time)
-        if crash_result:
-            ad.log.error("GPSTool crashed. Abort test.")
-            break
-        logcat_results = ad.search_logcat("write TTFF log", begin_time)
-        if logcat_results:
-            ttff_log = logcat_results[-1]["log_message"].split()
-            if not ttff_log_loop:
-                ttff_log_loop.append(ttff_log[8].split(":")[-1])
-            elif ttff_log[8].split(":")[-1] == ttff_log_loop[loop-1]:
+    ttff_log_loops = set()
+    subscription = None
+    try:
+        while True:
+            if subscription is None:
+                if not ad.is_adb_logcat_on:
+                    ad.start_adb_logcat()
+                # Messages already handled are skipped, so replaying all of
+                # them again after restarting adb logcat is harmless.
+                subscription = ad.subscribe_logcat([
+                    TTFF_STOP_MESSAGE, TTFF_CRASH_MESSAGE, TTFF_LOG_MESSAGE
+                ], begin_time)
+            log_message = subscription.get(timeout=LOGCAT_CHECK_INTERVAL)
+            if log_message is None:
+                if not ad.is_adb_logcat_on:
+                    subscription.close()
+                    subscription = None
+                continue
+            if TTFF_STOP_MESSAGE in log_message:
+                ad.send_keycode("HOME")
+                break
+            if TTFF_CRASH_MESSAGE in log_message:
+                ad.log.error("GPSTool crashed. Abort test.")
+                break
+            ttff_log = log_message.split()
+            ttff_log_loop = ttff_log[8].split(":")[-1]
+            if ttff_log_loop in ttff_log_loops:
                 continue
             if ttff_log[11] == "0.0":
                 ad.log.error("Iteration %d = Timeout" % loop)
             else:
                 ad.log.info("Iteration %d = %s seconds" % (loop, ttff_log[11]))
-            ttff_log_loop.append(ttff_log[8].split(":")[-1])
+            ttff_log_loops.add(ttff_log_loop)
             ttff_result.append(float(ttff_log[11]))
             loop += 1
-        if not ad.is_adb_logcat_on:
-            ad.start_adb_logcat()
+    finally:
+        if subscription is not None:
+            subscription.close()
     return ttff_result
 
 def check_ttff_result(ad, ttff_result, ttff_mode, criteria):
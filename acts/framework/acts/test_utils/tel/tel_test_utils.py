@@ -6934,9 +6934,9 @@ def set_apm_mode_on_by_serial(ad, serial_id):
 
 
 def print_radio_info(ad, extra_msg=""):
-    for prop in ("gsm.version.baseband", "persist.radio.ver_info",
-                 "persist.radio.cnv.ver_info"):
-        output = ad.adb.getprop(prop)
+    props = ad.adb.getprops(("gsm.version.baseband", "persist.radio.ver_info",
+                             "persist.radio.cnv.ver_info"))
+    for prop, output in props.items():
         ad.log.info("%s%s = %s", extra_msg, prop, output)
 
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Helpers for plotting power measurement data, without plotting libraries."""
+
+import numpy as np
+
+
+def decimate_envelope(data, max_points):
+    """Decimates data, keeping the minimum and maximum of each bucket.
+
+    The data is split into buckets of consecutive samples, and only the
+    minimum and the maximum of each bucket are kept, in time order, so that
+    peaks still show in the plot.
+
+    Args:
+        data: A 1-D numpy array of samples.
+        max_points: The maximum number of points to keep, at least 2.
+
+    Returns:
+        A tuple (indices, sums, counts) of numpy arrays with the indices of
+        the kept samples, and for each of them the sum and the number of the
+        samples of the bucket it stands for. Only the first kept sample of a
+        bucket has the sum and count of the bucket, the other has zeros, so
+        that the average of the buckets of any kept samples is the sum of
+        their sums divided by the sum of their counts.
+
+    Raises:
+        ValueError: If max_points is less than 2.
+    """
+    if max_points < 2:
+        raise ValueError('max_points must be at least 2, got %s.' % max_points)
+    length = len(data)
+    if length <= max_points:
+        return np.arange(length), data.astype(np.float64), np.ones(length)
+    bucket_size = -(-length // (max_points // 2))
+    starts = np.arange(0, length, bucket_size)
+    # Pads the last bucket with its last sample, which changes neither its
+    # minimum nor its maximum.
+    buckets = np.pad(data, (0, len(starts) * bucket_size - length),
+                     mode='edge').reshape(len(starts), bucket_size)
+    min_indices = np.argmin(buckets, axis=1)
+    max_indices = np.argmax(buckets, axis=1)
+    indices = np.column_stack((np.minimum(min_indices, max_indices),
+                               np.maximum(min_indices, max_indices)))
+    indices = np.minimum(indices + starts[:, np.newaxis], length - 1)
+    sums = np.add.reduceat(data.astype(np.float64), starts)
+    counts = np.diff(np.append(starts, length))
+    zeros = np.zeros(len(starts))
+    return (indices.ravel(), np.column_stack((sums, zeros)).ravel(),
+            np.column_stack((counts, zeros)).ravel())
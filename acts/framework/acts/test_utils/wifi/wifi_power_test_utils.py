@@ -15,11 +15,13 @@
 #   limitations under the License.
 
 import logging
+import numpy as np
 import time
 from acts import utils
 from acts.controllers import monsoon
 from acts.libs.proc import job
 from acts.controllers.ap_lib import bridge_interface as bi
+from acts.test_utils.wifi import wifi_power_plot_utils as plot_utils
 from acts.test_utils.wifi import wifi_test_utils as wutils
 from bokeh.layouts import column, layout
 from bokeh.models import CustomJS, ColumnDataSource
@@ -37,9 +39,26 @@ GET_FROM_PHONE = 'get_from_dut'
 GET_FROM_AP = 'get_from_ap'
 ENABLED_MODULATED_DTIM = 'gEnableModulatedDTIM='
 MAX_MODULATED_DTIM = 'gMaxLIModulatedDTIM='
-
-
-def monsoon_data_plot(mon_info, file_path, tag=""):
+# The maximum number of points monsoon_data_plot plots at once, so that the
+# html file stays small enough for the browser.
+MONSOON_PLOT_MAX_POINTS = 20000
+
+
+def _decimated_plot_data(time_relative, current_data, max_points):
+    """Returns the ColumnDataSource data plotting current_data decimated."""
+    indices, sums, counts = plot_utils.decimate_envelope(
+        current_data, max_points)
+    return dict(x0=time_relative[indices],
+                y0=current_data[indices],
+                sum=sums,
+                count=counts)
+
+
+def monsoon_data_plot(mon_info,
+                      file_path,
+                      tag="",
+                      max_points=MONSOON_PLOT_MAX_POINTS,
+                      tiles=0):
     """Plot the monsoon current data using bokeh interactive plotting tool.
 
     Plotting power measurement data with bokeh to generate interactive plots.
@@ -48,11 +67,22 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     bokeh callback java scripting is used. View a sample html output file:
     https://drive.google.com/open?id=0Bwp8Cq841VnpT2dGUUxLYWZvVjA
 
+    The current data is decimated to max_points before plotting, see
+    wifi_power_plot_utils.decimate_envelope. The averages in the table,
+    including those of selected points, are computed from the data before
+    decimation.
+
     Args:
         mon_info: obj with information of monsoon measurement, including
                   monsoon device object, measurement frequency, duration and
                   offset etc.
-        file_path: the path to the monsoon log file with current data
+        file_path: the path to the monsoon log file with current data, in
+                   either the text or the binary format
+        tag: a suffix of the plot title and html file name.
+        max_points: the maximum number of points plotted at once.
+        tiles: if not 0, the data is also split in this many tiles, each
+               decimated to max_points, which are plotted instead of the
+               whole data when zooming into up to two tiles.
 
     Returns:
         plot: the plotting object of bokeh, optional, will be needed if multiple
@@ -64,23 +94,21 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     log = logging.getLogger()
     log.info("Plot the power measurement data")
     #Get results as monsoon data object from the input file
-    results = monsoon.MonsoonData.from_text_file(file_path)
-    #Decouple current and timestamp data from the monsoon object
-    current_data = []
-    timestamps = []
+    results = monsoon.MonsoonData.from_file(file_path)
+    #Decouple current data from the monsoon object
     voltage = results[0].voltage
-    [current_data.extend(x.data_points) for x in results]
-    [timestamps.extend(x.timestamps) for x in results]
+    current_data = np.concatenate(
+        [np.asarray(x.data_points, dtype=np.float64) for x in results])
     period = 1 / float(mon_info.freq)
-    time_relative = [x * period for x in range(len(current_data))]
+    time_relative = np.arange(len(current_data)) * period
     #Calculate the average current for the test
-    current_data = [x * 1000 for x in current_data]
-    avg_current = sum(current_data) / len(current_data)
-    color = ['navy'] * len(current_data)
+    current_data *= 1000
+    avg_current = float(np.mean(current_data))
 
     #Preparing the data and source link for bokehn java callback
-    source = ColumnDataSource(
-        data=dict(x0=time_relative, y0=current_data, color=color))
+    data = _decimated_plot_data(time_relative, current_data, max_points)
+    data['color'] = ['navy'] * len(data['x0'])
+    source = ColumnDataSource(data=data)
     s2 = ColumnDataSource(
         data=dict(
             z0=[mon_info.duration],
@@ -125,6 +153,7 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     var d1 = cb_obj.get('data');
     var d2 = mytable.get('source').get('data');
     ym = 0
+    n = 0
     ts = 0
     d2['x0'] = []
     d2['y0'] = []
@@ -134,14 +163,16 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     min=max=d1['x0'][inds[0]]
     if (inds.length==0) {return;}
     for (i = 0; i < inds.length; i++) {
-    ym += d1['y0'][inds[i]]
+    ym += d1['sum'][inds[i]]
+    n += d1['count'][inds[i]]
     d1['color'][inds[i]] = "red"
     if (d1['x0'][inds[i]] < min) {
       min = d1['x0'][inds[i]]}
     if (d1['x0'][inds[i]] > max) {
       max = d1['x0'][inds[i]]}
     }
-    ym /= inds.length
+    if (n==0) {return;}
+    ym /= n
     ts = max - min
     dx0 = Math.round(ym*4.2*100.0)/100.0
     dy0 = Math.round(ym*100.0)/100.0
@@ -156,12 +187,88 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     mytable.trigger('change');
     """)
 
+    if tiles:
+        _add_plot_tiles(plot, source, time_relative, current_data,
+                        max_points, tiles)
+
     #Layout the plot and the datatable bar
     l = layout([[dt], [plot]])
     save(l)
     return [plot, dt]
 
 
+def _add_plot_tiles(plot, source, time_relative, current_data, max_points,
+                    tiles):
+    """Plots tiles of the data instead of the whole data when zooming in.
+
+    Args:
+        plot: the monsoon_data_plot figure.
+        source: the ColumnDataSource of the plotted data, initially the
+                whole data decimated to max_points.
+        time_relative: the time of each sample of current_data.
+        current_data: the current data in mA, before decimation.
+        max_points: the maximum number of points of each tile.
+        tiles: the number of tiles to split the data in.
+    """
+    overview = ColumnDataSource(data=dict(source.data))
+    tile_data = dict(x0=[], y0=[], sum=[], count=[])
+    tile_index = dict(t0=[], t1=[], lo=[], hi=[])
+    bounds = np.linspace(0, len(current_data), tiles + 1).astype(int)
+    offset = 0
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        data = _decimated_plot_data(time_relative[start:end],
+                                    current_data[start:end], max_points)
+        for key in tile_data:
+            tile_data[key].append(data[key])
+        tile_index['lo'].append(offset)
+        offset += len(data['x0'])
+        tile_index['hi'].append(offset)
+        tile_index['t0'].append(float(time_relative[start]))
+        tile_index['t1'].append(float(time_relative[end - 1]))
+    tile_source = ColumnDataSource(
+        data={key: np.concatenate(value)
+              for key, value in tile_data.items()})
+
+    #Callback Java scripting swapping the tiles in view into the plot
+    plot.x_range.callback = CustomJS(
+        args=dict(
+            source=source,
+            overview=overview,
+            tile_source=tile_source,
+            tile_index=ColumnDataSource(data=tile_index)),
+        code="""
+    var index = tile_index.get('data');
+    var first = -1
+    var last = -1
+    for (i = 0; i < index['t0'].length; i++) {
+    if (index['t1'][i] >= cb_obj.get('start') &&
+        index['t0'][i] <= cb_obj.get('end')) {
+      if (first < 0) {first = i}
+      last = i}
+    }
+    var d0 = overview.get('data');
+    lo = 0
+    hi = d0['x0'].length
+    if (first >= 0 && last - first < 2) {
+      d0 = tile_source.get('data')
+      lo = index['lo'][first]
+      hi = index['hi'][last]}
+    var d1 = source.get('data');
+    if (d1['x0'].length == hi - lo && d1['x0'][0] == d0['x0'][lo]) {return;}
+    var names = ['x0', 'y0', 'sum', 'count'];
+    var d2 = {}
+    for (i = 0; i < names.length; i++) {
+    d2[names[i]] = Array.prototype.slice.call(d0[names[i]], lo, hi)}
+    d2['color'] = []
+    for (i = lo; i < hi; i++) {
+    d2['color'].push('navy')}
+    source.set('data', d2);
+    source.trigger('change');
+    """)
+
+
 def change_dtim(ad, gEnableModulatedDTIM, gMaxLIModulatedDTIM=10):
     """Function to change the DTIM setting in the phone.
 
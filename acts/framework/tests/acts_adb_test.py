@@ -18,6 +18,8 @@ import unittest
 import mock
 from acts.controllers import adb
 from acts.controllers.adb import AdbError
+from acts.controllers.adb_lib import shell_session
+from acts.libs.proc import job
 
 
 class MockJob(object):
@@ -79,6 +81,42 @@ class ADBTest(unittest.TestCase):
             with self.assertRaises(AdbError):
                 MockAdbProxy()._exec_cmd(cmd)
 
+    def test__exec_adb_cmd_runs_without_shell(self):
+        """Tests adb commands are run as argument lists."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = '/bin/adb -s SERIAL'
+        proxy._adb_args = ['/bin/adb', '-s', 'SERIAL']
+        with mock.patch('acts.libs.proc.job.run',
+                        return_value=MockJob()) as job_run:
+            proxy.shell('ls | grep a')
+            proxy.forward('tcp:1 tcp:2')
+        self.assertEqual(
+            [call[0][0] for call in job_run.call_args_list],
+            [['/bin/adb', '-s', 'SERIAL', 'shell', 'ls | grep a'],
+             ['/bin/adb', '-s', 'SERIAL', 'forward', 'tcp:1', 'tcp:2']])
+
+    def test__exec_adb_cmd_uses_shell_for_redirections(self):
+        """Tests adb commands with shell syntax are run by a shell."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = '/bin/adb -s SERIAL'
+        proxy._adb_args = ['/bin/adb', '-s', 'SERIAL']
+        with mock.patch('acts.libs.proc.job.run',
+                        return_value=MockJob()) as job_run:
+            proxy.bugreport('> /tmp/out.txt')
+        self.assertEqual(job_run.call_args[0][0],
+                         '/bin/adb -s SERIAL bugreport > /tmp/out.txt')
+
+    def test_stream_raises_if_device_not_found(self):
+        """Tests stream raises an AdbError when adb cannot find the device."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SERIAL'
+        error = job.Error(job.Result(stderr=b'error: device not found',
+                                     exit_status=1))
+        with mock.patch('acts.libs.proc.job.run_streaming',
+                        side_effect=error):
+            with self.assertRaises(AdbError):
+                list(proxy.stream('bugreport'))
+
     def test__get_version_number_gets_version_number(self):
         """Tests the positive case for AdbProxy.get_version_number()."""
         proxy = MockAdbProxy()
@@ -94,6 +132,102 @@ class ADBTest(unittest.TestCase):
         with self.assertRaises(AdbError):
             proxy.get_version_number()
 
+    def test_shell_uses_persistent_session(self):
+        """Tests shell commands are sent over the persistent shell session."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SERIAL'
+        proxy._shell_session = mock.Mock()
+        proxy._shell_session.run.return_value = (0, b'FEEDACAB\n', b'')
+        with mock.patch('acts.libs.proc.job.run') as job_run:
+            self.assertEqual(proxy.shell('getprop ro.serialno'), 'FEEDACAB')
+        self.assertFalse(job_run.called)
+
+    def test_shell_falls_back_when_session_unusable(self):
+        """Tests shell commands spawn adb if the session cannot be used."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SERIAL'
+        proxy._shell_session = mock.Mock()
+        proxy._shell_session.run.side_effect = (
+            shell_session.ShellSessionError('busy'))
+        mock_job = MockJob(exit_status=0, stdout='FEEDACAB')
+        with mock.patch('acts.libs.proc.job.run', return_value=mock_job):
+            self.assertEqual(proxy.shell('getprop ro.serialno'), 'FEEDACAB')
+
+    @mock.patch.object(shell_session, 'SESSION_START_TIMEOUT', 0.1)
+    def test_shell_falls_back_when_session_does_not_start(self):
+        """Tests shell commands spawn adb if the session never answers."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SERIAL'
+        proxy._shell_session = shell_session.AdbShellSession(
+            ['sh', '-c', 'exec sleep 30', '--'])
+        mock_job = MockJob(exit_status=0, stdout='FEEDACAB')
+        with mock.patch('acts.libs.proc.job.run', return_value=mock_job):
+            self.assertEqual(proxy.shell('getprop ro.serialno'), 'FEEDACAB')
+            self.assertEqual(proxy.shell('getprop ro.serialno'), 'FEEDACAB')
+
+    def test_parse_getprop_output(self):
+        """Tests getprop output is parsed, including multi-line values."""
+        output = ('[ro.build.id]: [ABC1.123456.007]\n'
+                  '[ro.empty]: []\n'
+                  '[ro.multi.line]: [first\nsecond]\n'
+                  '[sys.boot_completed]: [1]')
+        self.assertEqual(
+            adb.parse_getprop_output(output), {
+                'ro.build.id': 'ABC1.123456.007',
+                'ro.empty': '',
+                'ro.multi.line': 'first\nsecond',
+                'sys.boot_completed': '1'
+            })
+
+    def test_getprops_reads_all_props_with_one_call(self):
+        """Tests getprops returns all requested props from one shell call."""
+        proxy = MockAdbProxy()
+        with mock.patch.object(
+                proxy, 'shell',
+                return_value='[a]: [1]\n[b]: [2]\n[c]: [3]') as shell:
+            props = proxy.getprops(['a', 'c', 'missing'])
+        shell.assert_called_once_with('getprop')
+        self.assertEqual(props, {'a': '1', 'c': '3', 'missing': ''})
+
+    def test_getprops_uses_cache(self):
+        """Tests cached lookups only read the props once."""
+        proxy = MockAdbProxy()
+        with mock.patch.object(
+                proxy, 'shell', return_value='[a]: [1]\n[b]: [2]') as shell:
+            proxy.getprops(['a'], use_cache=True)
+            props = proxy.getprops(['b'], use_cache=True)
+        self.assertEqual(shell.call_count, 1)
+        self.assertEqual(props, {'b': '2'})
+
+    def test_getprops_without_cache_always_reads(self):
+        """Tests uncached lookups neither use nor fill the cache."""
+        proxy = MockAdbProxy()
+        with mock.patch.object(proxy, 'shell', return_value='[a]: [1]') as shell:
+            proxy.getprops(['a'])
+            proxy.getprops(['a'])
+        self.assertEqual(shell.call_count, 2)
+        self.assertIsNone(proxy._prop_cache)
+
+    def test_prop_cache_invalidated_by_reboot_and_root(self):
+        """Tests adb commands that may change props drop the cache."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SERIAL'
+        for cmd in ('reboot', 'root', 'unroot'):
+            proxy._prop_cache = {'a': '1'}
+            with mock.patch('acts.libs.proc.job.run',
+                            return_value=MockJob()):
+                getattr(proxy, cmd)()
+            self.assertIsNone(proxy._prop_cache)
+
+    def test_prop_cache_kept_by_other_commands(self):
+        """Tests adb commands that do not change props keep the cache."""
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SERIAL'
+        proxy._prop_cache = {'a': '1'}
+        with mock.patch('acts.libs.proc.job.run', return_value=MockJob()):
+            proxy.wait_for_device()
+        self.assertEqual(proxy._prop_cache, {'a': '1'})
+
 
 if __name__ == "__main__":
     unittest.main()
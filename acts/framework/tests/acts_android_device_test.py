@@ -19,11 +19,15 @@ import mock
 import os
 import shutil
 import tempfile
+import threading
+import time
 import unittest
 
 from acts import logger
+from acts.controllers import adb
 from acts.controllers import android_device
 from acts.controllers.android_lib import errors
+from acts.controllers.android_lib import logcat
 
 # Mock log path for a test run.
 MOCK_LOG_PATH = "/tmp/logs/MockTest/xx-xx-xx_xx-xx-xx/"
@@ -110,17 +114,19 @@ class MockAdbProxy(object):
         elif params == "sys.boot_completed":
             return "1"
 
+    def getprops(self, params, use_cache=False):
+        return {param: self.getprop(param) for param in params}
+
+    def invalidate_prop_cache(self):
+        pass
+
     def devices(self):
         return "\t".join([str(self.serial), "device"])
 
-    def bugreport(self, params, timeout=android_device.BUG_REPORT_TIMEOUT):
-        expected = os.path.join(
-            logging.log_path, "AndroidDevice%s" % self.serial,
-            "AndroidDevice%s_%s.txt" %
-            (self.serial,
-             logger.normalize_log_line_timestamp(MOCK_ADB_LOGCAT_BEGIN_TIME)))
-        assert expected in params, "Expected '%s', got '%s'." % (expected,
-                                                                 params)
+    def stream(self, name, arg_str='', ignore_status=False,
+               timeout=android_device.BUG_REPORT_TIMEOUT):
+        assert name == 'bugreport', "Expected 'bugreport', got '%s'." % name
+        return iter([b'bugreport ', b'output'])
 
     def __getattr__(self, name):
         """All calls to the none-existent functions in adb proxy would
@@ -134,6 +140,19 @@ class MockAdbProxy(object):
         return adb_call
 
 
+class MockGetpropAdbProxy(adb.AdbProxy):
+    """An AdbProxy that only reads properties from a mocked shell.
+
+    All other adb commands are no-ops.
+    """
+
+    def __init__(self):
+        self.serial = MOCK_SERIAL
+
+    def _exec_adb_cmd(self, name, arg_str, **kwargs):
+        return ''
+
+
 class MockFastbootProxy():
     """Mock class that swaps out calls to adb with mock calls."""
 
@@ -242,6 +261,67 @@ class ActsAndroidDeviceTest(unittest.TestCase):
         ads[1].clean_up.assert_called_once_with()
         ads[2].clean_up.assert_called_once_with()
 
+    def test_start_services_on_ads_runs_concurrently(self):
+        """Makes sure services are started on all devices at the same time,
+        and that all devices finish starting before a failure is raised.
+        """
+        ads = get_mock_ads(3)
+        barrier = threading.Barrier(len(ads), timeout=5)
+        for ad in ads:
+            ad.start_services = mock.MagicMock(side_effect=barrier.wait)
+
+        def fail():
+            barrier.wait()
+            raise errors.AndroidDeviceError('failed')
+
+        ads[0].start_services.side_effect = fail
+        with self.assertRaisesRegex(errors.AndroidDeviceError, 'failed'):
+            android_device._start_services_on_ads(ads)
+        for ad in ads:
+            ad.start_services.assert_called_once_with()
+            ad.clean_up.assert_called_once_with()
+
+    def test_run_on_ads_bounds_concurrency(self):
+        """Makes sure no more than MAX_CONCURRENT_DEVICE_SETUPS calls run at
+        the same time, and that results keep the order of the devices.
+        """
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def func(ad):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(.01)
+            with lock:
+                running[0] -= 1
+            return ad.serial
+
+        ads = get_mock_ads(android_device.MAX_CONCURRENT_DEVICE_SETUPS * 2)
+        results = android_device._run_on_ads(func, ads)
+        self.assertEqual(results, [ad.serial for ad in ads])
+        self.assertLessEqual(max_running[0],
+                             android_device.MAX_CONCURRENT_DEVICE_SETUPS)
+
+    @mock.patch.object(android_device, 'destroy')
+    @mock.patch.object(android_device, 'AndroidDevice')
+    def test_get_instances_cleans_up_on_failure(self, mock_ad, mock_destroy):
+        """Makes sure the devices that were created are cleaned up if another
+        device cannot be created.
+        """
+        good_ad = mock.MagicMock()
+
+        def create(serial):
+            if serial == 'bad':
+                raise errors.AndroidDeviceError('failed')
+            return good_ad
+
+        mock_ad.side_effect = create
+        with self.assertRaisesRegex(errors.AndroidDeviceError, 'failed'):
+            android_device.get_instances(['good', 'bad'])
+        mock_destroy.assert_called_once_with([good_ad])
+
     # Tests for android_device.AndroidDevice class.
     # These tests mock out any interaction with the OS and real android device
     # in AndroidDeivce.
@@ -309,6 +389,50 @@ class ActsAndroidDeviceTest(unittest.TestCase):
         build_info = ad.build_info
         self.assertEqual(build_info["build_id"], MOCK_NYC_BUILD_ID)
 
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    def test_AndroidDevice_device_info_reads_props_once(self, MockFastboot):
+        """Verifies the build info and model are read from one snapshot of
+        the device properties, which is refreshed after a reboot.
+        """
+        proxy = MockGetpropAdbProxy()
+        proxy.shell = mock.Mock(return_value=(
+            '[ro.build.id]: [%s]\n'
+            '[ro.build.version.incremental]: [123456789]\n'
+            '[ro.build.type]: [userdebug]\n'
+            '[ro.build.product]: [FakeModel]\n'
+            '[ro.product.name]: [FakeModel]\n' % MOCK_RELEASE_BUILD_ID))
+        with mock.patch('acts.controllers.adb.AdbProxy',
+                        return_value=proxy):
+            ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        android_device.get_info([ad])
+        android_device.get_info([ad])
+        proxy.shell.assert_called_once_with('getprop')
+
+        proxy.reboot()
+        self.assertEqual(ad.model, "fakemodel")
+        self.assertEqual(proxy.shell.call_count, 2)
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    def test_AndroidDevice_record_setup_time(self, MockFastboot,
+                                             MockAdbProxy):
+        """Verifies the duration of setup phases is recorded, even if the
+        phase fails.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        self.assertIn('root', ad.setup_times)
+        with mock.patch('time.time', side_effect=[10, 12.5]):
+            with self.assertRaises(ValueError):
+                with ad.record_setup_time('logcat'):
+                    raise ValueError()
+        self.assertEqual(ad.setup_times['logcat'], 2.5)
+
     @mock.patch(
         'acts.controllers.adb.AdbProxy',
         return_value=MockAdbProxy(MOCK_SERIAL))
@@ -372,10 +496,15 @@ class ActsAndroidDeviceTest(unittest.TestCase):
         bugreport on builds that do not have bugreportz.
         """
         ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
-        mock_log_path.return_value = os.path.join(
-            logging.log_path, "AndroidDevice%s" % ad.serial)
+        mock_log_path.return_value = self.tmp_dir
         ad.take_bug_report("test_something", MOCK_ADB_EPOCH_BEGIN_TIME)
         create_dir_mock.assert_called_with(mock_log_path())
+        expected_path = os.path.join(
+            self.tmp_dir, "AndroidDevice%s_%s.txt" %
+            (ad.serial,
+             logger.normalize_log_line_timestamp(MOCK_ADB_LOGCAT_BEGIN_TIME)))
+        with open(expected_path, 'rb') as f:
+            self.assertEqual(f.read(), b'bugreport output')
 
     @mock.patch(
         'acts.controllers.adb.AdbProxy',
@@ -431,6 +560,122 @@ class ActsAndroidDeviceTest(unittest.TestCase):
         create_proc_mock.assert_called_with(
             ad.serial, log_dir, '-b radio')
 
+    def write_indexed_logcat(self, ad, seconds):
+        """Writes a logcat line for each second after the mock begin time to
+        the logcat writer of ad, and returns the writer.
+        """
+        writer = logcat.get_logcat_writer(ad.serial)
+        if writer is None:
+            writer = logcat.LogcatFileWriter(ad.serial, 'dir',
+                                             logcat.TimestampTracker())
+            logcat._writers[ad.serial] = writer
+            self.addCleanup(logcat._writers.pop, ad.serial)
+            self.addCleanup(writer.close)
+        with mock.patch('acts.context.get_current_context') as context:
+            context.return_value.get_full_output_path.return_value = (
+                self.tmp_dir)
+            for second in seconds:
+                timestamp = logger.epoch_to_log_line_timestamp(
+                    MOCK_ADB_EPOCH_BEGIN_TIME + second * 1000)
+                writer.write(('%s  1  2 I tag: event %d\n' %
+                              (timestamp, second)).encode())
+        return writer
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    @mock.patch('acts.libs.proc.job.run')
+    def test_AndroidDevice_search_logcat_uses_index(self, job_run,
+                                                    FastbootProxy,
+                                                    MockAdbProxy):
+        """Verifies search_logcat searches the indexed logcat file without
+        running grep, and finds the lines written between searches.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        self.write_indexed_logcat(ad, range(5))
+        begin_time = MOCK_ADB_EPOCH_BEGIN_TIME + 2000
+        with mock.patch.object(android_device.AndroidDevice,
+                               'device_log_path', self.tmp_dir):
+            first = ad.search_logcat('event [0-9]', begin_time)
+            self.write_indexed_logcat(ad, range(5, 7))
+            second = ad.search_logcat('event [0-9]', begin_time)
+
+        self.assertFalse(job_run.called)
+        self.assertEqual([r['log_message'][-7:] for r in first],
+                         ['event 2', 'event 3', 'event 4'])
+        self.assertEqual([r['log_message'][-7:] for r in second],
+                         ['event 2', 'event 3', 'event 4', 'event 5',
+                          'event 6'])
+        self.assertEqual(second[0]['time_stamp'],
+                         logger.epoch_to_log_line_timestamp(begin_time))
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    def test_AndroidDevice_subscribe_logcat(self, FastbootProxy,
+                                            MockAdbProxy):
+        """Verifies subscribe_logcat replays the lines since begin_time, then
+        receives the new lines matching the grep patterns.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        self.write_indexed_logcat(ad, range(3))
+        with mock.patch.object(android_device.AndroidDevice,
+                               'is_adb_logcat_on', True):
+            subscription = ad.subscribe_logcat(
+                ['event [13]', 'event \\(4\\)'],
+                MOCK_ADB_EPOCH_BEGIN_TIME + 1000)
+        self.write_indexed_logcat(ad, range(3, 5))
+
+        lines = [subscription.get(timeout=0) for _ in range(3)]
+        subscription.close()
+
+        self.assertEqual([line[-7:] for line in lines],
+                         ['event 1', 'event 3', 'event 4'])
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    def test_AndroidDevice_subscribe_logcat_requires_logcat(
+            self, FastbootProxy, MockAdbProxy):
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        with mock.patch.object(android_device.AndroidDevice,
+                               'is_adb_logcat_on', False):
+            with self.assertRaises(errors.AndroidDeviceError):
+                ad.subscribe_logcat(['event'])
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    def test_AndroidDevice_cat_adb_log_uses_index(self, FastbootProxy,
+                                                  MockAdbProxy):
+        """Verifies cat_adb_log writes the lines of the time range from the
+        indexed logcat file.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        ad.log_path = self.tmp_dir
+        self.write_indexed_logcat(ad, range(5))
+        with mock.patch.object(android_device.AndroidDevice,
+                               'device_log_path', self.tmp_dir):
+            path = ad.cat_adb_log('tag', MOCK_ADB_EPOCH_BEGIN_TIME + 1000,
+                                  MOCK_ADB_EPOCH_BEGIN_TIME + 3000)
+
+        with open(path) as f:
+            excerpt = f.read().splitlines()
+        self.assertEqual([line[-7:] for line in excerpt],
+                         ['event 1', 'event 2', 'event 3'])
+
     @mock.patch(
         'acts.controllers.adb.AdbProxy',
         return_value=MockAdbProxy(MOCK_SERIAL))
@@ -454,10 +699,14 @@ class ActsAndroidDeviceTest(unittest.TestCase):
             ad.stop_adb_logcat()
             self.assertRegex(log.output[0], expected_msg)
 
-        # Verify the underlying process is stopped.
+        # Verify the underlying process is stopped, and its writer closed.
         proc_mock.is_running.return_value = True
+        writer = mock.Mock()
+        logcat._writers[ad.serial] = writer
         ad.stop_adb_logcat()
         proc_mock.stop.assert_called_with()
+        writer.close.assert_called_once_with()
+        self.assertIsNone(logcat.get_logcat_writer(ad.serial))
 
     @mock.patch(
         'acts.controllers.adb.AdbProxy',
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import threading
+import time
+import unittest
+
+import mock
+
+from acts.controllers.fuchsia_lib import base_lib
+from acts.controllers.fuchsia_lib.bt import gatts_lib
+
+
+def make_lib(response):
+    session = mock.Mock()
+    session.get.return_value.json.side_effect = response
+    return base_lib.BaseLib('http://fuchsia', 0, 'client', session=session)
+
+
+class BaseLibTest(unittest.TestCase):
+    """Tests for acts.controllers.fuchsia_lib.base_lib.BaseLib."""
+
+    def test_send_command_uses_session(self):
+        lib = make_lib([{'id': 1, 'result': 'ok'}])
+
+        self.assertEqual(lib.send_command(1, 'cmd', {}), {
+            'id': 1,
+            'result': 'ok'
+        })
+        request = json.loads(lib.session.get.call_args[1]['data'])
+        self.assertEqual(request['method'], 'cmd')
+
+    def test_subclasses_share_session(self):
+        session = mock.Mock()
+
+        lib = gatts_lib.FuchsiaGattsLib('http://fuchsia', 0, 'client',
+                                        session)
+
+        self.assertIs(lib.session, session)
+
+    def test_send_batch_orders_results_by_id(self):
+        lib = make_lib([[{'id': 2, 'result': 'b'}, {'id': 1, 'result': 'a'}]])
+
+        results = lib.send_batch([(1, 'cmd_a', {}), (2, 'cmd_b', {})])
+
+        lib.session.get.assert_called_once()
+        self.assertEqual([r['result'] for r in results], ['a', 'b'])
+        request = json.loads(lib.session.get.call_args[1]['data'])
+        self.assertEqual([r['method'] for r in request], ['cmd_a', 'cmd_b'])
+
+    def test_send_batch_falls_back_to_single_commands(self):
+        lib = make_lib([{
+            'error': 'batches unsupported'
+        }, {
+            'id': 1,
+            'result': 'a'
+        }, {
+            'id': 2,
+            'result': 'b'
+        }])
+
+        results = lib.send_batch([(1, 'cmd_a', {}), (2, 'cmd_b', {})])
+
+        self.assertEqual([r['result'] for r in results], ['a', 'b'])
+        self.assertEqual(lib.session.get.call_count, 3)
+
+    def test_send_command_async(self):
+        lib = make_lib([{'id': 1, 'result': 'ok'}])
+
+        future = lib.send_command_async(1, 'cmd', {})
+
+        self.assertEqual(future.result(timeout=5)['result'], 'ok')
+
+    @mock.patch('acts.controllers.fuchsia_lib.base_lib._executor', None)
+    @mock.patch('acts.controllers.fuchsia_lib.base_lib.ThreadPoolExecutor')
+    def test_get_executor_creates_one_executor(self, executor_class):
+        # Slow down the creation, so that all threads race for it.
+        executor_class.side_effect = lambda **_: time.sleep(0.1) or object()
+        executors = []
+        threads = [
+            threading.Thread(
+                target=lambda: executors.append(base_lib._get_executor()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(executor_class.call_count, 1)
+        self.assertEqual(len(set(map(id, executors))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -119,6 +119,54 @@ class JobTestCases(unittest.TestCase):
         self.assertTrue('env' in kwargs)
         self.assertEqual(kwargs['env'], test_env)
 
+    @mock.patch(
+        'acts.libs.proc.job.subprocess.Popen',
+        return_value=FakePopen(stdout='TEST\n'))
+    def test_run_splits_command_without_shell_syntax(self, popen):
+        """Test that commands without shell syntax do not spawn a shell."""
+        job.run('adb -s SERIAL shell \'ls | grep "a b"\'')
+        args, kwargs = popen.call_args
+        self.assertEqual(args[0],
+                         ['adb', '-s', 'SERIAL', 'shell', 'ls | grep "a b"'])
+        self.assertFalse(kwargs['shell'])
+
+    @mock.patch(
+        'acts.libs.proc.job.subprocess.Popen',
+        return_value=FakePopen(stdout='TEST\n'))
+    def test_run_uses_shell_for_shell_syntax(self, popen):
+        """Test that commands using shell syntax are run by a shell."""
+        for command in ('echo TEST 1>&2', 'echo $HOME', 'ls *.py',
+                        'echo "$HOME"', 'A=1 printenv', 'echo \'a\'b"'):
+            job.run(command)
+            args, kwargs = popen.call_args
+            self.assertEqual(args[0], command)
+            self.assertTrue(kwargs['shell'])
+
+    def test_run_falls_back_to_shell_for_builtins(self):
+        """Test that shell builtins and unknown commands still run."""
+        self.assertEqual(job.run('exit 3', ignore_status=True).exit_status, 3)
+        self.assertEqual(
+            job.run('not_a_real_command', ignore_status=True).exit_status, 127)
+
+    def test_run_streaming_yields_output(self):
+        """Test that run_streaming yields stdout and keeps stderr."""
+        chunks = list(job.run_streaming(
+            [sys.executable, '-c', 'import sys; sys.stdout.write("a" * 10); '
+             'sys.stdout.flush(); sys.stderr.write("err")']))
+        self.assertEqual(b''.join(chunks), b'a' * 10)
+
+    def test_run_streaming_error(self):
+        """Test that run_streaming raises on non-zero exit statuses."""
+        with self.assertRaises(job.Error) as context:
+            list(job.run_streaming('echo TEST 1>&2; exit 2'))
+        self.assertEqual(context.exception.result.exit_status, 2)
+        self.assertEqual(context.exception.result.stderr, 'TEST')
+
+    def test_run_streaming_timeout(self):
+        """Test that run_streaming kills the command on timeout."""
+        with self.assertRaises(job.TimeoutError):
+            list(job.run_streaming(['sleep', '5'], timeout=0.1))
+
 
 if __name__ == '__main__':
     unittest.main()
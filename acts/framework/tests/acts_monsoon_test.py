@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import random
+import shutil
+import struct
+import tempfile
+import unittest
+
+import mock
+import numpy as np
+
+from acts.controllers import monsoon
+
+FINE_ZERO = 150
+COARSE_ZERO = -301
+FINE_REF = 4150
+COARSE_REF = 3699
+
+
+def make_packet(seq, packet_type, records):
+    """Builds the body of a Monsoon data packet, as returned by _ReadPacket.
+
+    Like the packets sent by the Monsoon, the body ends with an incomplete
+    record.
+    """
+    body = struct.pack('BBBB', 0x20 | (seq & 0xF), packet_type, 0, 0)
+    for main in records:
+        body += struct.pack('>hhhh', main, 0, 0, 0)
+    return bytearray(body + b'\x00\x00\x00')
+
+
+def make_proxy(packets):
+    """Creates a MonsoonProxy reading the given packets."""
+    proxy = monsoon.MonsoonProxy.__new__(monsoon.MonsoonProxy)
+    proxy._coarse_ref = proxy._fine_ref = proxy._coarse_zero = 0
+    proxy._fine_zero = proxy._coarse_scale = proxy._fine_scale = 0
+    proxy._last_seq = 0
+    proxy._ReadPacket = mock.Mock(side_effect=packets)
+    return proxy
+
+
+def calibration_packets():
+    return [
+        make_packet(0, 1, [FINE_ZERO, COARSE_ZERO]),
+        make_packet(1, 2, [FINE_REF, COARSE_REF])
+    ]
+
+
+def reference_calibrate(records):
+    """The per-sample calibration CollectData used before vectorizing."""
+    coarse_scale = 2.88 / (COARSE_REF - COARSE_ZERO)
+    fine_scale = 0.0332 / (FINE_REF - FINE_ZERO)
+    out = []
+    for main in records:
+        if main & 1:
+            out.append(((main & ~1) - COARSE_ZERO) * coarse_scale)
+        else:
+            out.append((main - FINE_ZERO) * fine_scale)
+    return out
+
+
+def reference_downsample(chunks, native_hz, sample_hz, sample_num):
+    """The list based downsampling take_samples used before NumPy."""
+    emitted = offset = 0
+    collected = []
+    current_values = []
+    chunks = iter(chunks)
+    while emitted < sample_num:
+        need = int((native_hz - offset + sample_hz - 1) / sample_hz)
+        if need > len(collected):
+            samples = next(chunks, [])
+            if not samples:
+                break
+            collected.extend(samples)
+        else:
+            offset += need * sample_hz
+            while offset >= native_hz:
+                current_values.append(sum(collected[:need]) / need)
+                offset -= native_hz
+                emitted += 1
+            collected = collected[need:]
+    return current_values
+
+
+class MonsoonProxyTest(unittest.TestCase):
+    """Tests for acts.controllers.monsoon.MonsoonProxy."""
+
+    def test_collect_data_matches_reference(self):
+        """Tests vectorized calibration matches the per-sample loop exactly.
+        """
+        rand = random.Random(0)
+        records = [rand.randint(-32768, 32767) for _ in range(200)]
+        proxy = make_proxy(
+            calibration_packets() + [make_packet(2, 0, records)])
+
+        self.assertEqual(proxy.CollectData(), reference_calibrate(records))
+
+    def test_collect_data_waits_for_calibration(self):
+        """Tests data packets received before calibration are dropped."""
+        proxy = make_proxy([make_packet(0, 0, [10, 11])] +
+                           calibration_packets() +
+                           [make_packet(2, 0, [20, 21])])
+
+        self.assertEqual(proxy.CollectData(), reference_calibrate([20, 21]))
+
+    def test_collect_data_array_returns_numpy_array(self):
+        proxy = make_proxy(calibration_packets() + [make_packet(2, 0, [20])])
+
+        samples = proxy.CollectDataArray()
+
+        self.assertIsInstance(samples, np.ndarray)
+        self.assertEqual(samples.dtype, np.float64)
+
+
+class MonsoonTakeSamplesTest(unittest.TestCase):
+    """Tests for acts.controllers.monsoon.Monsoon.take_samples."""
+
+    def take_samples(self, chunks, native_hz, sample_hz, sample_num):
+        mon = monsoon.Monsoon.__new__(monsoon.Monsoon)
+        mon.log = mock.Mock()
+        mon.mon = mock.Mock()
+        mon.mon.GetVoltage.return_value = 4.2
+        mon.mon.GetStatus.return_value = {'sampleRate': native_hz // 1000}
+        mon.mon.CollectDataArray.side_effect = (
+            [np.array(chunk) for chunk in chunks] + [np.array([])])
+        return mon.take_samples(sample_hz, sample_num)
+
+    def assert_matches_reference(self, native_hz, sample_hz, sample_num):
+        rand = random.Random(native_hz + sample_hz)
+        chunks = [[rand.uniform(0, 1) for _ in range(rand.randint(1, 40))]
+                  for _ in range(500)]
+        expected = reference_downsample(chunks, native_hz, sample_hz,
+                                        sample_num)
+        self.assertGreaterEqual(len(expected), sample_num)
+
+        data = self.take_samples(chunks, native_hz, sample_hz, sample_num)
+
+        self.assertEqual(data.data_points, expected)
+
+    def test_take_samples_matches_reference(self):
+        """Tests downsampling matches the list based implementation exactly.
+        """
+        self.assert_matches_reference(5000, 500, 20)
+
+    def test_take_samples_matches_reference_uneven_rate(self):
+        self.assert_matches_reference(5000, 700, 20)
+
+    def test_take_samples_matches_reference_upsampling(self):
+        self.assert_matches_reference(1000, 3000, 200)
+
+
+class SampleBufferTest(unittest.TestCase):
+    """Tests for acts.controllers.monsoon._SampleBuffer."""
+
+    def test_fifo_order_across_compaction_and_growth(self):
+        buf = monsoon._SampleBuffer(capacity=4)
+        expected = []
+        value = 0
+        for chunk_size, consume in [(3, 2), (3, 1), (5, 6), (2, 0), (9, 4)]:
+            chunk = np.arange(value, value + chunk_size, dtype=float)
+            value += chunk_size
+            buf.extend(chunk)
+            expected.extend(chunk.tolist())
+            self.assertEqual(buf.peek(len(buf)).tolist(), expected)
+            buf.consume(consume)
+            expected = expected[consume:]
+        self.assertEqual(len(buf), len(expected))
+
+
+class MonsoonDataTest(unittest.TestCase):
+    """Tests for acts.controllers.monsoon.MonsoonData."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # Exactly representable as float32, so both formats hold equal values.
+        currents = [0.25, 0.5, 0.125, 0.75, 1.0, 0.0625, 0.5]
+        timestamps = [1000, 1000, 1001, 1001, 1002, 1002, 1003]
+        self.data = monsoon.MonsoonData(
+            currents, timestamps, 500, 4.2, offset=2)
+        self.data.tag = 'test_tag'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_binary_file_round_trip(self):
+        path = os.path.join(self.tmp_dir, 'data.bin')
+        monsoon.MonsoonData.save_to_binary_file([self.data], path)
+
+        loaded, = monsoon.MonsoonData.from_binary_file(path)
+
+        self.assertIsInstance(loaded.data_points, np.ndarray)
+        self.assertEqual(loaded.data_points.tolist(), self.data.data_points)
+        self.assertEqual(loaded.timestamps.tolist(), self.data.timestamps)
+        self.assertEqual(loaded.offset, 2)
+        self.assertEqual(loaded.hz, 500)
+        self.assertEqual(loaded.voltage, 4.2)
+        self.assertEqual(loaded.tag, 'test_tag')
+        self.assertEqual(loaded.average_current, self.data.average_current)
+        self.assertEqual(loaded.total_charge, self.data.total_charge)
+        self.assertEqual(loaded.total_power, self.data.total_power)
+
+    def test_binary_file_appends_records(self):
+        """Tests several saves to one file are all loaded, as with text."""
+        path = os.path.join(self.tmp_dir, 'data.bin')
+        other = monsoon.MonsoonData([0.5] * 3, [7, 8, 9], 1000, 3.8)
+        monsoon.MonsoonData.save_to_binary_file([self.data], path)
+        monsoon.MonsoonData.save_to_binary_file([other], path)
+
+        loaded = monsoon.MonsoonData.from_binary_file(path)
+
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded[1].data_points.tolist(), [0.5] * 3)
+        self.assertEqual(loaded[1].timestamps.tolist(), [7, 8, 9])
+        self.assertIsNone(loaded[1].tag)
+
+    def test_from_binary_file_bad_magic(self):
+        path = os.path.join(self.tmp_dir, 'data.txt')
+        monsoon.MonsoonData.save_to_text_file([self.data], path)
+
+        with self.assertRaises(monsoon.MonsoonError):
+            monsoon.MonsoonData.from_binary_file(path)
+
+    def test_from_file_detects_format(self):
+        text_path = os.path.join(self.tmp_dir, 'data.txt')
+        binary_path = os.path.join(self.tmp_dir, 'data.bin')
+        monsoon.MonsoonData.save_to_text_file([self.data], text_path)
+        monsoon.MonsoonData.save_to_binary_file([self.data], binary_path)
+
+        from_text, = monsoon.MonsoonData.from_file(text_path)
+        from_binary, = monsoon.MonsoonData.from_file(binary_path)
+
+        self.assertIsInstance(from_text.data_points, list)
+        self.assertIsInstance(from_binary.data_points, np.ndarray)
+        self.assertEqual(from_text.average_current,
+                         from_binary.average_current)
+
+    def test_get_average_record_array_matches_list(self):
+        path = os.path.join(self.tmp_dir, 'data.bin')
+        monsoon.MonsoonData.save_to_binary_file([self.data], path)
+        loaded, = monsoon.MonsoonData.from_binary_file(path)
+
+        for n in (1, 2, 3, 10):
+            self.assertEqual(
+                loaded.get_average_record(n).tolist(),
+                self.data.get_average_record(n))
+
+
+if __name__ == '__main__':
+    unittest.main()
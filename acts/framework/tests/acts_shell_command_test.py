@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import mock
+
+from acts.controllers.ap_lib import hostapd
+from acts.controllers.utils_lib.commands import shell
+from acts.libs.proc import job
+
+
+class LocalRunner(object):
+    """Runs the commands of a ShellCommand with the local shell."""
+
+    def __init__(self):
+        self.commands = []
+
+    def run_streaming(self, command, timeout=60):
+        self.commands.append(command)
+        return job.run_streaming(['sh', '-c', command], timeout=timeout)
+
+
+class RecordingRunner(object):
+    """Records the commands of a ShellCommand without running them."""
+
+    def __init__(self):
+        self.commands = []
+
+    def run_streaming(self, command, timeout=60):
+        self.commands.append(command)
+        return (data for data in [])
+
+
+class ShellCommandTest(unittest.TestCase):
+    """Tests for acts.controllers.utils_lib.commands.shell.ShellCommand."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.runner = LocalRunner()
+        self.shell = shell.ShellCommand(self.runner, self.tmp_dir)
+        with open(os.path.join(self.tmp_dir, 'log'), 'w') as f:
+            f.write('starting\nInterface failed\nSetup done\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_watch_file_returns_first_matching_pattern(self):
+        found = self.shell.watch_file('log', ['Setup done', 'failed$'])
+
+        self.assertEqual(found, 'failed$')
+        self.assertEqual(len(self.runner.commands), 1)
+
+    def test_watch_file_returns_none_when_program_exits(self):
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+
+        found = self.shell.watch_file('log', ['never'], pid=proc.pid)
+
+        self.assertIsNone(found)
+
+    def test_watch_file_times_out(self):
+        with self.assertRaises(job.TimeoutError):
+            self.shell.watch_file('log', ['never'], timeout=1)
+
+    def test_watch_file_command_ends_after_timeout(self):
+        runner = RecordingRunner()
+        shell.ShellCommand(runner, self.tmp_dir).watch_file(
+            'log', ['never'], timeout=1)
+
+        # Nothing stops the command from this side, as with an ssh session.
+        subprocess.run(['sh', '-c', runner.commands[0]],
+                       stdout=subprocess.DEVNULL, timeout=10)
+
+    def test_watch_file_quotes_file_name(self):
+        runner = RecordingRunner()
+        shell.ShellCommand(runner).watch_file('my log; rm -rf /', ['never'])
+
+        self.assertIn("'my log; rm -rf /'", runner.commands[0])
+
+
+class HostapdTest(unittest.TestCase):
+    """Tests for acts.controllers.ap_lib.hostapd.Hostapd."""
+
+    def setUp(self):
+        self.hostapd = hostapd.Hostapd(mock.Mock(), 'wlan0')
+        self.hostapd._shell = mock.Mock()
+
+    def test_wait_for_interface_success(self):
+        self.hostapd._shell.watch_file.return_value = 'Setup of interface done'
+
+        self.hostapd._wait_for_interface(1234)
+
+        self.assertEqual(
+            self.hostapd._shell.watch_file.call_args[1]['pid'], 1234)
+
+    def test_wait_for_interface_error_logged(self):
+        self.hostapd._shell.watch_file.return_value = (
+            'Interface initialization failed')
+
+        with self.assertRaisesRegex(hostapd.Error, 'Interface failed'):
+            self.hostapd._wait_for_interface(1234)
+
+    def test_wait_for_interface_hostapd_exited(self):
+        self.hostapd._shell.watch_file.return_value = None
+
+        with self.assertRaisesRegex(hostapd.Error, 'Hostapd failed'):
+            self.hostapd._wait_for_interface(1234)
+
+
+if __name__ == '__main__':
+    unittest.main()
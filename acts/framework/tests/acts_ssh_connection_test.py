@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from acts.controllers.utils_lib.ssh import connection
+from acts.controllers.utils_lib.ssh import settings
+from acts.libs.proc import job
+
+
+def run_locally(command, **kwargs):
+    """Runs a remote command with the local shell, in place of ssh."""
+    return job.run(['sh', '-c', command], ignore_status=True)
+
+
+class SshConnectionTest(unittest.TestCase):
+    """Tests for acts.controllers.utils_lib.ssh.connection.SshConnection."""
+
+    def setUp(self):
+        self.conn = connection.SshConnection(
+            settings.SshSettings('host', 'user', port=2222))
+        self.conn.setup_master_ssh = mock.Mock()
+
+    def tearDown(self):
+        # Keeps close() from cleaning up the fake master connection.
+        self.conn._master_ssh_proc = None
+        self.conn._master_ssh_tempdir = None
+
+    @mock.patch('acts.libs.proc.job.run')
+    def test_send_files_uses_one_scp_command(self, run):
+        self.conn.send_files(['/a', '/b c'], '/remote')
+
+        run.assert_called_once()
+        command = run.call_args[0][0]
+        self.assertEqual(command[0], 'scp')
+        self.assertIn('2222', command)
+        self.assertEqual(command[-3:], ['/a', '/b c', 'user@host:/remote'])
+
+    @mock.patch('acts.libs.proc.job.run')
+    def test_pull_files_uses_one_scp_command(self, run):
+        self.conn.pull_files('/local', ['/a', '/b'])
+
+        run.assert_called_once()
+        self.assertEqual(run.call_args[0][0][-3:],
+                         ['user@host:/a', 'user@host:/b', '/local'])
+
+    @mock.patch('acts.libs.proc.job.run')
+    def test_send_file_reuses_master_connection(self, run):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.conn._master_ssh_proc = mock.Mock()
+        self.conn._master_ssh_tempdir = tempdir
+
+        self.conn.send_file('/a', '/remote')
+
+        self.assertIn('ControlPath=%s/socket' % tempdir, run.call_args[0][0])
+
+    @mock.patch('acts.libs.proc.job.run')
+    def test_send_file_without_master_connection(self, run):
+        self.conn.setup_master_ssh.side_effect = connection.Error()
+
+        self.conn.send_file('/a', '/remote')
+
+        self.assertFalse(
+            any('ControlPath' in arg for arg in run.call_args[0][0]))
+
+    @mock.patch('time.sleep')
+    def test_find_free_port_finds_ports_in_batches(self, _):
+        ports = list(range(5000, 5000 + connection.FREE_PORT_BATCH_SIZE))
+        self.conn.run = mock.Mock(return_value=mock.Mock(
+            stdout=' '.join(str(port) for port in ports)))
+
+        found = [
+            self.conn.find_free_port()
+            for _ in range(connection.FREE_PORT_BATCH_SIZE)
+        ]
+
+        self.conn.run.assert_called_once()
+        self.assertEqual(sorted(found), ports)
+
+        self.conn.find_free_port()
+
+        self.assertEqual(self.conn.run.call_count, 2)
+
+    @mock.patch('time.sleep')
+    def test_find_free_port_refreshes_stale_ports(self, _):
+        self.conn.run = mock.Mock(return_value=mock.Mock(stdout='5000 5001'))
+
+        with mock.patch('time.time', return_value=0):
+            self.conn.find_free_port()
+        with mock.patch(
+                'time.time',
+                return_value=connection.FREE_PORT_POOL_TIMEOUT + 1):
+            self.conn.find_free_port()
+
+        self.assertEqual(self.conn.run.call_count, 2)
+
+    def test_run_batch_splits_results(self):
+        self.conn.run = mock.Mock(side_effect=run_locally)
+
+        results = self.conn.run_batch(
+            ['echo out; echo err >&2', 'printf partial', 'exit 3'],
+            ignore_status=True)
+
+        self.conn.run.assert_called_once()
+        self.assertEqual([r.exit_status for r in results], [0, 0, 3])
+        self.assertEqual(results[0]._raw_stdout, b'out\n')
+        self.assertEqual(results[0]._raw_stderr, b'err\n')
+        self.assertEqual(results[1]._raw_stdout, b'partial')
+        self.assertEqual(results[2].command, 'exit 3')
+
+    def test_run_batch_stops_at_failure(self):
+        self.conn.run = mock.Mock(side_effect=run_locally)
+
+        with self.assertRaises(job.Error) as context:
+            self.conn.run_batch(['true', 'echo bad >&2; false', 'echo never'])
+
+        result = context.exception.result
+        self.assertEqual(result.command, 'echo bad >&2; false')
+        self.assertEqual(result.stderr, 'bad')
+        self.assertEqual(self.conn.run.call_args[1]['ignore_status'], True)
+
+    def test_run_batch_commands_do_not_share_state(self):
+        self.conn.run = mock.Mock(side_effect=run_locally)
+
+        results = self.conn.run_batch(['X=1; export Y=2', 'echo "$X$Y"'])
+
+        self.assertEqual(results[1].stdout, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@
 #   limitations under the License.
 
 import mock
+import os
 import shutil
 import tempfile
 import unittest
@@ -41,6 +42,7 @@ class ActsTestRunnerTest(unittest.TestCase):
             "logpath": self.tmp_dir,
             "cli_args": None,
             "testpaths": ["./"],
+            "test_class_index_path": os.path.join(self.tmp_dir, 'index.json'),
             "icecream": 42,
             "extra_param": "haha"
         }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from acts.test_utils.wifi import wifi_power_plot_utils as plot_utils
+
+
+class DecimateEnvelopeTest(unittest.TestCase):
+    """Tests for wifi_power_plot_utils.decimate_envelope."""
+
+    def test_short_data_is_kept(self):
+        data = np.array([3, 1, 2])
+
+        indices, sums, counts = plot_utils.decimate_envelope(data, 3)
+
+        np.testing.assert_array_equal(indices, [0, 1, 2])
+        np.testing.assert_array_equal(sums, [3, 1, 2])
+        np.testing.assert_array_equal(counts, [1, 1, 1])
+
+    def test_keeps_minimum_and_maximum_in_order(self):
+        data = np.array([5, 9, 1, 4, 0, 7, 2, 8, 3, 6])
+
+        indices, sums, counts = plot_utils.decimate_envelope(data, 4)
+
+        # Buckets of 5 samples: [5, 9, 1, 4, 0] and [7, 2, 8, 3, 6].
+        np.testing.assert_array_equal(indices, [1, 4, 6, 7])
+        np.testing.assert_array_equal(sums, [19, 0, 26, 0])
+        np.testing.assert_array_equal(counts, [5, 0, 5, 0])
+
+    def test_ragged_last_bucket(self):
+        data = np.array([4, 2, 6, 1, 9, 3, 8])
+
+        indices, sums, counts = plot_utils.decimate_envelope(data, 4)
+
+        # Buckets of 4 samples: [4, 2, 6, 1] and [9, 3, 8].
+        np.testing.assert_array_equal(indices, [2, 3, 4, 5])
+        np.testing.assert_array_equal(sums, [13, 0, 20, 0])
+        np.testing.assert_array_equal(counts, [4, 0, 3, 0])
+
+    def test_average_matches_data(self):
+        data = np.random.RandomState(0).randint(0, 1000, size=1001)
+
+        indices, sums, counts = plot_utils.decimate_envelope(data, 100)
+
+        self.assertLessEqual(len(indices), 100)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertEqual(counts.sum(), len(data))
+        self.assertAlmostEqual(sums.sum() / counts.sum(), data.mean())
+
+    def test_too_few_points(self):
+        with self.assertRaises(ValueError):
+            plot_utils.decimate_envelope(np.arange(10), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Compares the audio analysis functions against their loop based versions.
+
+Usage:
+    python3 audio_analysis_benchmark.py
+
+For each fixture of the audio unit tests, checks that both versions give the
+same outputs, and prints how long each of them takes.
+"""
+
+import math
+import timeit
+
+import numpy
+
+import acts.test_utils.audio_analysis_lib.audio_analysis as audio_analysis
+import acts.test_utils.audio_analysis_lib.audio_quality_measurement as \
+    audio_quality_measurement
+
+
+def loop_peak_detection(array, window_size):
+    """The loop based audio_analysis.peak_detection, for reference."""
+    half_window_size = window_size / 2
+    length = len(array)
+
+    def mid_is_peak(array, mid, left, right):
+        """Checks if value at mid is the largest among left to right in array.
+
+        Args:
+            array: A list of numbers.
+            mid: The mid index.
+            left: The left index.
+            rigth: The right index.
+
+        Returns:
+            A tuple (is_peak, next_candidate)
+                  is_peak is True if array[index] is the maximum among numbers
+                  in array between index [left, right] inclusively.
+                  next_candidate is the index of next candidate for peak if
+                  is_peak is False. It is the index of maximum value in
+                  [mid + 1, right]. If is_peak is True, next_candidate is
+                  right + 1.
+
+        """
+        value_mid = array[int(mid)]
+        is_peak = True
+        next_peak_candidate_index = None
+
+        # Check the left half window.
+        for index in range(int(left), int(mid)):
+            if array[index] >= value_mid:
+                is_peak = False
+                break
+
+        # Mid is at the end of array.
+        if mid == right:
+            return is_peak, right + 1
+
+        # Check the right half window and also record next candidate.
+        # Favor the larger index for next_peak_candidate_index.
+        for index in range(int(right), int(mid), -1):
+            if (next_peak_candidate_index is None or
+                    array[index] > array[next_peak_candidate_index]):
+                next_peak_candidate_index = index
+
+        if array[next_peak_candidate_index] >= value_mid:
+            is_peak = False
+
+        if is_peak:
+            next_peak_candidate_index = right + 1
+
+        return is_peak, next_peak_candidate_index
+
+    results = []
+    mid = 0
+    next_candidate_idx = None
+    while mid < length:
+        left = max(0, mid - half_window_size)
+        right = min(length - 1, mid + half_window_size)
+
+        # Only consider value greater than 0.
+        if array[int(mid)] == 0:
+            mid = mid + 1
+            continue
+
+        is_peak, next_candidate_idx = mid_is_peak(array, mid, left, right)
+
+        if is_peak:
+            results.append((mid, array[int(mid)]))
+
+        # Use the next candidate found in [mid + 1, right], or right + 1.
+        mid = next_candidate_idx
+
+    # Sort the peaks by values.
+    return sorted(results, key=lambda x: x[1], reverse=True)
+
+
+def loop_find_block_average_value(arr, side_block_size, block_size):
+    """The loop based find_block_average_value, for reference."""
+    length = len(arr)
+    left_border, right_border = 0, 1
+    left_block_sum = arr[0]
+    right_block_sum = arr[0]
+    left_average_array = numpy.zeros(length)
+    right_average_array = numpy.zeros(length)
+    block_average_array = numpy.zeros(length)
+    for index in range(0, length):
+        while left_border < index - side_block_size:
+            left_block_sum -= arr[left_border]
+            left_border += 1
+        while right_border < min(length, index + side_block_size):
+            right_block_sum += arr[right_border]
+            right_border += 1
+
+        left_average_value = float(left_block_sum) / (index - left_border + 1)
+        right_average_value = float(right_block_sum) / (right_border - index)
+        left_average_array[index] = left_average_value
+        right_average_array[index] = right_average_value
+
+        if index + 1 < length:
+            left_block_sum += arr[index + 1]
+        right_block_sum -= arr[index]
+    left_border, right_border = 0, 1
+    block_sum = 0
+    for index in range(0, length):
+        while left_border < index - block_size / 2:
+            block_sum -= arr[left_border]
+            left_border += 1
+        while right_border < min(length, index + block_size / 2):
+            block_sum += arr[right_border]
+            right_border += 1
+
+        average_value = float(block_sum) / (right_border - left_border)
+        block_average_array[index] = average_value
+    return (left_average_array, right_average_array, block_average_array)
+
+
+def sine_wave_amplitude(length_in_secs, rate=48000, freq=440):
+    """Returns the amplitude quality_measurement computes for a sine wave.
+
+    This is the signal of audio_quality_measurement_unittest.
+    """
+    y = [
+        math.sin(2.0 * math.pi * freq * float(index) / float(rate))
+        for index in range(int(length_in_secs * rate))
+    ]
+    block_size = int(audio_quality_measurement.DEFAULT_BLOCK_SIZE_SECS * rate)
+    amplitude, _ = audio_quality_measurement.hilbert_analysis(
+        numpy.array(y), rate, block_size)
+    return amplitude, block_size
+
+
+def peak_detection_fixtures():
+    """Returns the (name, args) of the peak detection fixtures."""
+    numpy.random.seed(0)
+    return [
+        ('small', ([0, 1, 2, 3, 4, 3, 2, 1, 0, 1, 2, 3, 5, 3, 2, 1, 1, 1, 1,
+                    1], 4)),
+        ('1M uniform', (numpy.random.uniform(0, 1, 1000000), 100)),
+    ]
+
+
+def block_average_fixtures():
+    """Returns the (name, args) of the block average fixtures."""
+    fixtures = []
+    for length_in_secs in (2, 60):
+        amplitude, block_size = sine_wave_amplitude(length_in_secs)
+        fixtures.append(('%ss sine' % length_in_secs,
+                         (amplitude, block_size * 2, block_size)))
+    return fixtures
+
+
+def same_peaks(expected, actual):
+    return expected == actual
+
+
+def same_block_averages(expected, actual):
+    return all(numpy.allclose(e, a) for e, a in zip(expected, actual))
+
+
+def compare(name, reference, function, fixtures, same, number=3):
+    """Checks the outputs of function and prints the time it takes.
+
+    Args:
+        name: The name of the compared function.
+        reference: The loop based version of the function.
+        function: The function to compare against reference.
+        fixtures: A list of (fixture_name, args) to call both functions with.
+        same: A function checking that two outputs are the same.
+        number: The number of times to call each function with each fixture.
+
+    Returns:
+        True if both functions gave the same outputs for all fixtures.
+    """
+    all_same = True
+    for fixture_name, args in fixtures:
+        is_same = same(reference(*args), function(*args))
+        all_same = all_same and is_same
+        reference_time = timeit.timeit(lambda: reference(*args),
+                                       number=number) / number
+        function_time = timeit.timeit(lambda: function(*args),
+                                      number=number) / number
+        print('%-26s %-12s loop: %9.4fs  numpy: %9.4fs  x%-8.1f %s' %
+              (name, fixture_name, reference_time, function_time,
+               reference_time / max(function_time, 1e-9),
+               'same' if is_same else 'DIFFERENT'))
+    return all_same
+
+
+def main():
+    results = [
+        compare('peak_detection', loop_peak_detection,
+                audio_analysis.peak_detection, peak_detection_fixtures(),
+                same_peaks),
+        compare('find_block_average_value', loop_find_block_average_value,
+                audio_quality_measurement.find_block_average_value,
+                block_average_fixtures(), same_block_averages, number=1),
+    ]
+    if not all(results):
+        raise SystemExit('Some outputs differ from the loop based versions.')
+
+
+if __name__ == '__main__':
+    main()
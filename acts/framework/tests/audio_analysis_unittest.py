@@ -15,6 +15,7 @@
 #   limitations under the License.
 
 import logging
+import mock
 import numpy
 import os
 import unittest
@@ -99,6 +100,18 @@ class SpectralAnalysisTest(unittest.TestCase):
         logging.debug('Compare the result')
         self.assertEqual(dummy_answer, improved_answer)
 
+    def testPeakDetectionOddWindow(self):
+        array = [1, 3, 2, 0, 2, 4, 1]
+        result = audio_analysis.peak_detection(array, 3)
+        golden_answer = [(5, 4), (1, 3)]
+        self.assertEqual(result, golden_answer)
+
+    def testPeakDetectionEqualValues(self):
+        array = [0, 2, 2, 0, 0, 0, 1, 0]
+        result = audio_analysis.peak_detection(array, 2)
+        golden_answer = [(6, 1)]
+        self.assertEqual(result, golden_answer)
+
     def testSpectralAnalysis(self):
         rate = 48000
         length_in_secs = 0.5
@@ -157,6 +170,26 @@ class SpectralAnalysisTest(unittest.TestCase):
         with self.assertRaises(audio_analysis.EmptyDataError):
             results = audio_analysis.spectral_analysis([], 100)
 
+    def testSpectralAnalysisChunks(self):
+        rate = 48000
+        x = numpy.arange(rate) / float(rate)
+        y = (numpy.sin(490 * 2.0 * numpy.pi * x) +
+             0.3 * numpy.sin(60 * 2.0 * numpy.pi * x))
+        chunks = [y[start:start + 8192] for start in range(0, rate, 8192)]
+        results = audio_analysis.spectral_analysis_chunks(chunks, rate)
+        # The frequency resolution is 48000 / 8192 Hz.
+        self.assertTrue(abs(results[0][0] - 490) < 6)
+        self.assertTrue(abs(results[1][0] - 60) < 6)
+
+    def testSpectralAnalysisChunksNotMeaningfulData(self):
+        chunks = [numpy.zeros(100), numpy.zeros(50)]
+        results = audio_analysis.spectral_analysis_chunks(chunks, 48000)
+        self.assertEqual([(0, 0)], results)
+
+    def testSpectralAnalysisChunksEmptyData(self):
+        with self.assertRaises(audio_analysis.EmptyDataError):
+            audio_analysis.spectral_analysis_chunks([], 48000)
+
 
 class NormalizeTest(unittest.TestCase):
     def testNormalize(self):
@@ -351,6 +384,115 @@ class AnomalyTest(unittest.TestCase):
             self.check_anomaly()
 
 
+
+class AnomalyDetectorTest(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(0)
+        self.rate = 48000
+        x = numpy.arange(self.rate // 4) / float(self.rate)
+        self.y = (numpy.sin(1000 * 2.0 * numpy.pi * x) +
+                  numpy.random.standard_normal(len(x)) * 0.01)
+        self.y[3000:3500] = 0
+        self.y[7001:7100] = 0.9
+
+    def testChunksFindSameAnomalies(self):
+        expected = audio_analysis.anomaly_detection(self.y, self.rate, 1000)
+        self.assertTrue(expected)
+        for chunk_size in [1, 59, 60, 61, 1000]:
+            detector = audio_analysis.AnomalyDetector(self.rate, 1000)
+            for start in range(0, len(self.y), chunk_size):
+                detector.feed(self.y[start:start + chunk_size])
+            self.assertEqual(detector.finish(), expected)
+
+    def testEmptyData(self):
+        detector = audio_analysis.AnomalyDetector(self.rate, 1000)
+        detector.feed([])
+        with self.assertRaises(audio_analysis.EmptyDataError):
+            detector.finish()
+
+
+class MovingPatternMatchingTest(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(0)
+        self.golden = audio_analysis._generate_golden_pattern(48000, 440, 120)
+
+    def max_correlation_index(self, test_signal):
+        """Computes the best correlation index one block at a time."""
+        block_length = len(test_signal)
+        return max(
+            audio_analysis._get_correlation_index(
+                self.golden[start:start + block_length], test_signal)
+            for start in range(len(self.golden) - block_length + 1))
+
+    def testMatchesPerBlockCorrelation(self):
+        """Checks the threshold is applied to the per block correlation."""
+        for _ in range(20):
+            test_signal = numpy.random.standard_normal(120)
+            max_corr = self.max_correlation_index(test_signal)
+            self.assertTrue(
+                audio_analysis._moving_pattern_matching(
+                    self.golden, test_signal, max_corr - 1e-9))
+            self.assertFalse(
+                audio_analysis._moving_pattern_matching(
+                    self.golden, test_signal, max_corr + 1e-9))
+
+    def testTestSignalNormTooSmall(self):
+        self.assertFalse(
+            audio_analysis._moving_pattern_matching(
+                self.golden, numpy.zeros(120), 0.0))
+
+    def testTestSignalLongerThanGolden(self):
+        with self.assertRaises(ValueError):
+            audio_analysis._moving_pattern_matching(
+                self.golden, numpy.ones(len(self.golden) + 1), 0.5)
+
+
+class THDNTest(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(0)
+        self.rate = 48000
+        x = numpy.arange(self.rate) / float(self.rate)
+        self.y = (numpy.sin(1000 * 2.0 * numpy.pi * x) + 0.3 +
+                  numpy.random.standard_normal(self.rate) * 0.01)
+
+    def window_THDN(self, step_size, window_size, freq):
+        """Computes the THD+N of each window one window at a time."""
+        return [
+            audio_analysis.THDN(self.y[start:start + window_size], self.rate,
+                                1, freq)
+            for start in range(0, len(self.y) - window_size, step_size)
+        ]
+
+    def testTHDNDoesNotModifySignal(self):
+        y = self.y.copy()
+        audio_analysis.THDN(self.y, self.rate, 1, None)
+        numpy.testing.assert_array_equal(self.y, y)
+
+    def testTHDNSeries(self):
+        for freq in [None, 1000]:
+            series = audio_analysis.THDN_series(self.y, self.rate, 1000, 4800,
+                                                1, freq)
+            numpy.testing.assert_allclose(series,
+                                          self.window_THDN(1000, 4800, freq))
+
+    def testTHDNSeriesInProcesses(self):
+        with mock.patch.object(audio_analysis, 'THDN_BATCH_SAMPLES', 9600):
+            series = audio_analysis.THDN_series(self.y, self.rate, 1000, 4800,
+                                                1, None, processes=2)
+        numpy.testing.assert_allclose(series,
+                                      self.window_THDN(1000, 4800, None))
+
+    def testMaxTHDN(self):
+        result = audio_analysis.max_THDN(self.y, self.rate, 1000, 4800, 1,
+                                         None)
+        self.assertEqual(result, max(self.window_THDN(1000, 4800, None)))
+
+    def testMaxTHDNWithoutWindows(self):
+        result = audio_analysis.max_THDN(self.y[:4800], self.rate, 1000, 4800,
+                                         1, None)
+        self.assertEqual(result, 0)
+
+
 if __name__ == '__main__':
     logging.basicConfig(
         level=logging.DEBUG,
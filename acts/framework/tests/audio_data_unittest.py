@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+
+import acts.test_utils.audio_analysis_lib.audio_data as audio_data
+import acts.test_utils.audio_analysis_lib.check_quality as check_quality
+
+
+class AudioRawDataTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # Three frames of two channels.
+        self.samples = numpy.array([[1, -1], [2, -2], [3, -3]], dtype='<i2')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, header=b''):
+        """Writes the samples after a header into a file."""
+        filename = os.path.join(self.tmp_dir, 'audio.raw')
+        with open(filename, 'wb') as f:
+            f.write(header + self.samples.tobytes())
+        return filename
+
+    def testReadBinary(self):
+        data = audio_data.AudioRawData(self.samples.tobytes(), 2, 'S16_LE')
+        numpy.testing.assert_array_equal(data.channel_data[0], [1, 2, 3])
+        numpy.testing.assert_array_equal(data.channel_data[1], [-1, -2, -3])
+
+    def testReadBinaryDoesNotCopy(self):
+        binary = bytearray(self.samples.tobytes())
+        data = audio_data.AudioRawData(binary, 2, 'S16_LE')
+        binary[0] = 5
+        self.assertEqual(data.channel_data[0][0], 5)
+
+    def testReadFile(self):
+        data = audio_data.AudioRawData(None, 2, 'S16_LE')
+        data.read_file(self.write_file(header=b'head'), offset=4)
+        numpy.testing.assert_array_equal(data.channel_data, self.samples.T)
+
+    def testReadFileFrames(self):
+        data = audio_data.AudioRawData(None, 2, 'S16_LE')
+        data.read_file(self.write_file(), n_frames=2)
+        numpy.testing.assert_array_equal(data.channel_data[1], [-1, -2])
+
+    def testReadTruncatedFile(self):
+        data = audio_data.AudioRawData(None, 2, 'S16_LE')
+        data.read_file(self.write_file(), n_frames=10)
+        numpy.testing.assert_array_equal(data.channel_data[0], [1, 2, 3])
+
+    def testReadEmptyFile(self):
+        self.samples = self.samples[:0]
+        data = audio_data.AudioRawData(None, 2, 'S16_LE')
+        data.read_file(self.write_file())
+        self.assertEqual(len(data.channel_data[0]), 0)
+
+    def testChannelChunks(self):
+        data = audio_data.AudioRawData(self.samples.tobytes(), 2, 'S16_LE')
+        chunks = [list(chunk) for chunk in data.channel_chunks(1, 2)]
+        self.assertEqual(chunks, [[-1, -2], [-3]])
+
+
+class WaveFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def testReadWaveFile(self):
+        samples = numpy.arange(-100, 100, dtype='<i2').reshape(100, 2)
+        filename = os.path.join(self.tmp_dir, 'audio.wav')
+        wave_file = wave.open(filename, 'w')
+        wave_file.setnchannels(2)
+        wave_file.setsampwidth(2)
+        wave_file.setframerate(48000)
+        wave_file.writeframes(samples.tobytes())
+        wave_file.close()
+
+        result = check_quality.WaveFile(filename)
+
+        self.assertEqual(result.rate, 48000)
+        self.assertEqual(result.raw_data.sample_format, 'S16_LE')
+        numpy.testing.assert_array_equal(result.raw_data.channel_data,
+                                         samples.T)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,8 @@ import math
 import numpy
 import unittest
 
+import audio_analysis_benchmark
+
 import acts.test_utils.audio_analysis_lib.audio_data as audio_data
 import acts.test_utils.audio_analysis_lib.audio_analysis as audio_analysis
 import acts.test_utils.audio_analysis_lib.audio_quality_measurement as \
@@ -70,6 +72,27 @@ class ErrorTest(unittest.TestCase):
             self.assertTrue(abs(ret - error[i]) < 0.001)
 
 
+class BlockAverageTest(unittest.TestCase):
+    def testBlockAverage(self):
+        left, right, block = (
+            audio_quality_measurement.find_block_average_value(
+                [1.0, 2.0, 3.0, 4.0, 5.0], 2, 2))
+        numpy.testing.assert_allclose(left, [1, 1.5, 2, 3, 4])
+        numpy.testing.assert_allclose(right, [1.5, 2.5, 3.5, 4.5, 5])
+        # The block sums leave out the first value.
+        numpy.testing.assert_allclose(block, [0, 1, 2, 3, 4])
+
+    def testBlockAverageLarge(self):
+        numpy.random.seed(0)
+        array = numpy.random.uniform(0, 1, 10000)
+        expected = audio_analysis_benchmark.loop_find_block_average_value(
+            array, 144, 72)
+        result = audio_quality_measurement.find_block_average_value(
+            array, 144, 72)
+        for expected_averages, averages in zip(expected, result):
+            numpy.testing.assert_allclose(averages, expected_averages)
+
+
 class QualityMeasurementTest(unittest.TestCase):
     def setUp(self):
         """Creates a test signal of sine wave."""
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import shutil
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from acts.controllers import adb
+from acts.controllers.adb_lib import host_protocol
+from acts.libs.proc import job
+
+SERIAL = 'FAKESERIAL'
+S_IFDIR = 0o040000
+S_IFREG = 0o100000
+
+
+def _prefixed(message):
+    return b'%04x' % len(message) + message
+
+
+class FakeAdbServerHandler(socketserver.BaseRequestHandler):
+    """Serves a small subset of the adb server protocol for one device."""
+
+    def recv_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def recv_request(self):
+        return self.recv_exactly(int(self.recv_exactly(4), 16)).decode()
+
+    def fail(self, message):
+        self.request.sendall(b'FAIL' + _prefixed(message.encode()))
+
+    def handle(self):
+        request = self.recv_request()
+        prefix = 'host-serial:%s:' % SERIAL
+        if request == prefix + 'features':
+            self.request.sendall(b'OKAY' + _prefixed(b'shell_v2,cmd'))
+        elif request.startswith(prefix + 'forward:'):
+            local = request[len(prefix + 'forward:'):].split(';')[0]
+            self.request.sendall(b'OKAY')
+            if local == 'tcp:0':
+                self.request.sendall(b'OKAY' + _prefixed(b'12345'))
+            elif local == 'tcp:1':
+                self.fail('cannot bind listener: Address already in use')
+            else:
+                self.request.sendall(b'OKAY')
+        elif request.startswith(prefix + 'killforward:'):
+            self.request.sendall(b'OKAYOKAY')
+        elif request == 'host:transport:%s' % SERIAL:
+            self.request.sendall(b'OKAY')
+            self.handle_transport(self.recv_request())
+        elif request.startswith('host:transport:'):
+            self.fail("device '%s' not found" % request.split(':')[-1])
+        else:
+            self.fail('unknown host service')
+
+    def handle_transport(self, request):
+        self.request.sendall(b'OKAY')
+        if request.startswith('shell,v2,raw:'):
+            command = request[len('shell,v2,raw:'):]
+            packets = [(host_protocol.SHELL_V2_STDOUT, command.encode()),
+                       (host_protocol.SHELL_V2_STDERR, b'err'),
+                       (host_protocol.SHELL_V2_EXIT, b'\x03')]
+            for packet_id, data in packets:
+                self.request.sendall(
+                    struct.pack('<BI', packet_id, len(data)) + data)
+        elif request == 'sync:':
+            self.handle_sync()
+
+    def handle_sync(self):
+        files = self.server.device_files
+        while True:
+            try:
+                sync_id, length = struct.unpack('<4sI', self.recv_exactly(8))
+            except EOFError:
+                return
+            path = self.recv_exactly(length).decode()
+            if sync_id == b'STAT':
+                if path in files:
+                    mode, size = S_IFREG, len(files[path])
+                elif any(f.startswith(path + '/') for f in files):
+                    mode, size = S_IFDIR, 0
+                else:
+                    mode, size = 0, 0
+                self.request.sendall(struct.pack('<4sIII', b'STAT', mode,
+                                                 size, 0))
+            elif sync_id == b'LIST':
+                for f in files:
+                    if f.startswith(path + '/'):
+                        name = f[len(path) + 1:].encode()
+                        self.request.sendall(
+                            struct.pack('<4sIIII', b'DENT', S_IFREG, 0, 0,
+                                        len(name)) + name)
+                self.request.sendall(struct.pack('<4sIIII', b'DONE', 0, 0, 0,
+                                                 0))
+            elif sync_id == b'RECV':
+                data = files[path]
+                self.request.sendall(
+                    struct.pack('<4sI', b'DATA', len(data)) + data)
+                self.request.sendall(struct.pack('<4sI', b'DONE', 0))
+            elif sync_id == b'SEND':
+                remote_path = path.rsplit(',', 1)[0]
+                data = b''
+                while True:
+                    chunk_id, length = struct.unpack('<4sI',
+                                                     self.recv_exactly(8))
+                    if chunk_id == b'DONE':
+                        break
+                    data += self.recv_exactly(length)
+                files[remote_path] = data
+                self.request.sendall(struct.pack('<4sI', b'OKAY', 0))
+
+
+class HostProtocolTest(unittest.TestCase):
+    """Tests host_protocol.AdbHostClient against a fake adb server."""
+
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0),
+                                                      FakeAdbServerHandler)
+        self.server.daemon_threads = True
+        self.server.device_files = {'/sdcard/dir/a.txt': b'hello'}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = host_protocol.AdbHostClient(
+            SERIAL, port=self.server.server_address[1])
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shell_v2_demultiplexes_output(self):
+        """Tests stdout, stderr and the exit status are read from v2 packets."""
+        result = self.client.shell('echo hi', timeout=5)
+
+        self.assertEqual(result.stdout, b'echo hi')
+        self.assertEqual(result.stderr, b'err')
+        self.assertEqual(result.exit_status, 3)
+
+    def test_transport_to_unknown_device_raises(self):
+        """Tests a FAIL reply is raised with the server's message."""
+        client = host_protocol.AdbHostClient(
+            'OTHER', port=self.server.server_address[1])
+        client._features = []
+
+        with self.assertRaises(host_protocol.AdbProtocolError) as context:
+            client.shell('ls', timeout=5)
+        self.assertEqual(context.exception.message,
+                         "device 'OTHER' not found")
+
+    def test_forward_returns_chosen_port(self):
+        """Tests the port picked by adb is returned only when requested."""
+        self.assertEqual(self.client.forward('tcp:0', 'tcp:80'), '12345')
+        self.assertEqual(self.client.forward('tcp:2', 'tcp:80'), '')
+
+    def test_pull_and_push_round_trip(self):
+        """Tests directories are pulled recursively and files pushed back."""
+        self.client.pull('/sdcard/dir', self.tmp_dir, timeout=5)
+        local_file = os.path.join(self.tmp_dir, 'dir', 'a.txt')
+        with open(local_file, 'rb') as f:
+            self.assertEqual(f.read(), b'hello')
+
+        self.client.push(local_file, '/sdcard/b.txt', timeout=5)
+        self.assertEqual(self.server.device_files['/sdcard/b.txt'], b'hello')
+
+    def test_adb_proxy_uses_host_protocol(self):
+        """Tests AdbProxy routes commands over the host protocol."""
+        proxy = adb.AdbProxy.__new__(adb.AdbProxy)
+        proxy.serial = SERIAL
+        proxy._server_local_port = self.server.server_address[1]
+        proxy._ssh_connection = None
+        proxy.enable_host_protocol()
+
+        with mock.patch('acts.libs.proc.job.run') as job_run:
+            self.assertEqual(proxy.shell('ls'), 'ls')
+            self.assertEqual(proxy.tcp_forward(0, 80), 12345)
+            proxy.remove_tcp_forward(12345)
+            with self.assertRaises(adb.AdbError) as context:
+                proxy.tcp_forward(1, 80)
+        self.assertFalse(job_run.called)
+        self.assertIn('cannot bind listener', context.exception.stderr)
+
+    def make_proxy(self, port):
+        proxy = adb.AdbProxy.__new__(adb.AdbProxy)
+        proxy.serial = SERIAL
+        proxy.adb_str = 'adb -s %s' % SERIAL
+        proxy._server_local_port = port
+        proxy._ssh_connection = None
+        proxy.enable_host_protocol()
+        return proxy
+
+    def test_adb_proxy_forwards_with_adb_without_server(self):
+        """Tests port forwarding spawns adb if no adb server is listening."""
+        # Closing the server leaves its port with no listener.
+        self.server.server_close()
+        proxy = self.make_proxy(self.server.server_address[1])
+        result = job.Result(stdout=b'12345', exit_status=0)
+
+        with mock.patch('acts.libs.proc.job.run',
+                        return_value=result) as job_run:
+            self.assertEqual(proxy.tcp_forward(0, 80), 12345)
+            proxy.remove_tcp_forward(12345)
+
+        commands = [call[0][0] for call in job_run.call_args_list]
+        self.assertEqual(commands, [
+            'adb -s %s forward tcp:0 tcp:80' % SERIAL,
+            'adb -s %s forward --remove tcp:12345' % SERIAL,
+        ])
+
+    def test_adb_proxy_forward_times_out_on_silent_server(self):
+        """Tests port forwarding does not wait forever for the adb server."""
+        silent_server = socket.socket()
+        silent_server.bind(('127.0.0.1', 0))
+        silent_server.listen(1)
+        self.addCleanup(silent_server.close)
+        proxy = self.make_proxy(silent_server.getsockname()[1])
+
+        with mock.patch.object(adb, 'DEFAULT_ADB_TIMEOUT', 0.1):
+            with self.assertRaises(job.TimeoutError):
+                proxy.tcp_forward(0, 80)
+            with self.assertRaises(job.TimeoutError):
+                proxy.remove_tcp_forward(12345)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2019 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import time
+import unittest
+
+import mock
+
+from acts.controllers.adb_lib import shell_session
+
+# Stands in for `adb -s <serial>`. The appended 'shell' argument is ignored,
+# and commands are read from stdin by a local shell instead of the device's.
+FAKE_ADB_CMD = ['sh', '-c', 'exec sh', '--']
+
+
+class AdbShellSessionTest(unittest.TestCase):
+    """Tests the shell_session.AdbShellSession class."""
+
+    def setUp(self):
+        self.session = shell_session.AdbShellSession(FAKE_ADB_CMD)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_run_returns_output_and_exit_status(self):
+        """Tests that stdout, stderr and the exit status are demultiplexed."""
+        result = self.session.run('echo out; echo err >&2; exit 3', timeout=5)
+
+        self.assertEqual(result, (3, b'out\n', b'err\n'))
+
+    def test_run_preserves_output_without_trailing_newline(self):
+        """Tests that output is returned exactly as the command wrote it."""
+        result = self.session.run('printf abc', timeout=5)
+
+        self.assertEqual(result, (0, b'abc', b''))
+
+    def test_run_reuses_process(self):
+        """Tests that consecutive commands share one process and no state."""
+        self.session.run('cd /', timeout=5)
+        proc = self.session._proc
+        status, out, _ = self.session.run('echo $$; pwd', timeout=5)
+
+        self.assertIs(self.session._proc, proc)
+        self.assertEqual(status, 0)
+        self.assertNotEqual(out.splitlines()[-1], b'/')
+
+    def test_run_does_not_consume_following_commands(self):
+        """Tests that a command reading stdin gets EOF instead of the stream."""
+        self.assertEqual(self.session.run('cat', timeout=5), (0, b'', b''))
+        self.assertEqual(
+            self.session.run('echo next', timeout=5), (0, b'next\n', b''))
+
+    def test_run_timeout_closes_session(self):
+        """Tests that a timed out command closes the out of sync session."""
+        with self.assertRaises(shell_session.ShellSessionTimeoutError):
+            self.session.run('sleep 5', timeout=0.1)
+
+        self.assertFalse(self.session.is_alive)
+        self.assertEqual(
+            self.session.run('echo ok', timeout=5), (0, b'ok\n', b''))
+
+    def test_run_timeout_with_continuous_output(self):
+        """Tests that a command printing without end still times out."""
+        start_time = time.time()
+        with self.assertRaises(shell_session.ShellSessionTimeoutError):
+            self.session.run('while true; do echo line; sleep 0.05; done',
+                             timeout=0.5)
+
+        self.assertLess(time.time() - start_time, 3)
+
+    def test_run_raises_when_session_cannot_start(self):
+        """Tests that an adb process exiting immediately raises an error."""
+        session = shell_session.AdbShellSession(['false'])
+
+        with self.assertRaises(shell_session.ShellSessionError):
+            session.run('echo unreachable', timeout=5)
+
+    def test_run_with_stderr_merged_into_stdout(self):
+        """Tests a shell that merges stderr, as `adb shell` without shell_v2.
+
+        The adb process keeps its own stderr open, but nothing is written to
+        it.
+        """
+        session = shell_session.AdbShellSession(
+            ['sh', '-c', 'exec sh 3>&2 2>&1', '--'])
+        try:
+            result = session.run('echo out; echo err >&2; exit 3', timeout=5)
+            self.assertEqual(result, (3, b'out\nerr\n', b''))
+            self.assertEqual(
+                session.run('echo next', timeout=5), (0, b'next\n', b''))
+        finally:
+            session.close()
+
+    @mock.patch.object(shell_session, 'SESSION_START_TIMEOUT', 0.1)
+    def test_run_does_not_retry_session_that_timed_out_starting(self):
+        """Tests that an unresponsive session fails once, and not as a timeout.
+        """
+        session = shell_session.AdbShellSession(
+            ['sh', '-c', 'exec sleep 30', '--'])
+
+        with mock.patch('subprocess.Popen',
+                        wraps=shell_session.subprocess.Popen) as popen:
+            with self.assertRaises(shell_session.ShellSessionError) as e:
+                session.run('echo unreachable', timeout=30)
+            self.assertNotIsInstance(e.exception,
+                                     shell_session.ShellSessionTimeoutError)
+            with self.assertRaises(shell_session.ShellSessionError):
+                session.run('echo unreachable', timeout=30)
+
+        self.assertEqual(popen.call_count, 1)
+        self.assertFalse(session.is_alive)
+
+    def test_run_returns_partial_output_when_session_exits(self):
+        """Tests that a session exiting mid-command reports status 255."""
+        self.session.run('true', timeout=5)
+
+        result = self.session.run('echo bye; kill -9 $$', timeout=5)
+
+        self.assertEqual(result, (255, b'bye', b''))
+        self.assertFalse(self.session.is_alive)
+
+
+if __name__ == '__main__':
+    unittest.main()
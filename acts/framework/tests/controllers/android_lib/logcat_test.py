@@ -14,6 +14,10 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 import logging
+import gzip
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -31,10 +35,12 @@ class LogcatTest(unittest.TestCase):
         return mock.patch('acts.controllers.android_lib.logcat.%s' % patched)
 
     def setUp(self):
-        self._get_log_level = logcat._get_log_level
+        self.tmp_dir = tempfile.mkdtemp()
+        logcat._writers.clear()
 
     def tearDown(self):
-        logcat._get_log_level = self._get_log_level
+        shutil.rmtree(self.tmp_dir)
+        logcat._writers.clear()
 
     # TimestampTracker
 
@@ -57,115 +63,331 @@ class LogcatTest(unittest.TestCase):
 
         self.assertEqual(tracker.last_timestamp, '2000-01-01 12:34:56.789')
 
-    # _get_log_level
-
-    def test_get_log_level_verbose(self):
-        """Tests that Logcat's verbose logs make it to the debug level."""
-        level = logcat._get_log_level(BASE_TIMESTAMP + 'V')
-
-        self.assertEqual(level, logging.DEBUG)
+    # _on_retry
 
-    def test_get_log_level_debug(self):
-        """Tests that Logcat's debug logs make it to the debug level."""
-        level = logcat._get_log_level(BASE_TIMESTAMP + 'D')
+    def test_on_retry_returns_func_that_formats_with_last_timestamp(self):
+        tracker = TimestampTracker()
+        tracker.read_output(BASE_TIMESTAMP)
+        new_command = logcat._on_retry('S3R14L', 'extra_params', tracker)(None)
 
-        self.assertEqual(level, logging.DEBUG)
+        self.assertIn('-T "%s"' % tracker.last_timestamp, new_command)
 
-    def test_get_log_level_info(self):
-        """Tests that Logcat's info logs make it to the info level."""
-        level = logcat._get_log_level(BASE_TIMESTAMP + 'I')
+    def test_on_retry_func_returns_string_that_contains_the_given_serial(self):
+        tracker = TimestampTracker()
+        tracker.read_output(BASE_TIMESTAMP)
+        new_command = logcat._on_retry('S3R14L', 'extra_params', tracker)(None)
 
-        self.assertEqual(level, logging.INFO)
+        self.assertTrue('-s S3R14L' in new_command)
 
-    def test_get_log_level_warning(self):
-        """Tests that Logcat's warning logs make it to the warning level."""
-        level = logcat._get_log_level(BASE_TIMESTAMP + 'W')
+    def test_on_retry_func_returns_string_that_contains_any_extra_params(self):
+        tracker = TimestampTracker()
+        tracker.read_output(BASE_TIMESTAMP)
+        new_command = logcat._on_retry('S3R14L', 'extra_params', tracker)(None)
 
-        self.assertEqual(level, logging.WARNING)
+        self.assertTrue('extra_params' in new_command)
 
-    def test_get_log_level_error(self):
-        """Tests that Logcat's error logs make it to the error level."""
-        level = logcat._get_log_level(BASE_TIMESTAMP + 'E')
+    # TimestampTracker.read_output_chunk
 
-        self.assertEqual(level, logging.ERROR)
+    def test_read_output_chunk_sets_last_timestamp_of_chunk(self):
+        tracker = TimestampTracker()
+        tracker.read_output_chunk(
+            b'2000-01-01 12:34:56.789   1   2 D tag: first\n'
+            b'--------- beginning of main\n'
+            b'2000-01-01 12:34:57.123   1   2 D tag: second\n'
+            b'--------- beginning of system\n')
 
-    def test_get_log_level_markers(self):
-        """Tests that Logcat's marker logs make it to the error level."""
-        level = logcat._get_log_level('--------- beginning of main')
+        self.assertEqual(tracker.last_timestamp, '2000-01-01 12:34:57.123')
 
-        self.assertEqual(level, logging.ERROR)
+    def test_read_output_chunk_ignores_timestamps_within_lines(self):
+        tracker = TimestampTracker()
+        tracker.read_output_chunk(
+            b'2000-01-01 12:34:56.789   1   2 D tag: 9999-12-31 23:59:59.999\n')
 
-    # _log_line_func
+        self.assertEqual(tracker.last_timestamp, '2000-01-01 12:34:56.789')
 
-    def test_log_line_func_returns_func_that_logs_to_given_logger(self):
-        logcat._get_log_level = lambda message: logging.INFO
-        tracker = mock.Mock()
-        log = mock.Mock()
-        message = 'MESSAGE'
+    def test_read_output_chunk_ignores_continued_line(self):
+        """Tests a chunk starting mid-line is not read as a line start."""
+        tracker = TimestampTracker()
+        tracker.read_output_chunk(b'2000-01-01 12:34:56.789   1   2 D tag: ')
+        tracker.read_output_chunk(b'2001-01-01 12:34:56.789 rest of line\n')
 
-        logcat._log_line_func(log, tracker)(message)
+        self.assertEqual(tracker.last_timestamp, '2000-01-01 12:34:56.789')
 
-        self.assertEqual(log.log.called, True)
-        log.log.assert_called_once_with(logging.INFO, message)
+    def test_read_output_chunk_ignores_incomplete_timestamp(self):
+        tracker = TimestampTracker()
+        tracker.read_output_chunk(b'2000-01-01 12:34:56.789   1   2 D tag\n'
+                                  b'2000-01-01 12:34:57.1')
 
-    def test_log_line_func_returns_func_that_updates_the_timestamp(self):
-        logcat._get_log_level = lambda message: logging.INFO
-        tracker = mock.Mock()
-        log = mock.Mock()
-        message = 'MESSAGE'
+        self.assertEqual(tracker.last_timestamp, '2000-01-01 12:34:56.789')
 
-        logcat._log_line_func(log, tracker)(message)
+    def test_read_output_chunk_searches_whole_chunk_if_tail_has_none(self):
+        tracker = TimestampTracker()
+        tracker.read_output_chunk(b'2000-01-01 12:34:56.789   1   2 D tag: ' +
+                                  b'x' * logcat._TIMESTAMP_SEARCH_WINDOW * 2)
 
-        self.assertEqual(tracker.read_output.called, True)
-        tracker.read_output.assert_called_once_with(message)
+        self.assertEqual(tracker.last_timestamp, '2000-01-01 12:34:56.789')
 
-    # _on_retry
+    # LogcatFileWriter
 
-    def test_on_retry_returns_func_that_formats_with_last_timestamp(self):
-        tracker = TimestampTracker()
-        tracker.read_output(BASE_TIMESTAMP)
-        new_command = logcat._on_retry('S3R14L', 'extra_params', tracker)(None)
+    def create_writer(self, **kwargs):
+        patcher = self.patch('context.get_current_context')
+        get_context = patcher.start()
+        self.addCleanup(patcher.stop)
+        get_context.return_value.get_full_output_path.return_value = (
+            self.tmp_dir)
+        writer = logcat.LogcatFileWriter('S3R14L', 'dir', TimestampTracker(),
+                                         **kwargs)
+        self.addCleanup(writer.close)
+        return writer, get_context
 
-        self.assertIn('-T "%s"' % tracker.last_timestamp, new_command)
+    def read_file(self, name):
+        with open(os.path.join(self.tmp_dir, name), 'rb') as f:
+            return f.read()
 
-    def test_on_retry_func_returns_string_that_contains_the_given_serial(self):
-        tracker = TimestampTracker()
-        tracker.read_output(BASE_TIMESTAMP)
-        new_command = logcat._on_retry('S3R14L', 'extra_params', tracker)(None)
+    def test_writer_writes_raw_chunks(self):
+        writer, _ = self.create_writer()
+        writer.write(b'line 1\nline')
+        writer.write(b' 2\n')
 
-        self.assertTrue('-s S3R14L' in new_command)
+        self.assertEqual(self.read_file('adblog_S3R14L_debug.txt'),
+                         b'line 1\nline 2\n')
 
-    def test_on_retry_func_returns_string_that_contains_any_extra_params(self):
-        tracker = TimestampTracker()
-        tracker.read_output(BASE_TIMESTAMP)
-        new_command = logcat._on_retry('S3R14L', 'extra_params', tracker)(None)
+    def test_writer_updates_timestamp_tracker(self):
+        tracker = mock.Mock()
+        writer = logcat.LogcatFileWriter('S3R14L', 'dir', tracker)
+        writer._open = mock.Mock()
+        writer._file = mock.Mock()
+        writer.write(b'data')
+        writer.close()
+
+        tracker.read_output_chunk.assert_called_once_with(b'data')
+
+    def test_writer_moves_to_new_context_dir(self):
+        writer, get_context = self.create_writer()
+        writer.write(b'class\n')
+        new_dir = os.path.join(self.tmp_dir, 'test_case')
+        os.makedirs(new_dir)
+        get_context.return_value.get_full_output_path.return_value = new_dir
+        writer._on_new_context(None)
+        writer.write(b'test case\n')
+
+        self.assertEqual(self.read_file('adblog_S3R14L_debug.txt'),
+                         b'class\n')
+        self.assertEqual(
+            self.read_file(os.path.join('test_case',
+                                        'adblog_S3R14L_debug.txt')),
+            b'test case\n')
+
+    def test_writer_compresses_output(self):
+        writer, _ = self.create_writer(compress=True)
+        writer.write(b'line 1\n')
+        writer.close()
+
+        self.assertEqual(
+            gzip.decompress(self.read_file('adblog_S3R14L_debug.txt.gz')),
+            b'line 1\n')
+
+    def test_writer_rotates_at_line_boundary(self):
+        writer, _ = self.create_writer(max_bytes=10, backup_count=2)
+        writer.write(b'aaaa\nbb')
+        writer.write(b'bb\ncccc\n')
+        writer.write(b'dd')
+        writer.write(b'dd\n')
+        writer.write(b'eeeeeeee\n')
+
+        # The line split across the first two writes stays in one file.
+        self.assertEqual(self.read_file('adblog_S3R14L_debug.txt.2'),
+                         b'aaaa\nbbbb\n')
+        self.assertEqual(self.read_file('adblog_S3R14L_debug.txt.1'),
+                         b'cccc\ndddd\n')
+        self.assertEqual(self.read_file('adblog_S3R14L_debug.txt'),
+                         b'eeeeeeee\n')
+
+    def write_seconds(self, writer, seconds, chunk_lines=1):
+        """Writes one line per second, chunk_lines lines per write."""
+        lines = [b'2000-01-01 00:00:%02d.000  1  2 I tag: message %d\n' %
+                 (second, second) for second in seconds]
+        for i in range(0, len(lines), chunk_lines):
+            writer.write(b''.join(lines[i:i + chunk_lines]))
+
+    def test_writer_iter_lines_returns_time_range(self):
+        writer, _ = self.create_writer()
+        writer.write(b'--------- beginning of main\n')
+        self.write_seconds(writer, range(10))
+
+        lines = list(writer.iter_lines('2000-01-01 00:00:03.000',
+                                       '2000-01-01 00:00:05.000'))
+
+        self.assertEqual(lines, [
+            '2000-01-01 00:00:03.000  1  2 I tag: message 3',
+            '2000-01-01 00:00:04.000  1  2 I tag: message 4',
+            '2000-01-01 00:00:05.000  1  2 I tag: message 5',
+        ])
+
+    def test_writer_iter_lines_seeks_with_index(self):
+        writer, _ = self.create_writer()
+        self.write_seconds(writer, [0])
+        writer._index = logcat.LogcatIndex(interval=0)
+        self.write_seconds(writer, range(1, 60))
+
+        with mock.patch.object(logcat, '_line_timestamp',
+                               wraps=logcat._line_timestamp) as parse:
+            lines = list(writer.iter_lines('2000-01-01 00:00:50.000'))
+
+        self.assertEqual(len(lines), 10)
+        # Only the lines within the margin before the range are read.
+        self.assertLess(parse.call_count, 25)
+
+    def test_writer_iter_lines_skips_incomplete_line(self):
+        writer, _ = self.create_writer()
+        self.write_seconds(writer, [1])
+        writer.write(b'2000-01-01 00:00:02.000  1  2 I tag: mess')
+
+        self.assertEqual(len(list(writer.iter_lines())), 1)
+
+    def test_writer_search_returns_matching_lines(self):
+        writer, _ = self.create_writer()
+        self.write_seconds(writer, range(20), chunk_lines=3)
+
+        lines, _ = writer.search(r'message 1\d', '2000-01-01 00:00:15.000')
+
+        self.assertEqual(lines, [
+            '2000-01-01 00:00:%02d.000  1  2 I tag: message %d' % (i, i)
+            for i in range(15, 20)
+        ])
+
+    def test_writer_search_from_cursor_only_returns_new_lines(self):
+        writer, _ = self.create_writer()
+        self.write_seconds(writer, range(3))
+        _, cursor = writer.search('message')
+        self.write_seconds(writer, range(3, 5))
+
+        lines, _ = writer.search('message', cursor=cursor)
+
+        self.assertEqual(lines, [
+            '2000-01-01 00:00:03.000  1  2 I tag: message 3',
+            '2000-01-01 00:00:04.000  1  2 I tag: message 4',
+        ])
+
+    def test_writer_tail_restarts_after_rotation(self):
+        writer, _ = self.create_writer(max_bytes=100)
+        self.write_seconds(writer, range(2))
+        lines, cursor = writer.tail()
+        self.assertEqual(len(lines), 2)
+        self.write_seconds(writer, range(2, 5))
+
+        lines, _ = writer.tail(cursor)
+
+        self.assertEqual(lines, [
+            '2000-01-01 00:00:04.000  1  2 I tag: message 4'
+        ])
+
+    def test_writer_is_not_indexing_compressed_file(self):
+        writer, _ = self.create_writer(compress=True)
+        writer.write(b'line 1\n')
+
+        self.assertFalse(writer.is_indexing(
+            os.path.join(self.tmp_dir, writer.file_name)))
+
+    def test_writer_subscription_receives_matching_lines(self):
+        writer, _ = self.create_writer()
+        subscription = writer.subscribe([r'message [13]$', 'message 2'])
+        self.write_seconds(writer, range(3))
+        writer.write(b'2000-01-01 00:00:03.000  1  2 I tag: mess')
+        writer.write(b'age 3\n')
+
+        lines = [subscription.get(timeout=0) for _ in range(4)]
+
+        self.assertEqual(lines, [
+            '2000-01-01 00:00:01.000  1  2 I tag: message 1',
+            '2000-01-01 00:00:02.000  1  2 I tag: message 2',
+            '2000-01-01 00:00:03.000  1  2 I tag: message 3',
+            None,
+        ])
+
+    def test_writer_subscription_replays_lines_since_timestamp(self):
+        writer, _ = self.create_writer()
+        self.write_seconds(writer, range(5))
+
+        subscription = writer.subscribe(['message'],
+                                         '2000-01-01 00:00:03.000')
+        self.write_seconds(writer, [5])
+
+        lines = [subscription.get(timeout=0) for _ in range(3)]
+        self.assertEqual([line[-9:] for line in lines],
+                         ['message 3', 'message 4', 'message 5'])
+
+    def test_writer_closed_subscription_receives_nothing(self):
+        writer, _ = self.create_writer()
+        with writer.subscribe(['message']) as subscription:
+            pass
+        self.write_seconds(writer, [0])
+
+        self.assertIsNone(subscription.get(timeout=0))
+
+    # LogcatIndex
+
+    def test_index_finds_last_offset_before_timestamp(self):
+        index = logcat.LogcatIndex(interval=10)
+        index.add(0, '2000-01-01 00:00:01.000')
+        index.add(5, '2000-01-01 00:00:02.000')
+        index.add(10, '2000-01-01 00:00:03.000')
+        index.add(20, '2000-01-01 00:00:02.500')
 
-        self.assertTrue('extra_params' in new_command)
+        self.assertEqual(index.find_offset('2000-01-01 00:00:00.000'), 0)
+        self.assertEqual(index.find_offset('2000-01-01 00:00:03.000'), 0)
+        self.assertEqual(index.find_offset('2000-01-01 00:00:03.001'), 20)
 
     # create_logcat_keepalive_process
 
-    def test_create_logcat_keepalive_process_creates_a_new_logger(self):
-        with self.patch('log_stream') as log_stream, self.patch('Process'):
+    def test_create_logcat_keepalive_process_creates_a_new_writer(self):
+        with self.patch('LogcatFileWriter') as writer, self.patch('Process'):
+            logcat.create_logcat_keepalive_process('S3R14L', 'dir')
+        self.assertEqual(writer.call_args[0][0], 'S3R14L')
+        self.assertEqual(writer.call_args[0][1], 'dir')
+
+    def test_create_logcat_keepalive_process_closes_previous_writer(self):
+        with self.patch('LogcatFileWriter') as writer, self.patch('Process'):
+            logcat.create_logcat_keepalive_process('S3R14L', 'dir')
+            first_writer = writer.return_value
+            writer.return_value = mock.Mock()
             logcat.create_logcat_keepalive_process('S3R14L', 'dir')
-        self.assertEqual(log_stream.create_logger.call_args[0][0],
-                         'adblog_S3R14L')
-        self.assertEqual(log_stream.create_logger.call_args[1]['subcontext'],
-                         'dir')
+
+        self.assertTrue(first_writer.close.called)
+        self.assertFalse(writer.return_value.close.called)
+
+    def test_close_logcat_writer_completes_compressed_file(self):
+        writer, _ = self.create_writer(compress=True)
+        logcat._writers['S3R14L'] = writer
+        writer.write(b'line 1\n')
+
+        logcat.close_logcat_writer('S3R14L')
+
+        self.assertIsNone(logcat.get_logcat_writer('S3R14L'))
+        self.assertEqual(
+            gzip.decompress(self.read_file('adblog_S3R14L_debug.txt.gz')),
+            b'line 1\n')
+
+    def test_close_logcat_writer_without_writer(self):
+        logcat.close_logcat_writer('S3R14L')
+
+        self.assertIsNone(logcat.get_logcat_writer('S3R14L'))
 
     def test_create_logcat_keepalive_process_creates_a_new_process(self):
-        with self.patch('log_stream'), self.patch('Process') as process:
+        with self.patch('LogcatFileWriter'), self.patch('Process') as process:
             logcat.create_logcat_keepalive_process('S3R14L', 'dir')
 
         self.assertIn('S3R14L', process.call_args[0][0])
 
-    def test_create_logcat_keepalive_process_sets_output_callback(self):
-        with self.patch('log_stream'), self.patch('Process'):
+    def test_create_logcat_keepalive_process_sets_binary_output_callback(self):
+        with self.patch('LogcatFileWriter') as writer, self.patch('Process'):
             process = logcat.create_logcat_keepalive_process('S3R14L', 'dir')
 
-        self.assertEqual(process.set_on_output_callback.called, True)
+        process.set_on_output_callback.assert_called_once_with(
+            writer.return_value.write, binary=True)
 
     def test_create_logcat_keepalive_process_sets_on_terminate_callback(self):
-        with self.patch('log_stream'), self.patch('Process'):
+        with self.patch('LogcatFileWriter'), self.patch('Process'):
             process = logcat.create_logcat_keepalive_process('S3R14L', 'dir')
 
         self.assertEqual(process.set_on_terminate_callback.called, True)
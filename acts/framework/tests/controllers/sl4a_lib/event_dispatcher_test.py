@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import queue
+import threading
+import unittest
+
+import mock
+
+from acts.controllers.sl4a_lib import event_dispatcher
+from acts.controllers.sl4a_lib import rpc_client
+
+
+class EventDispatcherTest(unittest.TestCase):
+    """Tests the event_dispatcher.EventDispatcher class."""
+
+    @staticmethod
+    def started_dispatcher():
+        """Returns an EventDispatcher that acts as if polling has started."""
+        dispatcher = event_dispatcher.EventDispatcher('serial', mock.Mock())
+        dispatcher._started = True
+        return dispatcher
+
+    @staticmethod
+    def put_later(dispatcher, event, delay=0.05):
+        """Stores the event in the dispatcher after a delay."""
+        timer = threading.Timer(
+            delay, lambda: dispatcher.get_event_q(event['name']).put(event))
+        timer.start()
+        return timer
+
+    def test_wait_for_event_wakes_on_new_event(self):
+        """Tests event_dispatcher.EventDispatcher.wait_for_event().
+
+        Tests that a waiter is woken up by a matching event arriving after the
+        wait has begun.
+        """
+        dispatcher = self.started_dispatcher()
+        event = {'name': 'Foo', 'data': 1, 'time': 0}
+        self.put_later(dispatcher, event)
+
+        result = dispatcher.wait_for_event('Foo', lambda e: e['data'] == 1, 5)
+
+        self.assertIs(result, event)
+
+    def test_wait_for_event_keeps_ignored_events_in_order(self):
+        """Tests event_dispatcher.EventDispatcher.wait_for_event().
+
+        Tests that with consume_ignored_events=False, events failing the
+        predicate are left in place instead of being drained and re-queued.
+        """
+        dispatcher = self.started_dispatcher()
+        first = {'name': 'Foo', 'data': 0, 'time': 0}
+        second = {'name': 'Foo', 'data': 1, 'time': 1}
+        third = {'name': 'Foo', 'data': 2, 'time': 2}
+        for event in (first, second, third):
+            dispatcher.get_event_q('Foo').put(event)
+
+        result = dispatcher.wait_for_event(
+            'Foo',
+            lambda e: e['data'] == 1,
+            5,
+            consume_ignored_events=False)
+
+        self.assertIs(result, second)
+        self.assertEqual(list(dispatcher.get_event_q('Foo').queue),
+                         [first, third])
+
+    def test_wait_for_event_consumes_ignored_events(self):
+        """Tests event_dispatcher.EventDispatcher.wait_for_event().
+
+        Tests that by default, events failing the predicate are removed.
+        """
+        dispatcher = self.started_dispatcher()
+        ignored = {'name': 'Foo', 'data': 0, 'time': 0}
+        dispatcher.get_event_q('Foo').put(ignored)
+
+        with self.assertRaises(queue.Empty):
+            dispatcher.wait_for_event('Foo', lambda e: e['data'] == 1, 0.05)
+        self.assertEqual(dispatcher.get_event_q('Foo').qsize(), 0)
+
+    def test_pop_events_wakes_on_matching_event(self):
+        """Tests event_dispatcher.EventDispatcher.pop_events().
+
+        Tests that pop_events returns as soon as an event matching the regex
+        arrives, ignoring events with other names.
+        """
+        dispatcher = self.started_dispatcher()
+        dispatcher.get_event_q('Bar').put({'name': 'Bar', 'time': 0})
+        event = {'name': 'FooEvent', 'time': 1}
+        self.put_later(dispatcher, event)
+
+        results = dispatcher.pop_events('Foo.*', 5)
+
+        self.assertEqual(results, [event])
+        self.assertEqual(dispatcher.get_event_q('Bar').qsize(), 1)
+
+    def test_pop_events_times_out(self):
+        """Tests event_dispatcher.EventDispatcher.pop_events().
+
+        Tests that queue.Empty is raised when no matching event arrives.
+        """
+        dispatcher = self.started_dispatcher()
+
+        with self.assertRaises(queue.Empty):
+            dispatcher.pop_events('Foo.*', 0.05)
+        self.assertEqual(len(dispatcher._waiters), 0)
+
+    def test_poll_events_drains_batch_with_event_poll(self):
+        """Tests event_dispatcher.EventDispatcher.poll_events().
+
+        Tests that after eventWait returns, queued events are drained with a
+        single eventPoll call and stored in order.
+        """
+        rpc = mock.Mock()
+        dispatcher = event_dispatcher.EventDispatcher('serial', rpc)
+        dispatcher._started = True
+        rpc.eventWait.return_value = {'name': 'Foo', 'data': 0}
+        rpc.eventPoll.return_value = [{
+            'name': 'Foo',
+            'data': 1
+        }, {
+            'name': 'EventDispatcherShutdown'
+        }]
+
+        dispatcher.poll_events()
+
+        rpc.eventPoll.assert_called_once_with(
+            event_dispatcher.EventDispatcher.DEFAULT_BATCH_SIZE - 1)
+        self.assertEqual(
+            [e['data'] for e in dispatcher.get_event_q('Foo').queue], [0, 1])
+
+    def test_poll_events_falls_back_without_event_poll(self):
+        """Tests event_dispatcher.EventDispatcher.poll_events().
+
+        Tests that if the device does not support eventPoll, the dispatcher
+        falls back to calling eventWait once per event.
+        """
+        rpc = mock.Mock()
+        dispatcher = event_dispatcher.EventDispatcher('serial', rpc)
+        dispatcher._started = True
+        rpc.eventWait.side_effect = [{
+            'name': 'Foo'
+        }, {
+            'name': 'EventDispatcherShutdown'
+        }]
+        rpc.eventPoll.side_effect = rpc_client.Sl4aApiError('Unknown RPC.')
+
+        dispatcher.poll_events()
+
+        self.assertEqual(rpc.eventPoll.call_count, 1)
+        self.assertEqual(rpc.eventWait.call_count, 2)
+        self.assertEqual(dispatcher.get_event_q('Foo').qsize(), 1)
+
+    def test_bounded_queue_drops_oldest(self):
+        """Tests the DROP_OLDEST overflow policy and queue stats."""
+        dispatcher = event_dispatcher.EventDispatcher(
+            'serial', mock.Mock(), max_queue_size=2)
+        dispatcher._started = True
+        for i in range(3):
+            dispatcher.get_event_q('Foo').put({'name': 'Foo', 'data': i})
+
+        self.assertEqual(dispatcher.pop_event('Foo', 0)['data'], 1)
+        self.assertEqual(
+            dispatcher.get_queue_stats()['Foo'], {
+                'depth': 1,
+                'max_depth': 2,
+                'received': 3,
+                'dropped': 1
+            })
+
+    def test_bounded_queue_raises_on_next_pop(self):
+        """Tests the RAISE overflow policy.
+
+        Tests that the new event is dropped, and the overflow is raised to the
+        next caller popping events of that name.
+        """
+        dispatcher = event_dispatcher.EventDispatcher(
+            'serial',
+            mock.Mock(),
+            max_queue_size=1,
+            overflow_policy=event_dispatcher.OverflowPolicy.RAISE)
+        dispatcher._started = True
+        e_queue = dispatcher.get_event_q('Foo')
+        e_queue.put({'name': 'Foo', 'data': 0})
+        with self.assertRaises(event_dispatcher.EventQueueOverflowError):
+            e_queue.put({'name': 'Foo', 'data': 1})
+
+        with self.assertRaises(event_dispatcher.EventQueueOverflowError):
+            dispatcher.pop_event('Foo', 0)
+        self.assertEqual(dispatcher.pop_event('Foo', 0)['data'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,6 +13,9 @@
 #   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
+import json
+import queue
+import threading
 import unittest
 
 import mock
@@ -24,6 +27,40 @@ class BreakoutError(Exception):
     """Thrown to prove program execution."""
 
 
+class FakeMultiplexedConnection(object):
+    """A fake RpcConnection whose responses are pushed in by the test."""
+
+    def __init__(self):
+        self.uid = 1
+        self.ports = mock.Mock()
+        self.sent = queue.Queue()
+        self.responses = queue.Queue()
+        self.closed = False
+        self._ticket = 0
+
+    def get_new_ticket(self):
+        self._ticket += 1
+        return self._ticket
+
+    def set_timeout(self, timeout):
+        pass
+
+    def send_request(self, request):
+        self.sent.put(json.loads(request))
+
+    def get_response(self):
+        return self.responses.get()
+
+    def reply(self, ticket, result):
+        self.responses.put(
+            json.dumps({'id': ticket, 'result': result, 'error': None})
+            .encode('utf8'))
+
+    def close(self):
+        self.closed = True
+        self.responses.put(b'')
+
+
 class RpcClientTest(unittest.TestCase):
     """Tests the rpc_client.RpcClient class."""
 
@@ -71,12 +108,6 @@ class RpcClientTest(unittest.TestCase):
 
         Tests that an available client is returned if one exists.
         """
-
-        def fail_on_wrong_execution():
-            self.fail('The program is not executing the expected path. '
-                      'Tried to return an available free client, ended up '
-                      'sleeping to wait for client instead.')
-
         session = mock.Mock()
 
         client = rpc_client.RpcClient(session.uid, session.adb.serial,
@@ -84,85 +115,141 @@ class RpcClientTest(unittest.TestCase):
                                       lambda _: mock.Mock())
         expected_connection = mock.Mock()
         client._free_connections = [expected_connection]
-        client._lock = mock.MagicMock()
-
-        with mock.patch('time.sleep') as sleep_mock:
-            sleep_mock.side_effect = fail_on_wrong_execution
 
-            connection = client._get_free_connection()
+        connection = client._get_free_connection()
 
         self.assertEqual(connection, expected_connection)
         self.assertTrue(expected_connection in client._working_connections)
         self.assertEqual(len(client._free_connections), 0)
+        self.assertEqual(client.pool_stats.saturated_acquisitions, 0)
 
-    def test_get_free_connection_continues_upon_connection_taken(self):
+    def test_get_free_connection_discards_closed_connection(self):
         """Tests rpc_client.RpcClient._get_free_connection().
 
-        Tests that if the free connection is taken while trying to acquire the
-        lock to reserve it, the thread gives up the lock and tries again.
+        Tests that a free connection failing the health check is closed and
+        skipped in favor of a healthy one.
         """
+        session = mock.Mock()
 
-        def empty_list():
-            client._free_connections.clear()
+        client = rpc_client.RpcClient(session.uid, session.adb.serial,
+                                      lambda _: mock.Mock(),
+                                      lambda _: mock.Mock())
+        healthy_connection = mock.Mock()
+        closed_connection = mock.Mock()
+        closed_connection.is_alive.return_value = False
+        client._free_connections = [healthy_connection, closed_connection]
+
+        connection = client._get_free_connection()
+
+        self.assertEqual(connection, healthy_connection)
+        self.assertTrue(closed_connection.close.called)
+        self.assertEqual(len(client._free_connections), 0)
+        self.assertEqual(client.pool_stats.connections_discarded, 1)
 
-        def fail_on_wrong_execution():
-            self.fail('The program is not executing the expected path. '
-                      'Tried to return an available free client, ended up '
-                      'sleeping to wait for client instead.')
+    def test_get_free_connection_closes_idle_connection(self):
+        """Tests rpc_client.RpcClient._get_free_connection().
+
+        Tests that connections idle for longer than the idle timeout are closed
+        and replaced with a new connection.
+        """
+        session = mock.Mock()
+        stale_connection = mock.Mock()
+        fresh_connection = mock.Mock()
+        create_connection = mock.Mock(
+            side_effect=[stale_connection, fresh_connection])
+
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            create_connection,
+            idle_timeout=30)
+        self.assertEqual(client._free_connections, [stale_connection])
+        client._idle_since[stale_connection] -= 60
+
+        connection = client._get_free_connection()
+
+        self.assertIs(connection, fresh_connection)
+        self.assertTrue(stale_connection.close.called)
+        self.assertFalse(fresh_connection.close.called)
+        self.assertEqual(client._free_connections, [])
+        self.assertEqual(client.pool_stats.connections_discarded, 1)
+
+    def test_get_free_connection_waits_for_release(self):
+        """Tests rpc_client.RpcClient._get_free_connection().
 
+        Tests that if all connections are taken, the caller blocks until one
+        is released, and the wait is recorded as saturation.
+        """
         session = mock.Mock()
 
         client = rpc_client.RpcClient(session.uid, session.adb.serial,
                                       lambda _: mock.Mock(),
                                       lambda _: mock.Mock())
-        client._free_connections = mock.Mock()
-        client._lock = mock.MagicMock()
-        client._lock.acquire.side_effect = empty_list
-        client._free_connections = [mock.Mock()]
+        client.max_connections = 1
+        working_connection = client._get_free_connection()
+        acquired = []
 
-        with mock.patch('time.sleep') as sleep_mock:
-            sleep_mock.side_effect = fail_on_wrong_execution
+        waiter = threading.Thread(
+            target=lambda: acquired.append(client._get_free_connection(5)))
+        waiter.start()
+        client._release_working_connection(working_connection)
+        waiter.join(5)
 
-            try:
-                client._get_free_connection()
-            except IndexError:
-                self.fail('Tried to pop free connection when another thread'
-                          'has taken it.')
-        # Assert that the lock has been freed.
-        self.assertEqual(client._lock.acquire.call_count,
-                         client._lock.release.call_count)
-
-    def test_get_free_connection_sleep(self):
+        self.assertEqual(acquired, [working_connection])
+        self.assertEqual(client.pool_stats.acquisitions, 2)
+
+    def test_get_free_connection_times_out(self):
         """Tests rpc_client.RpcClient._get_free_connection().
 
-        Tests that if the free connection is taken, it will wait for a new one.
+        Tests that if no connection is freed within the acquire timeout, an
+        error is raised and no connections are created or moved.
         """
+        session = mock.Mock()
 
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            acquire_timeout=0.01)
+        client._free_connections = []
+        client.max_connections = 0
+
+        with self.assertRaises(rpc_client.Sl4aConnectionPoolTimeoutError):
+            client._get_free_connection()
+        self.assertEqual(len(client._free_connections), 0)
+        self.assertEqual(len(client._working_connections), 0)
+        self.assertEqual(client.pool_stats.acquire_timeouts, 1)
+
+    def test_get_free_connection_raises_on_terminate(self):
+        """Tests rpc_client.RpcClient._get_free_connection().
+
+        Tests that threads waiting on a connection are woken up with an error
+        when the client is terminated.
+        """
         session = mock.Mock()
 
         client = rpc_client.RpcClient(session.uid, session.adb.serial,
                                       lambda _: mock.Mock(),
                                       lambda _: mock.Mock())
-        client._free_connections = []
+        client._log = mock.Mock()
         client.max_connections = 0
-        client._lock = mock.MagicMock()
         client._free_connections = []
+        errors = []
 
-        with mock.patch('time.sleep') as sleep_mock:
-            sleep_mock.side_effect = BreakoutError()
+        def wait_for_connection():
             try:
-                client._get_free_connection()
-            except BreakoutError:
-                # Assert that the lock has been freed.
-                self.assertEqual(client._lock.acquire.call_count,
-                                 client._lock.release.call_count)
-                # Asserts that the sleep has been called.
-                self.assertTrue(sleep_mock.called)
-                # Asserts that no changes to connections happened
-                self.assertEqual(len(client._free_connections), 0)
-                self.assertEqual(len(client._working_connections), 0)
-                return True
-        self.fail('Failed to hit sleep case')
+                client._get_free_connection(5)
+            except rpc_client.Sl4aConnectionError as e:
+                errors.append(e)
+
+        waiter = threading.Thread(target=wait_for_connection)
+        waiter.start()
+        client.terminate()
+        waiter.join(5)
+
+        self.assertEqual(len(errors), 1)
 
     def test_release_working_connection(self):
         """Tests rpc_client.RpcClient._release_working_connection.
@@ -213,6 +300,111 @@ class RpcClientTest(unittest.TestCase):
             kwarg1=1,
             kwarg2=2)
 
+    def test_multiplexed_rpcs_are_routed_by_id(self):
+        """Tests rpc_client.RpcClient.rpc() in multiplexed mode.
+
+        Tests that concurrent RPCs share one connection, and that out of order
+        responses are returned to the caller waiting on the matching id.
+        """
+        session = mock.Mock()
+        connection = FakeMultiplexedConnection()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: connection,
+            multiplex=True)
+        results = {}
+
+        def call(name):
+            results[name] = client.rpc(name)
+
+        threads = [
+            threading.Thread(target=call, args=(name, ))
+            for name in ('first', 'second')
+        ]
+        for thread in threads:
+            thread.start()
+        requests = [connection.sent.get(timeout=5) for _ in threads]
+        for request in reversed(requests):
+            connection.reply(request['id'], request['method'])
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, {'first': 'first', 'second': 'second'})
+        client.terminate()
+        self.assertTrue(connection.closed)
+
+    def test_multiplexed_rpc_raises_on_closed_connection(self):
+        """Tests rpc_client.RpcClient.rpc() in multiplexed mode.
+
+        Tests that a caller waiting on a response is woken up with an error if
+        the shared connection dies, and that the error callback is called.
+        """
+        session = mock.Mock()
+        on_error = mock.Mock()
+        connection = FakeMultiplexedConnection()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            on_error,
+            lambda _: connection,
+            multiplex=True)
+        connection.responses.put(b'')
+
+        with self.assertRaises(rpc_client.Sl4aConnectionError):
+            client.rpc('someRpc', timeout=5, retries=1)
+        on_error.assert_called_with(connection)
+
+    def test_multiplexed_rpc_retries_on_new_connection(self):
+        """Tests rpc_client.RpcClient.rpc() in multiplexed mode.
+
+        Tests that an RPC whose shared connection dies is sent again over a
+        new connection, and that the dead multiplexer is closed.
+        """
+        session = mock.Mock()
+        dead_connection = FakeMultiplexedConnection()
+        dead_connection.responses.put(b'')
+        new_connection = FakeMultiplexedConnection()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            mock.Mock(side_effect=[dead_connection, new_connection]),
+            multiplex=True)
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(client.rpc('someRpc', timeout=5)))
+        thread.start()
+
+        request = new_connection.sent.get(timeout=5)
+        new_connection.reply(request['id'], 'result')
+        thread.join(5)
+
+        self.assertEqual(results, ['result'])
+        self.assertTrue(dead_connection.closed)
+        client.terminate()
+
+    def test_multiplexed_blocking_rpc_uses_dedicated_connection(self):
+        """Tests rpc_client.RpcClient.rpc() in multiplexed mode.
+
+        Tests that RPCs which block on the device do not use the shared
+        connection.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            multiplex=True)
+        client._get_multiplexer = mock.Mock()
+        client._get_free_connection = mock.Mock(side_effect=BreakoutError())
+
+        with self.assertRaises(BreakoutError):
+            client.rpc('eventWait', 60000)
+        self.assertFalse(client._get_multiplexer.called)
+
 
 if __name__ == '__main__':
     unittest.main()
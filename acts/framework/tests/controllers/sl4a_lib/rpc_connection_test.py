@@ -14,6 +14,9 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 import mock
+import os
+import resource
+import socket
 import unittest
 
 from acts.controllers.sl4a_lib import rpc_client, rpc_connection
@@ -144,6 +147,53 @@ class RpcConnectionTest(unittest.TestCase):
         self.assertEqual(connection.get_new_ticket() + 1,
                          connection.get_new_ticket())
 
+    def high_fd_connection(self):
+        """Returns a connection over a socket with a file descriptor above
+        1024, along with the other end of the socket.
+        """
+        high_fd = 2000
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft <= high_fd:
+            if hard != resource.RLIM_INFINITY and hard <= high_fd:
+                self.skipTest('Cannot open a file descriptor above 1024.')
+            resource.setrlimit(resource.RLIMIT_NOFILE, (high_fd + 1, hard))
+            self.addCleanup(resource.setrlimit, resource.RLIMIT_NOFILE,
+                            (soft, hard))
+        client, server = socket.socketpair()
+        self.addCleanup(client.close)
+        self.addCleanup(server.close)
+        os.dup2(client.fileno(), high_fd)
+        self.addCleanup(os.close, high_fd)
+        connection = self.mock_rpc_connection(MOCK_RESP)
+        connection._client_socket.fileno.return_value = high_fd
+        return connection, server
+
+    def test_is_alive_with_high_file_descriptor(self):
+        """Tests rpc_connection.RpcConnection.is_alive().
+
+        Tests that an idle socket above 1024 is reported alive.
+        """
+        connection, _ = self.high_fd_connection()
+        self.assertTrue(connection.is_alive())
+
+    def test_is_alive_false_when_closed_by_server(self):
+        """Tests rpc_connection.RpcConnection.is_alive().
+
+        Tests that a socket closed by the other end is reported dead.
+        """
+        connection, server = self.high_fd_connection()
+        server.close()
+        self.assertFalse(connection.is_alive())
+
+    def test_is_alive_false_on_closed_socket(self):
+        """Tests rpc_connection.RpcConnection.is_alive().
+
+        Tests that a closed socket is reported dead.
+        """
+        connection = self.mock_rpc_connection(MOCK_RESP)
+        connection._client_socket.fileno.return_value = -1
+        self.assertFalse(connection.is_alive())
+
 
 if __name__ == "__main__":
     unittest.main()
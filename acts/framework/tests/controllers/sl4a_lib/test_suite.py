@@ -17,6 +17,7 @@
 import sys
 import unittest
 
+import event_dispatcher_test
 import rpc_client_test
 import rpc_connection_test
 import sl4a_manager_test
@@ -25,6 +26,7 @@ import sl4a_session_test
 
 def compile_suite():
     test_classes_to_run = [
+        event_dispatcher_test.EventDispatcherTest,
         rpc_client_test.RpcClientTest,
         rpc_connection_test.RpcConnectionTest,
         sl4a_manager_test.Sl4aManagerFactoryTest,
@@ -16,7 +16,10 @@
 import unittest
 
 import mock
+import os
 import subprocess
+import threading
+from acts.libs.proc import process as process_module
 from acts.libs.proc.process import Process
 from acts.libs.proc.process import ProcessError
 
@@ -40,11 +43,26 @@ class FakeThread(object):
         pass
 
 
+class FakeReactor(object):
+    """An _OutputReactor that immediately reports each pipe as closed."""
+
+    def __init__(self):
+        self.pipes = []
+
+    def register(self, pipe, on_data, on_eof):
+        self.pipes.append(pipe)
+        on_eof()
+
+
 class ProcessTest(unittest.TestCase):
     """Tests the acts.libs.proc.process.Process class."""
 
     def setUp(self):
         self._Process__start_process = Process._Process__start_process
+        self.reactor = FakeReactor()
+        patcher = self.patch('_get_output_reactor', return_value=self.reactor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def tearDown(self):
         Process._Process__start_process = self._Process__start_process
@@ -90,6 +108,7 @@ class ProcessTest(unittest.TestCase):
         class FakeThreadImpl(FakeThread):
             def _on_start(self):
                 process._process = mock.Mock()
+                process._process_started.set()
 
         with self.patch('Thread', FakeThreadImpl):
             process.start()
@@ -105,6 +124,7 @@ class ProcessTest(unittest.TestCase):
         class FakeThreadImpl(FakeThread):
             def _on_start(self):
                 process._process = mock.Mock()
+                process._process_started.set()
 
         with self.patch('Thread', FakeThreadImpl):
             process.start()
@@ -112,6 +132,24 @@ class ProcessTest(unittest.TestCase):
         self.assertTrue(process._listening_thread.alive)
         self.assertEqual(process._listening_thread.target, process._exec_loop)
 
+    def test_start_raises_if_process_cannot_be_opened(self):
+        """Tests that start raises right away if opening the process failed.
+        """
+        process = Process('cmd')
+        Process._Process__start_process = mock.Mock(
+            side_effect=FileNotFoundError())
+
+        with self.assertRaisesRegex(OSError, 'Unable to open process!'):
+            process.start()
+        process._listening_thread.join()
+
+    def test_start_raises_if_process_is_not_opened_in_time(self):
+        process = Process('cmd')
+
+        with self.patch('Thread', FakeThread), self.patch('_START_TIMEOUT', 0):
+            with self.assertRaisesRegex(OSError, 'Unable to open process!'):
+                process.start()
+
     # wait
 
     def test_wait_raises_if_called_back_to_back(self):
@@ -275,6 +313,18 @@ class ProcessTest(unittest.TestCase):
         self.assertEqual(received_list[1], 'b')
         self.assertEqual(len(received_list), 2)
 
+    def test_redirect_output_feeds_available_binary_data(self):
+        """Tests that binary output is passed on as soon as it is read."""
+        received_list = []
+        process = Process('cmd')
+        process.set_on_output_callback(received_list.append, binary=True)
+        process._process = mock.Mock()
+        process._process.stdout.read1.side_effect = [b'a\nb', b'\n', b'']
+
+        process._redirect_output()
+
+        self.assertEqual(received_list, [b'a\nb', b'\n'])
+
     # __start_process
 
     def test_start_process_returns_a_popen_object(self):
@@ -293,9 +343,7 @@ class ProcessTest(unittest.TestCase):
         with self.patch('Thread', FakeThread):
             process._exec_loop()
 
-        self.assertEqual(process._redirection_thread.target,
-                         process._redirect_output)
-        self.assertEqual(process._redirection_thread.alive, True)
+        self.assertEqual(self.reactor.pipes, [process._process.stdout])
 
     def test_exec_loop_waits_for_process(self):
         """Tests that the _exec_loop waits for the process to complete before
@@ -338,5 +386,41 @@ class ProcessTest(unittest.TestCase):
             (['1st'],))
 
 
+class OutputReactorTest(unittest.TestCase):
+    """Tests the acts.libs.proc.process._OutputReactor class."""
+
+    def test_reactor_reads_pipes_until_closed(self):
+        reactor = process_module._OutputReactor()
+        outputs = {}
+        closed = []
+        all_closed = threading.Event()
+
+        def on_eof(name):
+            closed.append(name)
+            if len(closed) == 2:
+                all_closed.set()
+
+        for name in ('a', 'b'):
+            read_fd, write_fd = os.pipe()
+            outputs[name] = []
+            reactor.register(os.fdopen(read_fd, 'rb'), outputs[name].append,
+                             lambda name=name: on_eof(name))
+            os.write(write_fd, name.encode() * 3)
+            os.close(write_fd)
+
+        self.assertTrue(all_closed.wait(5))
+        self.assertEqual(b''.join(outputs['a']), b'aaa')
+        self.assertEqual(b''.join(outputs['b']), b'bbb')
+
+    def test_line_splitter_joins_lines_across_chunks(self):
+        lines = []
+        splitter = process_module._LineSplitter(lines.append)
+        splitter.feed(b'a\nb')
+        splitter.feed(b'c \n\nd')
+        splitter.flush()
+
+        self.assertEqual(lines, ['a', 'bc', '', 'd'])
+
+
 if __name__ == '__main__':
     unittest.main()
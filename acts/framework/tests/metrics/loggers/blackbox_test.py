@@ -200,7 +200,9 @@ class BlackboxMetricLoggerIntegrationTest(TestCase):
     @patch('acts.test_runner.sys')
     @patch('acts.test_runner.utils')
     @patch('acts.test_runner.importlib')
-    def run_acts_test(self, test_class, importlib, utils, sys):
+    @patch('acts.test_runner.build_test_class_index')
+    def run_acts_test(self, test_class, build_test_class_index, importlib,
+                      utils, sys):
         config = {
             "testbed": {
                 "name": "SampleTestBed",
@@ -212,6 +214,9 @@ class BlackboxMetricLoggerIntegrationTest(TestCase):
         mockModule = Mock()
         setattr(mockModule, test_class.__name__, test_class)
         utils.find_files.return_value = [(None, None, None)]
+        build_test_class_index.return_value = {
+            test_class.__name__: [(None, None)]
+        }
         importlib.import_module.return_value = mockModule
         runner = TestRunner(config, [(test_class.__name__, None,)])
 
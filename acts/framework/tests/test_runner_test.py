@@ -15,6 +15,10 @@
 #   limitations under the License.
 
 from mock import Mock
+import mock
+import os
+import shutil
+import sys
 import unittest
 import tempfile
 
@@ -34,9 +38,19 @@ class TestRunnerTest(unittest.TestCase):
             "logpath": self.tmp_dir,
             "cli_args": None,
             "testpaths": ["./"],
+            "test_class_index_path": os.path.join(self.tmp_dir, 'index.json'),
             "icecream": 42,
             "extra_param": "haha"
         }
+        # Guards against writing to the default index path.
+        self.default_index_path = os.path.join(self.tmp_dir, 'default.json')
+        patcher = mock.patch.object(test_runner, 'TEST_CLASS_INDEX_PATH',
+                                    self.default_index_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
 
     def create_mock_context(self):
         context = Mock()
@@ -100,6 +114,113 @@ class TestRunnerTest(unittest.TestCase):
         self.assertFalse(test_classes[class_names[1]].called)
         self.assertTrue(test_classes[class_names[2]].called)
 
+    def write_test_script(self, name, content):
+        test_dir = os.path.join(self.tmp_dir, 'tests')
+        os.makedirs(test_dir, exist_ok=True)
+        with open(os.path.join(test_dir, name + '.py'), 'w') as f:
+            f.write(content)
+        self.addCleanup(sys.modules.pop, name, None)
+        return test_dir
+
+    def import_test_modules(self, run_list, test_dir):
+        tr = test_runner.TestRunner(self.base_mock_test_config, run_list)
+        return tr.import_test_modules([test_dir])
+
+    def test_import_test_modules_only_imports_run_list_modules(self):
+        self.write_test_script('LazyImportOneTest',
+                               'class LazyImportOneTest(object):\n    pass\n')
+        test_dir = self.write_test_script('LazyImportTwoTest',
+                                          'raise ImportError()\n')
+
+        test_classes = self.import_test_modules([('LazyImport*One*', None)],
+                                                test_dir)
+
+        self.assertEqual(list(test_classes), ['LazyImportOneTest'])
+        self.assertNotIn('LazyImportTwoTest', sys.modules)
+
+    def test_import_test_modules_uses_configured_index_path(self):
+        test_dir = self.write_test_script(
+            'ConfiguredIndexTest', 'class ConfiguredIndexTest(object):\n'
+            '    pass\n')
+
+        self.import_test_modules([('ConfiguredIndexTest', None)], test_dir)
+
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmp_dir, 'index.json')))
+        self.assertFalse(os.path.exists(self.default_index_path))
+
+    def test_import_test_modules_with_index_cache_disabled(self):
+        test_dir = self.write_test_script(
+            'UncachedIndexTest', 'class UncachedIndexTest(object):\n'
+            '    pass\n')
+        self.base_mock_test_config['test_class_index_path'] = ''
+
+        test_classes = self.import_test_modules(
+            [('UncachedIndexTest', None)], test_dir)
+
+        self.assertIn('UncachedIndexTest', test_classes)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.tmp_dir, 'index.json')))
+        self.assertFalse(os.path.exists(self.default_index_path))
+
+    def test_import_test_modules_imports_all_for_unindexed_class(self):
+        test_dir = self.write_test_script(
+            'LazyImportDynamicTest',
+            'LazyImportDynamicTest = type("LazyImportDynamicTest", (), {})\n')
+
+        test_classes = self.import_test_modules(
+            [('LazyImportDynamicTest', None)], test_dir)
+
+        self.assertIn('LazyImportDynamicTest', test_classes)
+
+    def test_build_test_class_index_rescans_modified_scripts(self):
+        test_dir = self.write_test_script('IndexedTest',
+                                          'class FirstTest(object):\n')
+        file_list = [(test_dir, 'IndexedTest', '.py')]
+        cache_path = os.path.join(self.tmp_dir, 'index.json')
+        self.assertEqual(
+            test_runner.build_test_class_index(file_list, cache_path),
+            {'FirstTest': [(test_dir, 'IndexedTest')]})
+
+        self.write_test_script('IndexedTest', 'class SecondTest(object):\n')
+        script_path = os.path.join(test_dir, 'IndexedTest.py')
+        os.utime(script_path, (0, 0))
+        index = test_runner.build_test_class_index(file_list, cache_path)
+
+        self.assertEqual(index, {'SecondTest': [(test_dir, 'IndexedTest')]})
+
+    def test_build_test_class_index_uses_cache(self):
+        test_dir = self.write_test_script('CachedTest',
+                                          'class CachedTest(object):\n')
+        file_list = [(test_dir, 'CachedTest', '.py')]
+        cache_path = os.path.join(self.tmp_dir, 'index.json')
+        test_runner.build_test_class_index(file_list, cache_path)
+
+        with mock.patch('acts.test_runner.open', create=True,
+                        wraps=open) as mock_open:
+            index = test_runner.build_test_class_index(file_list, cache_path)
+
+        self.assertEqual(index, {'CachedTest': [(test_dir, 'CachedTest')]})
+        opened = [call[0][0] for call in mock_open.call_args_list]
+        self.assertNotIn(os.path.join(test_dir, 'CachedTest.py'), opened)
+
+    def test_build_test_class_index_keeps_cache_when_save_fails(self):
+        test_dir = self.write_test_script('SavedTest',
+                                          'class SavedTest(object):\n')
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        cache_path = os.path.join(cache_dir, 'index.json')
+        test_runner.build_test_class_index(
+            [(test_dir, 'SavedTest', '.py')], cache_path)
+        with open(cache_path) as f:
+            cache = f.read()
+
+        with mock.patch('os.replace', side_effect=OSError('disk full')):
+            test_runner.build_test_class_index([], cache_path)
+
+        self.assertEqual(os.listdir(cache_dir), ['index.json'])
+        with open(cache_path) as f:
+            self.assertEqual(f.read(), cache)
+
 
 if __name__ == "__main__":
     unittest.main()